@@ -0,0 +1,59 @@
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.helper import executor_helper, metrics_helper
+from app.services.decrypt_pipeline import decrypt_pipeline
+from app.services.image_proxy_service import image_proxy
+from app.services.job_queue import job_queue
+from config.log_config import log_stats
+from config.metrics_config import settings as metrics_settings
+from db.sys_db import sys_db_writer
+from wx.win.v4.wxgf_dat2img.ffmpeg_bridge import pool_stats
+
+router = APIRouter()
+
+
+def stats_metrics(prefix: str, documentation: str, stats: dict, counters=()):
+    """
+    将各模块 stats() 返回的统计转换为指标，counters 中的键为累计值，其余为当前值
+    """
+    for key, value in stats.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            continue
+        if key in counters:
+            yield f"{prefix}_{key}_total", "counter", f"{documentation} {key}", [({}, value)]
+        else:
+            yield f"{prefix}_{key}", "gauge", f"{documentation} {key}", [({}, value)]
+
+
+def collect_runtime():
+    executor_stats = executor_helper.stats()
+    yield from stats_metrics("cloudbak_executor", "执行器", executor_stats)
+    yield from stats_metrics("cloudbak_loop_lag", "事件循环延迟", executor_stats["loop_lag"],
+                             counters=("samples", "lag_count"))
+    yield from stats_metrics("cloudbak_ffmpeg", "FFmpeg 进程池", pool_stats(),
+                             counters=("completed", "failed", "timeouts", "rejected"))
+    yield from stats_metrics("cloudbak_image_proxy", "图片代理", image_proxy.stats(),
+                             counters=("origin_fetches", "cache_hits"))
+    yield from stats_metrics("cloudbak_jobs", "任务队列", job_queue.stats(), counters=("finished", "cancelled"))
+    yield from stats_metrics("cloudbak_decrypt_pipeline", "上传解密流水线", decrypt_pipeline.stats(),
+                             counters=("decrypted", "indexed", "failed"))
+    yield from stats_metrics("cloudbak_log", "异步日志", log_stats(), counters=("written", "dropped"))
+    yield from stats_metrics("cloudbak_sys_db_writer", "系统库写线程", sys_db_writer.stats(), counters=("written", "failed"))
+
+
+metrics_helper.register_collector(collect_runtime)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics(authorization: str | None = Header(None)):
+    """
+    Prometheus 文本格式指标
+    """
+    if not metrics_settings.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if metrics_settings.token and not hmac.compare_digest(authorization or "", f"Bearer {metrics_settings.token}"):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(metrics_helper.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -6,11 +6,13 @@ from fastapi import APIRouter, Depends
 from app.dependencies.auth_dep import get_session_manager, \
     get_message_manager, get_contact_manager, get_chat_room_manager
 from app.exception.biz_exception import BizException
+from app.helper.executor_helper import run_io
 from config.log_config import logger
 from wx.common.filters.contact_filter import ContactFilterObj
+from wx.common.filters.member_filter import MemberFilterObj
 from wx.common.filters.msg_filter import SingleMsgFilterObj, MsgFilterObj
 from wx.common.filters.session_filter import SessionFilterObj
-from wx.common.output.chat_room import ChatRoomInfo
+from wx.common.output.chat_room import ChatRoomInfo, ChatRoomMember
 from wx.common.output.contact import ContactSearchOut, Contact
 from wx.common.output.message import Msg, MsgSearchOut
 from wx.common.output.session import Session as SessionOut
@@ -71,7 +73,7 @@ def red_contact(contact_manager: ContactManager = Depends(get_contact_manager)):
 async def contact_search(search: str, contact_manager: ContactManager = Depends(get_contact_manager)):
     if contact_manager is None:
         raise BizException("该微信版本暂不支持联系人搜索")
-    return contact_manager.contacts_search(ContactFilterObj(search=search))
+    return await run_io(contact_manager.contacts_search, ContactFilterObj(search=search))
 
 
 @router.post("/contact-page", response_model=List[Contact])
@@ -86,4 +88,14 @@ def contact_page(filter_obj: ContactFilterObj, contact_manager: ContactManager =
 async def get_chatroom_info(username: str, chat_room_manager: ChatRoomManager = Depends(get_chat_room_manager)):
     if chat_room_manager is None:
         return ChatRoomInfo(username=username)
-    return chat_room_manager.chatroom_info(username)
+    return await run_io(chat_room_manager.chatroom_info, username)
+
+
+@router.post("/members", response_model=List[ChatRoomMember])
+async def get_members(filter_obj: MemberFilterObj, chat_room_manager: ChatRoomManager = Depends(get_chat_room_manager)):
+    """
+    批量解析发送者的显示名称与头像，替代逐个成员请求
+    """
+    if chat_room_manager is None:
+        return [ChatRoomMember(username=username) for username in dict.fromkeys(filter_obj.usernames)]
+    return await run_io(chat_room_manager.members, filter_obj.usernames, filter_obj.chatroom)
@@ -1,14 +1,16 @@
 import base64
 import os
-from io import BytesIO
 from typing import Optional
 
-import httpx
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import FileResponse, StreamingResponse
 
 from app.enum.resource_enum import ResourceType
+from app.helper.cache_helper import CACHE_IMMUTABLE, cache_headers, content_etag, file_etag, key_etag, \
+    not_modified
+from app.helper.executor_helper import run_cpu, run_io
+from app.helper.range_helper import range_bytes_response, range_file_response
 from app.schemas.schemas import ContactHeadImgUrlOut
+from app.services.image_proxy_service import image_proxy
 from app.services.decode_wx_pictures import decrypt_file, decrypt_file_return_io
 from config.log_config import logger
 from wx.client_factory import ClientFactory
@@ -21,6 +23,7 @@ router = APIRouter(
 
 @router.get("/relative-resource")
 async def relative_resource(
+        request: Request,
         relative_path: str,
         session_id: int,
         resource_type: Optional[ResourceType] = ResourceType.IMAGE):
@@ -40,38 +43,44 @@ async def relative_resource(
         raise HTTPException(status_code=403, detail="Invalid path")
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
+    etag = file_etag(file_path)
+    if response := not_modified(request, etag):
+        return response
+    headers = cache_headers(etag)
     if resource_type == ResourceType.IMAGE:
         jpg_path = file_path.replace(".dat", ".jpg")
         if os.path.exists(jpg_path):
-            return FileResponse(jpg_path)
+            return range_file_response(request, jpg_path, headers=headers)
         png_path = file_path.replace(".dat", ".png")
         if os.path.exists(png_path):
-            return FileResponse(png_path)
+            return range_file_response(request, png_path, headers=headers)
         gif_path = file_path.replace(".dat", ".gif")
         if os.path.exists(gif_path):
-            return FileResponse(gif_path)
-        decoded_path = decrypt_file(file_path)
+            return range_file_response(request, gif_path, headers=headers)
+        decoded_path = await run_cpu(decrypt_file, file_path)
         if decoded_path:
-            return FileResponse(decoded_path)
+            return range_file_response(request, decoded_path, headers=headers)
     elif resource_type == ResourceType.FILE:
-        return FileResponse(file_path)
+        return range_file_response(request, file_path, headers=headers)
     elif resource_type == ResourceType.VIDEO:
-        return FileResponse(file_path, media_type="video/mp4")
+        return range_file_response(request, file_path, media_type="video/mp4", headers=headers)
     else:
         raise HTTPException(status_code=404, detail="File not found")
 
 
 @router.get("/media")
 async def get_media(
+        request: Request,
         strUsrName: str,
         MsgSvrID: str,
         session_id: int,
         db_no: int = 0):
     client = ClientFactory.get_client_by_id(session_id)
     resource_manager = client.get_resource_manager()
-    file_path = resource_manager.get_media_path(strUsrName, MsgSvrID)
+    file_path = await run_io(resource_manager.get_media_path, strUsrName, MsgSvrID)
     if file_path:
-        return FileResponse(file_path)
+        etag = file_etag(file_path)
+        return not_modified(request, etag) or range_file_response(request, file_path, headers=cache_headers(etag))
     raise HTTPException(status_code=404, detail="File not found")
 
 
@@ -89,50 +98,39 @@ async def get_head_image(encoded_url: str, request: Request):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid Base64 URL")
 
-    # 使用 httpx 请求图片数据
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(decoded_url)
-            response.raise_for_status()
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=400, detail=f"Error fetching the image: {e}")
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail="Error from the image server")
-
-    # 确保返回的是图片内容
-    content_type = response.headers.get("Content-Type", "")
-
-    # 将图片数据流返回给调用方
-    return StreamingResponse(
-        BytesIO(response.content),
-        media_type=content_type
-    )
+    # 共享连接池请求，并按 URL 缓存到磁盘
+    return await image_proxy.fetch(request, decoded_url)
 
 
 @router.get("/image-from-full-md5/{session_id}/{full_md5}")
-async def get_image(full_md5: str, session_id: int, prev: str = 'Thumb'):
+async def get_image(request: Request, full_md5: str, session_id: int, prev: str = 'Thumb'):
     """
     根据 full_md5 获取图片
     库 decoded_HardLinkImage.db 表 HardLinkImageAttribute 保存了 md5 对应的目录
     """
+    etag = key_etag(session_id, full_md5, prev)
+    if response := not_modified(request, etag, CACHE_IMMUTABLE):
+        return response
     client = ClientFactory.get_client_by_id(session_id)
     resource_manager = client.get_resource_manager()
-    file_path = resource_manager.windows_v3_image_from_full_md5(full_md5, prev)
+    file_path = await run_io(resource_manager.windows_v3_image_from_full_md5, full_md5, prev)
 
     if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
     # 调用解密函数
-    decrypted_stream = decrypt_file_return_io(file_path)
+    decrypted_stream = await run_cpu(decrypt_file_return_io, file_path)
 
     if decrypted_stream is None:
         raise HTTPException(status_code=400, detail="Failed to decrypt the file")
 
     # 返回解密后的字节流数据
-    return StreamingResponse(decrypted_stream, media_type="image/jpeg")
+    return range_bytes_response(request, decrypted_stream.getvalue(), media_type="image/jpeg",
+                                headers=cache_headers(etag, CACHE_IMMUTABLE))
 
 
 @router.get("/resource-from-source-id/{session_id}/{msg_svr_id}")
-async def get_image_from_source_id(msg_svr_id: int, session_id: int, file_type: str = 'Thumb', username: Optional[str] = None):
+async def get_image_from_source_id(request: Request, msg_svr_id: int, session_id: int, file_type: str = 'Thumb',
+                                   username: Optional[str] = None):
     """
     缩略图、图片、视频文件
     :param username:
@@ -143,7 +141,7 @@ async def get_image_from_source_id(msg_svr_id: int, session_id: int, file_type:
 
     client = ClientFactory.get_client_by_id(session_id)
     message_manager = client.get_message_manager()
-    msg = message_manager.message(SingleMsgFilterObj(username=username, v3_msg_svr_id=msg_svr_id))
+    msg = await run_io(message_manager.message, SingleMsgFilterObj(username=username, v3_msg_svr_id=msg_svr_id))
     if msg is None:
         logger.info(f"未查询到消息 msg_svr_id = {msg_svr_id}")
         raise HTTPException(status_code=404, detail="File not found")
@@ -164,29 +162,30 @@ async def get_image_from_source_id(msg_svr_id: int, session_id: int, file_type:
     logger.info("文件路径：%s", file_path)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
+    etag = file_etag(file_path)
+    if response := not_modified(request, etag):
+        return response
+    headers = cache_headers(etag)
     if file_path.endswith('.dat'):
-        decrypted_stream = decrypt_file_return_io(file_path)
+        decrypted_stream = await run_cpu(decrypt_file_return_io, file_path)
 
         if decrypted_stream is None:
             raise HTTPException(status_code=400, detail="Failed to decrypt the file")
 
         # 返回解密后的字节流数据
-        return StreamingResponse(decrypted_stream, media_type="image/jpeg")
+        return range_bytes_response(request, decrypted_stream.getvalue(), media_type="image/jpeg", headers=headers)
     else:
-        def iter_file():
-            """以块形式读取文件，生成器实现流式返回"""
-            with open(file_path, "rb") as file:
-                while chunk := file.read(1024 * 1024):  # 每次读取 1MB
-                    yield chunk
-        return StreamingResponse(iter_file(), media_type="video/mp4")
+        return range_file_response(request, file_path, media_type="video/mp4", headers=headers)
 
 
 @router.get("/member-head/{session_id}/{username}")
-async def get_image_from_source_id(username: str, session_id: int):
+async def get_image_from_source_id(request: Request, username: str, session_id: int):
 
     client = ClientFactory.get_client_by_id(session_id)
     resource_manager = client.get_resource_manager()
-    data = resource_manager.get_member_head(username)
+    data = await run_io(resource_manager.get_member_head, username)
     if data:
-        return StreamingResponse(BytesIO(data), media_type="image/jpeg")
+        etag = content_etag(data)
+        return not_modified(request, etag) or range_bytes_response(request, bytes(data), media_type="image/jpeg",
+                                                                    headers=cache_headers(etag))
     raise HTTPException(status_code=404, detail="File not found")
@@ -1,22 +1,25 @@
 import base64
 import io
 import os
-from io import BytesIO
 from pathlib import Path
 from typing import Optional
 
-import httpx
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 
 from app.enum.resource_enum import ResourceType
+from app.helper.cache_helper import CACHE_IMMUTABLE, CACHE_PRIVATE, cache_headers, content_etag, file_etag, \
+    key_etag, not_modified
+from app.helper.executor_helper import run_cpu, run_io
+from app.helper.range_helper import range_bytes_response, range_file_response
 from app.schemas.schemas import ContactHeadImgUrlOut
+from app.services.image_proxy_service import image_proxy
 from app.services.decode_wx_pictures import decrypt_file, decrypt_file_return_io
 from config.log_config import logger
 from wx.client_factory import ClientFactory
 from wx.common.filters.msg_filter import SingleMsgFilterObj
 
-from test.v4_image import decrypt_wechat_dat
+from test.v4_image import convert_dat_bytes, decrypt_wechat_dat_raw
 import base64
 import io
 from fastapi.responses import StreamingResponse
@@ -52,6 +55,7 @@ def base64_preview(base64_str: str, file_ext: str):
 
 @router.get("/relative-resource")
 async def relative_resource(
+        request: Request,
         relative_path: str,
         session_id: int,
         resource_type: Optional[ResourceType] = ResourceType.IMAGE):
@@ -73,38 +77,66 @@ async def relative_resource(
         raise HTTPException(status_code=403, detail="Invalid path")
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
+    etag = file_etag(file_path)
+    if response := not_modified(request, etag):
+        return response
+    headers = cache_headers(etag)
+
+    # 解密在进程池中执行；WxGF 转码在本进程中调用 ffmpeg 进程池，并发上限与统计全局有效
+    raw = await run_cpu(decrypt_wechat_dat_raw, file_path)
+    raw_bytes, mime = await run_io(convert_dat_bytes, raw)
+    return range_bytes_response(request, raw_bytes, media_type=mime, headers=headers)
 
 
-    b64 = decrypt_wechat_dat(file_path)
-    # b64 可能是 data URI，也可能是纯 base64，统一转为二进制流返回正确的 Content-Type
-    if b64.startswith("data:"):
-        header, payload = b64.split(",", 1)
-        # data:image/jpeg;base64,xxxx
-        try:
-            mime = header.split(":")[1].split(";")[0]
-        except Exception:
-            mime = "application/octet-stream"
-        raw_bytes = base64.b64decode(payload)
-    else:
-        # 默认按图片处理
-        mime = "image/jpeg" if resource_type == ResourceType.IMAGE else "application/octet-stream"
-        raw_bytes = base64.b64decode(b64)
-    return StreamingResponse(io.BytesIO(raw_bytes), media_type=mime)
 
 
+@router.get("/thumb")
+def get_thumb(
+        request: Request,
+        relative_path: str,
+        session_id: int,
+        size: Optional[int] = None):
+    """
+    聊天图片缩略图（webp/jpeg），按内容寻址存储，可长期缓存
+    :param relative_path: 图片 .dat 相对会话目录的路径
+    :param size: 期望的最长边像素
+    """
+    client = ClientFactory.get_client_by_id(session_id)
+    if client is None:
+        logger.info(f"client {session_id} is not exists")
+        raise HTTPException(status_code=404, detail="File not found")
+    base_dir = os.path.abspath(client.get_session_dir())
+    if not os.path.abspath(os.path.join(base_dir, relative_path.replace("\\", '/'))).startswith(base_dir):
+        raise HTTPException(status_code=403, detail="Invalid path")
+    resource_manager = client.get_resource_manager()
+    path = resource_manager.get_image_thumbnail(relative_path, size)
+    if not path:
+        raise HTTPException(status_code=404, detail="File not found")
+    # 缩略图文件名即内容摘要 + 档位
+    etag = key_etag(os.path.basename(path))
+    if response := not_modified(request, etag, CACHE_IMMUTABLE):
+        return response
+    return range_file_response(
+        request,
+        path,
+        media_type=resource_manager.thumbnail_store.mime,
+        headers=cache_headers(etag, CACHE_IMMUTABLE)
+    )
 
 
 @router.get("/media")
 async def get_media(
+        request: Request,
         strUsrName: str,
         MsgSvrID: str,
         session_id: int,
         db_no: int = 0):
     client = ClientFactory.get_client_by_id(session_id)
     resource_manager = client.get_resource_manager()
-    file_path = resource_manager.get_media_path(strUsrName, MsgSvrID)
+    file_path = await run_io(resource_manager.get_media_path, strUsrName, MsgSvrID)
     if file_path:
-        return FileResponse(file_path)
+        etag = file_etag(file_path)
+        return not_modified(request, etag) or range_file_response(request, file_path, headers=cache_headers(etag))
     raise HTTPException(status_code=404, detail="File not found")
 
 
@@ -122,60 +154,52 @@ async def get_head_image(encoded_url: str, request: Request):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid Base64 URL")
 
-    # 使用 httpx 请求图片数据
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(decoded_url)
-            response.raise_for_status()
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=400, detail=f"Error fetching the image: {e}")
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail="Error from the image server")
-
-    # 确保返回的是图片内容
-    content_type = response.headers.get("Content-Type", "")
-
-    # 将图片数据流返回给调用方
-    return StreamingResponse(
-        BytesIO(response.content),
-        media_type=content_type
-    )
+    # 共享连接池请求，并按 URL 缓存到磁盘
+    return await image_proxy.fetch(request, decoded_url)
 
 
 @router.get("/video-poster/{session_id}/{md5}")
-async def get_video_thumb(md5: str, session_id: int):
+async def get_video_thumb(request: Request, md5: str, session_id: int):
     """
     根据 md5获取 video 封面图
+    高清封面生成前返回的是 _thumb.jpg，此时不能长期缓存，按文件 ETag 重新校验，高清封面出现后即可拿到
     """
     client = ClientFactory.get_client_by_id(session_id)
     resource_manager = client.get_resource_manager()
-    path = resource_manager.get_video_poster(md5, 1763202684)
+    path = await run_io(resource_manager.get_video_poster, md5, 1763202684)
     if not path:
         raise HTTPException(status_code=405, detail="file not found")
     if not os.path.exists(path):
         logger.warn(f"poster path is not exists: {path}")
         raise HTTPException(status_code=405, detail="file not found")
-    return FileResponse(path)
+    etag = file_etag(path)
+    cache_control = CACHE_PRIVATE if path.endswith("_thumb.jpg") else CACHE_IMMUTABLE
+    return not_modified(request, etag, cache_control) or range_file_response(
+        request, path, headers=cache_headers(etag, cache_control))
 
 
 @router.get("/video/{session_id}/{md5}")
-async def get_video_thumb(md5: str, session_id: int):
+async def get_video_thumb(request: Request, md5: str, session_id: int):
     """
     根据 md5获取 video
     """
+    etag = key_etag(session_id, 'video', md5)
+    if response := not_modified(request, etag, CACHE_IMMUTABLE):
+        return response
     client = ClientFactory.get_client_by_id(session_id)
     resource_manager = client.get_resource_manager()
-    path = resource_manager.get_video(md5, 1763202684)
+    path = await run_io(resource_manager.get_video, md5, 1763202684)
     if not path:
         raise HTTPException(status_code=405, detail="file not found")
     if not os.path.exists(path):
         logger.warn(f"poster path is not exists: {path}")
         raise HTTPException(status_code=405, detail="file not found")
-    return FileResponse(path)
+    return range_file_response(request, path, headers=cache_headers(etag, CACHE_IMMUTABLE))
 
 
 @router.get("/resource-from-source-id/{session_id}/{msg_svr_id}/{local_id}")
-async def get_image_from_source_id(msg_svr_id: int, session_id: int,local_id: int, file_type: str = 'Thumb', username: Optional[str] = None):
+async def get_image_from_source_id(request: Request, msg_svr_id: int, session_id: int, local_id: int,
+                                   file_type: str = 'Thumb', username: Optional[str] = None):
     """
     缩略图、图片、视频文件
     :param username:
@@ -187,7 +211,7 @@ async def get_image_from_source_id(msg_svr_id: int, session_id: int,local_id: in
     client = ClientFactory.get_client_by_id(session_id)
     message_manager = client.get_message_manager()
     msgFilterObj = SingleMsgFilterObj(username=username, v3_msg_svr_id=msg_svr_id, local_id=local_id)
-    msg = message_manager.message(msgFilterObj)
+    msg = await run_io(message_manager.message, msgFilterObj)
     if msg is None:
         logger.info(f"未查询到消息 msg_svr_id = {msg_svr_id}")
         raise HTTPException(status_code=404, detail="File not found")
@@ -208,18 +232,17 @@ async def get_image_from_source_id(msg_svr_id: int, session_id: int,local_id: in
     logger.info("文件路径：%s", file_path)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
+    etag = file_etag(file_path)
+    if response := not_modified(request, etag):
+        return response
+    headers = cache_headers(etag)
     if file_path.endswith('.dat'):
-        decrypted_stream = decrypt_file_return_io(file_path)
+        decrypted_stream = await run_cpu(decrypt_file_return_io, file_path)
 
         if decrypted_stream is None:
             raise HTTPException(status_code=400, detail="Failed to decrypt the file")
 
         # 返回解密后的字节流数据
-        return StreamingResponse(decrypted_stream, media_type="image/jpeg")
+        return range_bytes_response(request, decrypted_stream.getvalue(), media_type="image/jpeg", headers=headers)
     else:
-        def iter_file():
-            """以块形式读取文件，生成器实现流式返回"""
-            with open(file_path, "rb") as file:
-                while chunk := file.read(1024 * 1024):  # 每次读取 1MB
-                    yield chunk
-        return StreamingResponse(iter_file(), media_type="video/mp4")
+        return range_file_response(request, file_path, media_type="video/mp4", headers=headers)
@@ -0,0 +1,43 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends
+
+from app.dependencies.auth_dep import get_wx_client
+from app.helper.executor_helper import run_io
+from wx.common.output.stats import ChatStatsDetail, ChatStatsSummary, StatsOverview
+from wx.interface.wx_interface import ClientInterface
+
+router = APIRouter(
+    prefix="/stats"
+)
+
+
+@router.get("/overview", response_model=Optional[StatsOverview])
+async def stats_overview(top: int = 20, client: ClientInterface = Depends(get_wx_client)):
+    """
+    整个账号的消息统计与消息数最多的会话，数据在解析完成后生成
+    """
+    if client is None:
+        return None
+    return await run_io(client.get_chat_stats().overview, min(top, 200))
+
+
+@router.get("/chats", response_model=List[ChatStatsSummary])
+async def stats_chats(limit: int = 50, order_by: str = "msg_count", client: ClientInterface = Depends(get_wx_client)):
+    """
+    会话统计排行
+    :param order_by: msg_count / sent_count / last_time / first_time
+    """
+    if client is None:
+        return []
+    return await run_io(client.get_chat_stats().summaries, min(limit, 1000), order_by)
+
+
+@router.get("/chat", response_model=Optional[ChatStatsDetail])
+async def stats_chat(username: str, senders: int = 50, client: ClientInterface = Depends(get_wx_client)):
+    """
+    单个会话的统计：消息数、首末消息时间、按类型、发送者、小时、天分布
+    """
+    if client is None:
+        return None
+    return await run_io(client.get_chat_stats().chat, username, min(senders, 1000))
@@ -1,12 +1,14 @@
 import os
 
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, HTTPException
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 
 from app.api.form.license_request import LicenseRequest
 from app.dependencies.auth_dep import get_current_user
 from app.enum.sys_conf_enum import SysConfEnum
 from app.exception.biz_exception import BizException
+from app.helper import profile_helper
 from app.helper.licence import LicenseManager, License
 from app.models.sys import SysUser
 from app.schemas.sys_schemas import SysInfoOut
@@ -15,6 +17,7 @@ from db.sys_db import get_db
 from config.app_config import settings as app_settings
 from datetime import timedelta
 from config.log_config import logger
+from wx.common.util.sql_trace import slow_query_log
 
 router = APIRouter(
     prefix="/sys"
@@ -69,3 +72,37 @@ def save_license(request: LicenseRequest,
     except ValueError as e:
         raise BizException('无效授权码')
 
+
+
+@router.get("/profiles")
+def list_profiles(login_user: SysUser = Depends(get_current_user)):
+    """
+    请求头 X-Profile: 1 采集的性能分析文件列表，新的在前
+    """
+    return profile_helper.list_profiles()
+
+
+@router.get("/profiles/{name}")
+def download_profile(name: str, login_user: SysUser = Depends(get_current_user)):
+    """
+    下载性能分析文件，.prof 可用 snakeviz 等工具打开，.txt 为文本报告
+    """
+    path = profile_helper.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/plain" if name.endswith(".txt") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+@router.get("/slow-queries")
+def slow_queries(limit: int = 20, order_by: str = "total_ms", login_user: SysUser = Depends(get_current_user)):
+    """
+    微信库慢查询统计，按累计耗时（total_ms）、最大耗时（max_ms）或次数（count）排序，附带执行计划
+    """
+    return slow_query_log.top(limit, order_by)
+
+
+@router.delete("/slow-queries")
+def clear_slow_queries(login_user: SysUser = Depends(get_current_user)):
+    slow_query_log.clear()
+    return {"cleared": True}
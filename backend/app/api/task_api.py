@@ -1,8 +1,10 @@
+import asyncio
+import json
 import os
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.dependencies.auth_dep import get_current_user, get_current_sys_session
@@ -12,7 +14,11 @@ from app.sheduler import JOB_STABLE_ANALYZE, remove_job, add_job
 from config.app_config import settings
 from db.sys_db import get_db
 from app.services.analyze import analyze
-from app.services.sys_task_maker import TaskObj, task_execute
+from app.helper.executor_helper import run_io
+from app.services import analyze_trigger
+from app.services.job_queue import job_queue
+from app.services.task_progress import load_progress
+from app.services.sys_task_maker import TaskObj, task_running, task_queued
 
 from app.schemas.sys_schemas import SysTaskOut
 from app.sheduler import job_key
@@ -45,20 +51,73 @@ async def get_video(task_id: int, db: Session = Depends(get_db)):
 
 @router.post("/single-decrypt/{sys_session_id}/{deep}")
 def single_decrypt(sys_session_id: int,
-                   background_tasks: BackgroundTasks,
                    deep: bool = False,
                    sys_user: SysUser = Depends(get_current_user)):
     """
     只执行一次解析任务
     :param sys_session_id:
-    :param background_tasks:
     :param deep 是否全量解析
     :param sys_user:
     :return:
     """
     logger.info(f"method param deep: {deep}")
-    task_obj = TaskObj(sys_user.id, "数据解析", analyze, sys_session_id, deep)
-    background_tasks.add_task(task_execute, task_obj)
+    task_obj = TaskObj(sys_user.id, "数据解析", analyze, sys_session_id, deep, session_id=sys_session_id)
+    analyze_trigger.submit(task_obj)
+
+
+@router.get("/{task_id}/progress")
+def task_progress(task_id: int, sys_user: SysUser = Depends(get_current_user)):
+    """
+    任务状态与最近一次进度快照
+    """
+    state, progress = load_progress(task_id, sys_user.id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"state": state, "progress": progress}
+
+
+@router.get("/{task_id}/progress/stream")
+async def task_progress_stream(task_id: int, interval: float = 1.0, sys_user: SysUser = Depends(get_current_user)):
+    """
+    以 SSE 推送任务进度，快照变化时推送 progress 事件，任务结束时推送 end 事件后关闭
+    :param interval: 轮询间隔（秒）
+    """
+    state, _ = await run_io(load_progress, task_id, sys_user.id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    interval = min(max(interval, 0.2), 10.0)
+
+    async def events():
+        last = None
+        while True:
+            state, progress = await run_io(load_progress, task_id, sys_user.id)
+            data = json.dumps({"state": state, "progress": progress}, ensure_ascii=False)
+            if data != last:
+                last = data
+                yield f"event: progress\ndata: {data}\n\n"
+            else:
+                # 保持连接，避免代理超时断开
+                yield ": keep-alive\n\n"
+            if state not in (task_running, task_queued):
+                yield f"event: end\ndata: {data}\n\n"
+                return
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"cache-control": "no-cache", "x-accel-buffering": "no"})
+
+
+@router.post("/{task_id}/cancel")
+def cancel_task(task_id: int, sys_user: SysUser = Depends(get_current_user)):
+    """
+    取消任务，排队中的任务不再执行，运行中的任务结束执行进程
+    :param task_id: 任务 id
+    :param sys_user:
+    :return:
+    """
+    if not job_queue.cancel(task_id, sys_user.id):
+        raise HTTPException(status_code=409, detail="任务已结束或不支持取消")
+    return {"detail": "Task cancelled."}
 
 
 @router.post("/update-analyze-job")
@@ -75,4 +134,5 @@ def update_analyze_job(job_in: JobIn,
     key = job_key(JOB_STABLE_ANALYZE, sys_user.id, job_in.sys_session_id)
     remove_job(key)
     if job_in.open:
-        add_job(key, f"定时数据解析-{sys_session.name}", job_in.cron, sys_user.id, analyze, job_in.sys_session_id)
+        add_job(key, f"定时数据解析-{sys_session.name}", job_in.cron, sys_user.id, analyze, [job_in.sys_session_id],
+                job_in.sys_session_id)
@@ -1,7 +1,7 @@
 import os
 from typing import List
 
-from fastapi import Depends, APIRouter, HTTPException, status, BackgroundTasks
+from fastapi import Depends, APIRouter, HTTPException, status
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
@@ -13,10 +13,12 @@ from app.helper.directory_helper import get_wx_dir
 from app.models.sys import SysUser, SysSession, SysSessionExtra
 from app.schemas.sys_schemas import SysSessionSchemaWithId, SysSessionIn, UserCreate, \
     SysSessionSchemaWithHeadImg, SysSessionUpdate, PasswordUpdateRequest, UserOut
+from app.services import auth_cache_service
 from app.services.clear_session import clear_session
 from app.services.decode_wx_db import check_file_list
 from app.services.sys_session_service import session_info
-from app.services.sys_task_maker import TaskObj, task_execute
+from app.services.job_queue import job_queue
+from app.services.sys_task_maker import TaskObj
 from config.auth_config import settings as auth_settings
 from config.log_config import logger
 from db.sys_db import get_db
@@ -70,8 +72,7 @@ def update_current_session(sys_session_id: int, user: SysUser = Depends(get_curr
     db_user = db.query(SysUser).filter_by(id=user.id).first()
     db_user.current_session_id = sys_session_id
     db.commit()
-    # 缓存中的数据
-    user.current_session_id = sys_session_id
+    auth_cache_service.invalidate_user(user.id)
     try:
         head_img = client.get_resource_manager().get_wx_owner_img()
     except Exception as e:
@@ -116,7 +117,8 @@ def create_session(
         wx_mobile=sys_session_in.wx_mobile,
         wx_dir=sys_session_in.wx_dir
     )
-    sys_session.owner = user
+    # user 为缓存对象，不关联到当前 session
+    sys_session.owner_id = user.id
     db.add(sys_session)
     db.commit()
     db.refresh(sys_session)
@@ -134,8 +136,8 @@ def create_session(
     db_user = db.query(SysUser).filter_by(id=user.id).first()
     if not db_user.current_session_id:
         db_user.current_session_id = sys_session.id
-        user.current_session_id = sys_session.id
         db.commit()
+        auth_cache_service.invalidate_user(user.id)
     # 创建对应目录
     wx_dir = get_wx_dir(sys_session)
     if not os.path.exists(wx_dir):
@@ -147,12 +149,12 @@ def create_session(
 
 @router.delete("/sys-session/{sys_session_id}")
 def delete_session(sys_session_id: int,
-                    background_tasks: BackgroundTasks,
                    user: SysUser = Depends(get_current_user),
                    db: Session = Depends(get_db)):
     sys_session = db.query(SysSession).filter_by(id=sys_session_id).first()
     db.delete(sys_session)
     db.commit()
+    auth_cache_service.invalidate_sys_session(sys_session_id)
 
     sys_user = db.query(SysUser).filter_by(id=user.id).first()
     if sys_user is not None and sys_user.current_session_id == sys_session.id:
@@ -160,9 +162,10 @@ def delete_session(sys_session_id: int,
         if first_session is not None:
             sys_user.current_session_id = first_session.id
             db.commit()
+        auth_cache_service.invalidate_user(sys_user.id)
     # 异步执行清除硬盘数据
-    task_obj = TaskObj(sys_user.id, "清除session数据", clear_session, sys_session.id)
-    background_tasks.add_task(task_execute, task_obj)
+    task_obj = TaskObj(sys_user.id, "清除session数据", clear_session, sys_session.id, session_id=sys_session.id)
+    job_queue.submit(task_obj)
 
 
 @router.put("/sys-session", response_model=SysSessionSchemaWithHeadImg)
@@ -182,6 +185,7 @@ def update_session(
     db_session.wx_dir = sys_session_update.wx_dir
     db_session.wx_mobile = sys_session_update.wx_mobile
     db.commit()
+    auth_cache_service.invalidate_sys_session(sys_session.id)
     # 修改的会话为当前会话，重新设置缓存中的当前会话
     ClientFactory.refresh_client_by_id(sys_session.id)
     return update_current_session(sys_session.id, user, db)
@@ -193,8 +197,10 @@ def update_password(password_form: PasswordUpdateRequest,
                     db: Session = Depends(get_db)):
     if not pwd_context.verify(password_form.old_password.strip(), user.password):
         raise BizException("当前密码不正确")
-    user.password = pwd_context.hash(password_form.new_password.strip())
+    db_user = db.query(SysUser).filter_by(id=user.id).one()
+    db_user.password = pwd_context.hash(password_form.new_password.strip())
     db.commit()
+    auth_cache_service.invalidate_user(user.id)
 
 
 @router.get("/users", response_model=List[UserOut])
@@ -210,6 +216,7 @@ def users(user_id: int,
     update_user = db.query(SysUser).filter_by(id=user_id).one()
     update_user.state = UserState.INVALID
     db.commit()
+    auth_cache_service.invalidate_user(user_id)
 
 
 @router.put("/active/{user_id}")
@@ -219,6 +226,7 @@ def users(user_id: int,
     update_user = db.query(SysUser).filter_by(id=user_id).one()
     update_user.state = UserState.NORMAL
     db.commit()
+    auth_cache_service.invalidate_user(user_id)
 
 
 @router.put("/reset-password/{user_id}")
@@ -234,8 +242,9 @@ def reset_password(user_id: int,
     if update_user is None:
         raise BizException("用户不存在")
     password = pwd_context.hash(auth_settings.reset_password)
-    user.password = password
+    update_user.password = password
     db.commit()
+    auth_cache_service.invalidate_user(user_id)
 
 
 @router.get("/session-check/{session_id}")
@@ -4,15 +4,22 @@ import time
 from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, Depends, HTTPException 
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Header, Request
 from sqlalchemy.orm import Session
 
 from app.dependencies.auth_dep import get_current_user
+from app.exception.biz_exception import BizException, IllegalArgumentsException
 from app.helper.directory_helper import get_session_dir, get_wx_dir_directly
+from app.helper.executor_helper import run_io
 from app.models.sys import SysSession
-from app.schemas.sys_schemas import User, SysSessionOut
+from app.schemas.sys_schemas import User, SysSessionOut, ChunkUploadCreate, ChunkUploadOut, SyncManifestIn, \
+    SyncManifestOut
+from app.services import upload_service, sync_service, auth_cache_service
 from app.services.analyze import analyze
-from app.services.sys_task_maker import TaskObj, task_execute
+from app.services.decrypt_pipeline import decrypt_pipeline
+from config.app_config import settings as app_settings
+from app.services import analyze_trigger
+from app.services.sys_task_maker import TaskObj, priority_sync
 from config.log_config import logger
 from db.sys_db import get_db
 
@@ -55,13 +62,19 @@ async def upload_zip(
     directory.mkdir(parents=True, exist_ok=True)
 
     logger.info("保存路径：" + save_path)
-    with open(save_path, "wb") as f:
+    # 先写临时文件再替换，避免覆盖同步去重产生的硬链接共享内容
+    tmp_path = f"{save_path}.uploading"
+    with open(tmp_path, "wb") as f:
         shutil.copyfileobj(file.file, f)
+    os.replace(tmp_path, save_path)
+    # 文件写入完成后才在同步清单中确认
+    await run_io(sync_service.confirm_upload, sys_session_id, wx_id, file_path)
+    # 上传完成即解密或建立索引，不等待整体同步结束
+    decrypt_pipeline.submit(sys_session_id, save_path)
 
 
 @router.post("/upload-zip/")
 async def upload_zip(
-        background_tasks: BackgroundTasks,
         file: UploadFile = File(...),
         sys_session_id: Optional[int] = Form(...),
         db: Session = Depends(get_db)
@@ -80,24 +93,102 @@ async def upload_zip(
     if uploaded_file_size == file.file._file.seek(0, os.SEEK_END):
         logger.info("文件上传完成，大小为" + str(uploaded_file_size))
         sys_session = db.query(SysSession).filter_by(id=sys_session_id).first()
-        task_obj = TaskObj(sys_session.owner_id, "数据库解析任务", analyze, sys_session_id)
-        background_tasks.add_task(task_execute, task_obj)
+        task_obj = TaskObj(sys_session.owner_id, "数据库解析任务", analyze, sys_session_id,
+                           session_id=sys_session_id, priority=priority_sync)
+        analyze_trigger.submit(task_obj)
         return {"detail": "File uploaded successfully."}
     else:
         logger.info("文件正在上传")
         return {"detail": "Upload incomplete."}
 
 
+@router.post("/sync/manifest", response_model=SyncManifestOut)
+def sync_manifest(manifest: SyncManifestIn):
+    """
+    增量同步：客户端上报文件清单 (路径, 大小, 修改时间, sha256)，返回服务器缺失或已变化、需要上传的文件
+    服务器已有相同内容的文件直接链接，不需要上传
+    """
+    result = sync_service.diff_manifest(manifest)
+    for path in result.linked:
+        decrypt_pipeline.submit(manifest.sys_session_id,
+                                upload_service.resolve_target_path(manifest.sys_session_id, manifest.wx_id, path))
+    return result
+
+
+@router.post("/uploads", response_model=ChunkUploadOut)
+def create_chunk_upload(form: ChunkUploadCreate):
+    """
+    创建分片上传，已存在未完成的相同上传时返回其进度，客户端据此续传缺失的分片
+    """
+    return upload_service.create_upload(form)
+
+
+@router.get("/uploads/{upload_id}", response_model=ChunkUploadOut)
+def chunk_upload_status(upload_id: str):
+    """
+    查询分片上传进度
+    """
+    return upload_service.upload_status(upload_id)
+
+
+@router.put("/uploads/{upload_id}/chunks/{index}", response_model=ChunkUploadOut)
+async def upload_chunk(upload_id: str, index: int, request: Request,
+                       x_chunk_sha256: Optional[str] = Header(None)):
+    """
+    上传一个分片，请求体为分片原始字节，分片可乱序、并发上传
+    :param index: 分片序号，从 0 开始，写入偏移为 index * chunk_size
+    :param x_chunk_sha256: 分片 sha256，校验失败的分片不会记为已接收
+    """
+    data = bytearray()
+    async for block in request.stream():
+        data += block
+        if len(data) > app_settings.upload_max_chunk_size:
+            raise IllegalArgumentsException("分片过大")
+    return await run_io(upload_service.write_chunk, upload_id, index, bytes(data), x_chunk_sha256)
+
+
+@router.post("/uploads/{upload_id}/commit", response_model=ChunkUploadOut)
+def commit_chunk_upload(upload_id: str,
+                        do_analyze: bool = True,
+                        db: Session = Depends(get_db)):
+    """
+    所有分片上传完成后提交，文件移动到目标路径
+    :param do_analyze: 是否提交解析任务，批量上传多个文件时只需最后一个提交
+    """
+    sys_session_id = upload_service.load_manifest(upload_id)["sys_session_id"]
+    sys_session = db.query(SysSession).filter_by(id=sys_session_id).first()
+    if sys_session is None:
+        raise BizException("会话不存在", status_code=404)
+    manifest = upload_service.commit_upload(upload_id)
+    # commit_upload 已校验过清单中的 sha256
+    sync_service.confirm_upload(manifest["sys_session_id"], manifest.get("wx_id"), manifest["file_path"],
+                                manifest.get("sha256"))
+    if manifest.get("wx_id"):
+        decrypt_pipeline.submit(manifest["sys_session_id"], manifest["target"])
+    if do_analyze:
+        task_obj = TaskObj(sys_session.owner_id, "数据库解析任务", analyze, sys_session_id,
+                           session_id=sys_session_id, priority=priority_sync)
+        analyze_trigger.submit(task_obj)
+    return upload_service.to_out(manifest)
+
+
+@router.delete("/uploads/{upload_id}")
+def abort_chunk_upload(upload_id: str):
+    """
+    取消分片上传，删除临时文件
+    """
+    upload_service.abort_upload(upload_id)
+    return {"detail": "Upload aborted."}
+
+
 @router.post("/do-decrypt/{sys_session_id}", response_model=SysSessionOut)
 def client_decrypt(sys_session_id: int,
-               background_tasks: BackgroundTasks,
                update_time: int = int(time.time()),
                sys_user: User = Depends(get_current_user),
                db: Session = Depends(get_db)):
     """
     客户端同步完数据后调用，设置上次同步时间，提交异步解析任务
     :param sys_session_id:
-    :param background_tasks:
     :param update_time:
     :param sys_user:
     :param db:
@@ -107,8 +198,10 @@ def client_decrypt(sys_session_id: int,
     sys_session = db.query(SysSession).filter_by(id=sys_session_id).first()
     sys_session.update_time = update_time
     db.commit()
+    auth_cache_service.invalidate_sys_session(sys_session_id)
     db.refresh(sys_session)
     # 异步执行解析
-    task_obj = TaskObj(sys_user.id, f"数据解析-{sys_session.name}", analyze, sys_session_id)
-    background_tasks.add_task(task_execute, task_obj)
+    task_obj = TaskObj(sys_user.id, f"数据解析-{sys_session.name}", analyze, sys_session_id,
+                       session_id=sys_session_id, priority=priority_sync)
+    analyze_trigger.submit(task_obj)
     return sys_session
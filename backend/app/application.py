@@ -6,14 +6,19 @@ from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
 
 from app.exception.auth_exception import LoginException
+from app.api import metrics_api
+from app.helper import executor_helper, profile_helper
+from app.middleware.profile_middleware import profile_request
 from app.middleware.request_id_middleware import add_request_id
+from app.services.image_proxy_service import image_proxy
+from app.services.job_queue import job_queue
 from app.services.sys_conf_service import initial_sys_info
 from app.services.user_service import update_user_none_state
 from routes import api
 from fastapi_pagination import add_pagination
 
 from app.exception.handler_exception import global_exception_handler, login_exception_handler
-from db.sys_db import engine, Base
+from db.sys_db import engine, Base, add_missing_columns
 # 加载表模型，确保创建表
 from app.models import sys
 from config.app_config import settings
@@ -37,6 +42,7 @@ def create_app() -> FastAPI:
 
     # 创建数据库与所有系统表
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
 
     # 启动并注册生命周期函数 lifespan
     app = FastAPI(lifespan=lifespan)
@@ -48,12 +54,17 @@ def create_app() -> FastAPI:
     # 配置静态文件映射
     app.mount(settings.head_mapping, StaticFiles(directory=str(head_path)), name="images")
 
-    # 中间件
+    # 中间件，后注册的在外层
+    app.middleware('http')(profile_request)
     app.middleware('http')(add_request_id)
     # 路由
     app.include_router(api.router)
+    # 监控指标，不带 /api 前缀，供 Prometheus 直接抓取
+    app.include_router(metrics_api.router, tags=["metrics"])
     # 分页
     add_pagination(app)
+    # 同步接口在线程池中执行，包装后才能被性能分析采集
+    profile_helper.install(app)
 
     # 通用异常处理
     app.add_exception_handler(Exception, global_exception_handler)
@@ -78,6 +89,7 @@ async def lifespan(app: FastAPI):
         startup()
         yield
         shutdown()
+        await image_proxy.close()
     except Exception as e:
         logger.error(e)
 
@@ -92,6 +104,10 @@ def startup():
     initial_sys_info()
     # 用户状态兼容
     update_user_none_state()
+    # 阻塞任务线程池、进程池与事件循环延迟监测
+    executor_helper.start()
+    # 任务队列调度
+    job_queue.start()
 
 
 def shutdown():
@@ -113,4 +129,6 @@ def shutdown():
     except Exception as e:
         logger.warning('scheduler shutdown error')
         logger.error(e)
+    job_queue.shutdown()
+    executor_helper.shutdown()
 
@@ -11,7 +11,7 @@ from app.models.sys import SysUser, SysSession, SysSessionExtra
 from app.schemas.sys_schemas import UserInDB
 from config.auth_config import settings
 from db.sys_db import get_db
-from config.cache_config import cache_half_hour
+from app.services import auth_cache_service
 from config.log_config import logger
 from passlib.handlers import bcrypt
 
@@ -42,6 +42,17 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
     return encoded_jwt
 
 
+def token_username(token: str) -> str | None:
+    """
+    校验 jwt 凭证，返回用户名，凭证无效时返回 None
+    """
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
 def get_user(db, username: str):
     if username in db:
         user_dict = db[username]
@@ -57,40 +68,34 @@ def authenticate_user(fake_db, username: str, password: str):
     return user
 
 
-async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    # 尝试从缓存中获取
-    # cached_user = cache_half_hour.get(token)
-    # if cached_user is not None:
-    #     logger.info("返回缓存中存在的用户")
-    #     return cached_user
-    # logger.info("缓存中不存在用户信息，数据库查询该用户")
     try:
 
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         username: str = payload.get("sub")
-        logger.info("username is " + username)
         if username is None:
             logger.info("jwt 凭证中用户名不存在")
             raise credentials_exception
     except JWTError as e:
-        logger.error('jwt error', e)
+        logger.error('jwt error: %s', e)
         raise credentials_exception
-    user = db.query(SysUser).filter_by(username=username).first()
+    # 用户信息缓存，修改用户的接口中主动失效；缓存对象已脱离 session，修改需重新查询
+    user = auth_cache_service.get_user(username)
     if user is None:
         logger.info("数据库中用户不存在")
         raise credentials_exception
-    cache_half_hour[token] = user
-    logger.info("缓存用户")
     return user
 
 
-def get_current_sys_session(db: Session = Depends(get_db), user: SysUser = Depends(get_current_user)):
-    return db.query(SysSession).filter_by(id=user.current_session_id).first()
+def get_current_sys_session(user: SysUser = Depends(get_current_user)):
+    if user.current_session_id is None:
+        return None
+    return auth_cache_service.get_sys_session(user.current_session_id)
 
 
 def get_current_wx_id(sys_session: SysSession = Depends(get_current_sys_session)):
@@ -99,6 +104,10 @@ def get_current_wx_id(sys_session: SysSession = Depends(get_current_sys_session)
 
 def get_wx_client(db: Session = Depends(get_db), sys_session: SysSession = Depends(get_current_sys_session)) -> ClientInterface | None:
     if sys_session:
+        # 已创建的客户端直接返回，无需查询 SysSessionExtra
+        client = ClientFactory.get_cached_client(sys_session.id)
+        if client is not None:
+            return client
         extra = db.query(SysSessionExtra).filter_by(sys_session_id=sys_session.id).first()
         return ClientFactory.get_client(sys_session, extra)
     return None
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import typing
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# 按内容寻址的资源（md5、内容摘要），内容不会变化
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+# 按路径定位的资源，缓存一天，过期后带 ETag 重新校验
+CACHE_PRIVATE = "private, max-age=86400"
+
+
+def key_etag(*parts) -> str:
+    """根据内容标识（md5 等）生成强 ETag"""
+    return '"' + hashlib.md5(":".join(str(p) for p in parts).encode("utf-8")).hexdigest() + '"'
+
+
+def file_etag(path: str) -> str:
+    """根据源文件路径、修改时间、大小生成强 ETag，不读取文件内容"""
+    stat_result = os.stat(path)
+    return key_etag(path, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def content_etag(data: bytes) -> str:
+    """根据内容摘要生成强 ETag"""
+    return '"' + hashlib.md5(data).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def cache_headers(etag: str, cache_control: str = CACHE_PRIVATE) -> typing.Dict[str, str]:
+    return {"etag": etag, "cache-control": cache_control}
+
+
+def not_modified(request: Request, etag: str, cache_control: str = CACHE_PRIVATE) -> Response | None:
+    """
+    If-None-Match 命中时返回 304，调用方应在解密等耗时操作前调用
+    :return: 304 响应，未命中返回 None
+    """
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag, cache_control))
+    return None
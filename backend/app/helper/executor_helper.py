@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, TypeVar
+
+from app.helper import metrics_helper, profile_helper
+from config.executor_config import settings as executor_settings
+from config.log_config import logger
+
+T = TypeVar('T')
+
+_io_pool: ThreadPoolExecutor | None = None
+_cpu_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_monitor_task: asyncio.Task | None = None
+
+# 线程池、进程池中执行的函数耗时（含排队），资源接口的图片解密、解码耗时也在其中
+executor_seconds = metrics_helper.histogram("cloudbak_executor_duration_seconds", "线程池、进程池任务耗时",
+                                            ("pool", "func"))
+
+
+def io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        with _pool_lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(max_workers=executor_settings.io_workers,
+                                              thread_name_prefix='cloudbak-io')
+    return _io_pool
+
+
+def cpu_pool() -> ProcessPoolExecutor | None:
+    global _cpu_pool
+    if executor_settings.cpu_workers <= 0:
+        return None
+    if _cpu_pool is None:
+        with _pool_lock:
+            if _cpu_pool is None:
+                # 服务进程内已有多个线程，使用 spawn 避免 fork 继承锁状态
+                _cpu_pool = ProcessPoolExecutor(max_workers=executor_settings.cpu_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+    return _cpu_pool
+
+
+async def run_io(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    在 IO 线程池中执行阻塞调用（SQLAlchemy 查询、文件读写等），保留上下文变量
+    """
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, profile_helper.profile_call, func, *args, **kwargs)
+    with executor_seconds.time(pool="io", func=getattr(func, "__name__", "unknown")):
+        return await asyncio.get_running_loop().run_in_executor(io_pool(), call)
+
+
+async def run_cpu(func: Callable[..., T], *args) -> T:
+    """
+    在进程池中执行 CPU 密集任务，func 与参数需可被 pickle（模块级函数、路径字符串等）
+    进程池不可用时退回 IO 线程池
+    """
+    global _cpu_pool
+    pool = cpu_pool()
+    # 子进程中的执行无法采集，性能分析时在线程池中执行
+    if pool is None or profile_helper.current() is not None:
+        return await run_io(func, *args)
+    try:
+        with executor_seconds.time(pool="cpu", func=getattr(func, "__name__", "unknown")):
+            return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        logger.warning("CPU 进程池异常，重建进程池")
+        with _pool_lock:
+            if _cpu_pool is pool:
+                _cpu_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        return await run_io(func, *args)
+
+
+class LoopLagMonitor(object):
+    """
+    事件循环延迟监测：定时 sleep，实际唤醒时间与预期的差值即为事件循环被阻塞的时长
+    """
+
+    def __init__(self, interval: float, threshold: float, samples: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = deque(maxlen=samples)
+        self.lag_count = 0
+        self.sample_count = 0
+        self.max_lag = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(loop.time() - expected, 0.0))
+
+    def record(self, lag: float):
+        self.sample_count += 1
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self.lag_count += 1
+            logger.warning(f"事件循环阻塞 {lag * 1000:.0f} ms")
+
+    def percentile(self, p: float) -> float:
+        if not self.lags:
+            return 0.0
+        values = sorted(self.lags)
+        return values[min(int(len(values) * p), len(values) - 1)]
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.sample_count,
+            "lag_count": self.lag_count,
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "p50_lag_ms": round(self.percentile(0.5) * 1000, 2),
+            "p99_lag_ms": round(self.percentile(0.99) * 1000, 2),
+        }
+
+
+loop_lag_monitor = LoopLagMonitor(executor_settings.loop_lag_interval, executor_settings.loop_lag_threshold,
+                                  executor_settings.loop_lag_samples)
+
+
+def start():
+    """
+    启动事件循环延迟监测，需在事件循环中调用
+    """
+    global _monitor_task
+    if _monitor_task is None or _monitor_task.done():
+        _monitor_task = asyncio.get_running_loop().create_task(loop_lag_monitor.run())
+    logger.info(f"执行器启动，IO 线程 {executor_settings.io_workers}，CPU 进程 {executor_settings.cpu_workers}")
+
+
+def shutdown():
+    global _io_pool, _cpu_pool, _monitor_task
+    if _monitor_task is not None:
+        _monitor_task.cancel()
+        _monitor_task = None
+    with _pool_lock:
+        if _cpu_pool is not None:
+            _cpu_pool.shutdown(wait=False, cancel_futures=True)
+            _cpu_pool = None
+        if _io_pool is not None:
+            _io_pool.shutdown(wait=False, cancel_futures=True)
+            _io_pool = None
+
+
+def stats() -> dict:
+    return {
+        "io_workers": executor_settings.io_workers,
+        "cpu_workers": executor_settings.cpu_workers,
+        "loop_lag": loop_lag_monitor.stats(),
+    }
@@ -0,0 +1,182 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# 默认耗时分桶（秒），覆盖 1ms ~ 60s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 采集函数返回 (指标名, 类型, 说明, [(标签, 值)])，用于导出各模块已有的统计
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+_lock = threading.Lock()
+_metrics: Dict[str, "Metric"] = {}
+_collectors: List[Collector] = []
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(object):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = list(self.values.items())
+        return [f"{self.name}{format_labels(dict(zip(self.labelnames, key)))} {format_value(value)}"
+                for key, value in items]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各分桶计数..., 总数, 总和]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                row[index] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """统计代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = [(key, list(row)) for key, row in self.values.items()]
+        lines = []
+        for key, row in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': format_value(float(bound))})} "
+                             f"{format_value(cumulative)}")
+            lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': '+Inf'})} {format_value(row[-2])}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {format_value(row[-2])}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(float(row[-1]))}")
+        return lines
+
+
+def _register(metric: Metric) -> Metric:
+    with _lock:
+        existing = _metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        _metrics[metric.name] = metric
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    """注册计数器，同名指标只注册一次"""
+    return _register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """注册直方图，同名指标只注册一次"""
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def register_collector(collector: Collector):
+    """注册采集函数，导出时调用，适合已有内部统计的模块（线程池、代理缓存等）"""
+    with _lock:
+        _collectors.append(collector)
+
+
+# 通用缓存命中统计
+cache_requests = counter("cloudbak_cache_requests_total", "内存缓存查询次数", ("cache", "result"))
+
+
+def cache_hit(cache: str):
+    cache_requests.inc(cache=cache, result="hit")
+
+
+def cache_miss(cache: str):
+    cache_requests.inc(cache=cache, result="miss")
+
+
+def render() -> str:
+    """
+    导出 Prometheus 文本格式
+    """
+    with _lock:
+        metrics = list(_metrics.values())
+        collectors = list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render())
+    for collector in collectors:
+        try:
+            collected = list(collector())
+        except Exception as e:
+            lines.append(f"# collector error: {e}")
+            continue
+        for name, metric_type, documentation, samples in collected:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{format_labels(labels)} {format_value(float(value))}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,179 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from config.app_config import settings as app_settings
+
+profile_session = contextvars.ContextVar('profile_session', default=None)
+
+# 同一线程同时只能有一个 cProfile 生效，事件循环线程上的采集串行进行
+loop_profile_lock = threading.Lock()
+
+PROFILE_NAME_PATTERN = re.compile(r'^[\w.-]+\.(prof|txt)$')
+
+# 按源文件、函数名归类耗时，用于响应头摘要
+CATEGORIES = (
+    ("sql", ("sqlite3", "sqlalchemy")),
+    ("zstd", ("zstd", "zstandard")),
+    ("xml", ("xml", "lxml", "xmltodict")),
+    ("protobuf", ("protobuf",)),
+    ("fs", ("<built-in method io.open>", "<built-in method posix.", "<built-in method nt.", "os.py", "shutil.py",
+            "pathlib.py", "method 'read' of '_io", "method 'write' of '_io")),
+)
+
+
+class ProfileSession(object):
+    """
+    单次请求的性能分析：事件循环线程、接口线程、IO 线程池中的执行分别采集后合并
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.profiles: List[cProfile.Profile] = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def profile(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self.lock:
+                self.profiles.append(profiler)
+
+    def stats(self) -> pstats.Stats | None:
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        return stats
+
+    def save(self) -> Dict[str, str] | None:
+        """
+        保存 .prof（可用 snakeviz 等工具打开）与 .txt 文本报告
+        :return: 响应头
+        """
+        stats = self.stats()
+        if stats is None:
+            return None
+        elapsed = time.perf_counter() - self.started
+        directory = profile_dir()
+        file_id = f"{int(time.time() * 1000)}-{self.name}"
+        stats.dump_stats(os.path.join(directory, f"{file_id}.prof"))
+        buffer = io.StringIO()
+        stats.stream = buffer
+        stats.sort_stats("cumulative").print_stats(60)
+        stats.sort_stats("tottime").print_stats(30)
+        text = summary(stats, elapsed)
+        with open(os.path.join(directory, f"{file_id}.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"{self.name}\n{text}\n\n")
+            f.write(buffer.getvalue())
+        cleanup(directory)
+        return {"x-profile-id": file_id, "x-profile-summary": text}
+
+
+def current() -> ProfileSession | None:
+    return profile_session.get()
+
+
+def profile_call(func, *args, **kwargs):
+    """
+    当前请求开启性能分析时，在分析器下执行阻塞调用
+    """
+    session = current()
+    if session is None:
+        return func(*args, **kwargs)
+    with session.profile():
+        return func(*args, **kwargs)
+
+
+def profiled(func):
+    """同步接口包装，接口在线程池中执行时同样被采集"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return profile_call(func, *args, **kwargs)
+
+    return wrapper
+
+
+def install(app):
+    """
+    包装所有同步接口，需在路由注册完成后调用
+    """
+    from fastapi.routing import APIRoute, request_response
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not inspect.iscoroutinefunction(route.dependant.call):
+            route.dependant.call = profiled(route.dependant.call)
+            route.app = request_response(route.get_route_handler())
+
+
+def category_of(key) -> str | None:
+    filename, _, func_name = key
+    text = f"{filename}:{func_name}"
+    for category, marks in CATEGORIES:
+        if any(mark in text for mark in marks):
+            return category
+    return None
+
+
+def summary(stats: pstats.Stats, elapsed: float) -> str:
+    """
+    响应头摘要：总耗时、各类别自身耗时、自身耗时最高的函数
+    """
+    totals = {}
+    for key, (_, _, tottime, _, _) in stats.stats.items():
+        category = category_of(key)
+        if category:
+            totals[category] = totals.get(category, 0.0) + tottime
+    top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:3]
+    parts = [f"total={elapsed:.3f}s"]
+    parts += [f"{category}={value:.3f}s" for category, value in sorted(totals.items(), key=lambda i: -i[1])]
+    parts += [f"top={os.path.basename(key[0])}:{key[2]}:{value[2]:.3f}s" for key, value in top]
+    # 响应头只能使用 latin-1 字符
+    return "; ".join(parts).encode("ascii", "replace").decode("ascii")
+
+
+def profile_dir() -> str:
+    path = os.path.join(app_settings.sys_dir, app_settings.log_dir, app_settings.profile_dir)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def list_profiles() -> List[str]:
+    directory = profile_dir()
+    return sorted((name for name in os.listdir(directory) if PROFILE_NAME_PATTERN.match(name)), reverse=True)
+
+
+def profile_path(name: str) -> str | None:
+    if not PROFILE_NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(profile_dir(), name)
+    return path if os.path.exists(path) else None
+
+
+def cleanup(directory: str):
+    """只保留最近 profile_keep 次采集"""
+    names = sorted({name.rsplit(".", 1)[0] for name in os.listdir(directory) if PROFILE_NAME_PATTERN.match(name)},
+                   reverse=True)
+    for file_id in names[app_settings.profile_keep:]:
+        for ext in ("prof", "txt"):
+            try:
+                os.remove(os.path.join(directory, f"{file_id}.{ext}"))
+            except OSError:
+                pass
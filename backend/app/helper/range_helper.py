@@ -0,0 +1,140 @@
+import os
+import typing
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+# 非零拷贝时每次读取的块大小
+CHUNK_SIZE = 256 * 1024
+
+
+def parse_range(range_header: str | None, size: int) -> typing.Tuple[int, int] | None | bool:
+    """
+    解析 Range 请求头，只支持单个区间
+    :return: (start, end) 闭区间；None 表示按完整文件返回；False 表示区间不可满足
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        # 多区间直接返回完整内容，RFC 允许
+        return None
+    start_str, sep, end_str = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if start_str == "":
+            # bytes=-500 最后 500 字节
+            suffix = int(end_str)
+            if suffix <= 0:
+                return False
+            return max(size - suffix, 0), size - 1
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        return None
+    if start > end:
+        # 语法无效的区间忽略
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request: Request, etag: str | None, last_modified: str | None) -> bool:
+    """
+    If-Range 与当前 ETag / Last-Modified 一致时才返回部分内容
+    """
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    return if_range == etag or if_range == last_modified
+
+
+class RangeFileResponse(FileResponse):
+    """
+    支持 Range 的文件响应，服务器支持 ASGI zerocopysend 扩展时通过 sendfile 发送
+    """
+
+    def __init__(self, path: str, start: int, end: int, stat_result: os.stat_result, status_code: int = 200,
+                 **kwargs):
+        super().__init__(path, status_code=status_code, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start + 1)
+        self.headers["accept-ranges"] = "bytes"
+        if status_code == 206:
+            self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            # HEAD 与空文件也要发送结束的空 body，否则响应不会完成
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": count,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = count
+                while remaining > 0:
+                    chunk = await file.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # 文件在发送过程中变短，提前结束响应
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def range_file_response(request: Request, path: str, media_type: str | None = None,
+                        headers: typing.Mapping[str, str] | None = None, filename: str | None = None) -> Response:
+    """
+    返回文件，按 Range / If-Range 返回 206 部分内容
+    :param request: 当前请求
+    :param path: 文件路径
+    """
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    response = RangeFileResponse(path, 0, size - 1, stat_result, media_type=media_type, headers=headers,
+                                 filename=filename)
+    if size == 0:
+        return response
+    byte_range = parse_range(request.headers.get("range"), size)
+    if byte_range is None or not if_range_matches(request, response.headers.get("etag"),
+                                                  response.headers.get("last-modified")):
+        return response
+    if byte_range is False:
+        return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+    start, end = byte_range
+    return RangeFileResponse(path, start, end, stat_result, status_code=206, media_type=media_type,
+                             headers=headers, filename=filename)
+
+
+def range_bytes_response(request: Request, data: bytes, media_type: str | None = None,
+                         headers: typing.Mapping[str, str] | None = None) -> Response:
+    """
+    内存数据（如解密后的图片）的 Range 响应，headers 中带 etag 时才支持 If-Range
+    """
+    size = len(data)
+    headers = {**(headers or {}), "accept-ranges": "bytes"}
+    byte_range = parse_range(request.headers.get("range"), size) if size else None
+    if byte_range is None or not if_range_matches(request, headers.get("etag"), None):
+        return Response(data, media_type=media_type, headers=headers)
+    if byte_range is False:
+        return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    return Response(data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
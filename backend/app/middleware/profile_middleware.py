@@ -0,0 +1,56 @@
+import re
+from contextlib import nullcontext
+
+from fastapi import Request
+
+from app.dependencies.auth_dep import token_username
+from app.helper import executor_helper, profile_helper
+from config.app_config import settings as app_settings
+from config.log_config import logger
+
+
+def profile_name(request: Request) -> str:
+    path = re.sub(r'[^\w-]+', '_', request.url.path).strip('_')
+    return f"{request.method.lower()}-{path}"[:80]
+
+
+def profile_requested(request: Request) -> bool:
+    """
+    仅登录用户可通过请求头 X-Profile: 1 开启
+    """
+    if not app_settings.profile_enabled or request.headers.get("x-profile") != "1":
+        return False
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and token_username(token) is not None
+
+
+async def profile_request(request: Request, call_next):
+    """
+    按需采集单次请求的性能分析，结果写入日志目录，响应头返回文件 id 与耗时摘要
+    :param request:
+    :param call_next:
+    :return:
+    """
+    if not profile_requested(request):
+        return await call_next(request)
+    session = profile_helper.ProfileSession(profile_name(request))
+    token = profile_helper.profile_session.set(session)
+    # 事件循环线程上的采集包含同一时间其他协程的执行，同时只允许一个请求采集
+    loop_profile = profile_helper.loop_profile_lock.acquire(blocking=False)
+    try:
+        with session.profile() if loop_profile else nullcontext():
+            response = await call_next(request)
+    finally:
+        if loop_profile:
+            profile_helper.loop_profile_lock.release()
+        profile_helper.profile_session.reset(token)
+    try:
+        headers = await executor_helper.run_io(session.save)
+    except Exception as e:
+        logger.warning(f"保存性能分析失败: {e}")
+        return response
+    if headers:
+        response.headers.update(headers)
+        logger.info(f"性能分析 {headers['x-profile-id']}: {headers['x-profile-summary']}")
+    return response
@@ -1,11 +1,31 @@
+import time
+
 from fastapi import Request
 
+from app.helper import metrics_helper
 from config.log_config import set_log_id, logger
 
+request_seconds = metrics_helper.histogram("cloudbak_http_request_duration_seconds", "接口请求耗时",
+                                           ("method", "route", "status"))
+# endpoint -> 路由模板，标签使用模板而不是实际路径，避免路径参数导致标签数量膨胀
+route_templates = {}
+
+
+def route_template(request: Request) -> str:
+    endpoint = request.scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    template = route_templates.get(endpoint)
+    if template is None:
+        template = next((route.path for route in request.app.routes
+                         if getattr(route, "endpoint", None) is endpoint), endpoint.__name__)
+        route_templates[endpoint] = template
+    return template
+
 
 async def add_request_id(request: Request, call_next):
     """
-    为每个请求生成一个唯一的 request_id
+    为每个请求生成一个唯一的 request_id，并记录接口耗时
     :param request:
     :param call_next:
     :return:
@@ -14,7 +34,14 @@ async def add_request_id(request: Request, call_next):
 
     logger.info('%s %s', request.method, request.url.path)
 
-    response = await call_next(request)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        request_seconds.observe(time.perf_counter() - start, method=request.method,
+                                route=route_template(request), status=status_code)
 
     logger.info('Response code: %s', response.status_code)
     return response
@@ -82,6 +82,15 @@ class SysTask(Base):
     create_time = Column(Integer, default=time.time())
     update_time = Column(Integer, default=time.time())
     owner_id = Column(Integer, ForeignKey("sys_user.id"), default=None)
+    # 任务队列：所属会话（同一会话的任务互斥）、优先级（越小越先执行）、执行函数与 JSON 参数
+    session_id = Column(Integer, default=None)
+    priority = Column(Integer, default=None)
+    job = Column(String, default=None)
+    args = Column(String, default=None)
+    # 最近一次进度快照（JSON）
+    progress = Column(String, default=None)
+    # 不早于该时间戳执行，用于合并短时间内的重复触发
+    run_after = Column(Integer, default=None)
 
 
 class SysConfig(Base):
@@ -172,6 +172,9 @@ class SysTaskOut(BaseModel):
     create_time: float
     update_time: float
     owner_id: int
+    session_id: int | None = None
+    priority: int | None = None
+    progress: str | None = None
 
 
 class PasswordUpdateRequest(BaseModel):
@@ -192,3 +195,53 @@ class SysInfoOut(BaseModel):
     sys_conf: Optional[SystemConfig] = None
     # 系统版本号
     sys_version: Optional[str] = 'unkown'
+
+
+class ChunkUploadCreate(BaseModel):
+    sys_session_id: int
+    # 为空时保存到会话目录，否则保存到微信目录
+    wx_id: Optional[str] = None
+    # 相对路径
+    file_path: str
+    # 文件总大小
+    size: int
+    # 分片大小，为空时使用系统默认值
+    chunk_size: Optional[int] = None
+    # 整个文件的 sha256，提交时校验
+    sha256: Optional[str] = None
+
+
+class ChunkUploadOut(BaseModel):
+    upload_id: str
+    file_path: str
+    size: int
+    chunk_size: int
+    total_chunks: int
+    # 已接收的分片序号
+    received: List[int]
+    completed: bool = False
+
+
+class SyncFile(BaseModel):
+    # 相对微信目录的路径
+    path: str
+    size: int
+    # 客户端文件修改时间（秒）
+    mtime: float
+    # 文件内容 sha256，用于去重
+    sha256: Optional[str] = None
+
+
+class SyncManifestIn(BaseModel):
+    sys_session_id: int
+    wx_id: str
+    files: List[SyncFile]
+
+
+class SyncManifestOut(BaseModel):
+    # 需要上传的文件
+    missing: List[str]
+    # 服务器已有相同内容，直接链接生成的文件
+    linked: List[str]
+    # 未变化的文件数量
+    unchanged: int
@@ -1,15 +1,20 @@
+from app.services.decrypt_pipeline import session_lock
 from wx.client_factory import ClientFactory
 
 
 def analyze(sys_session_id: int, deep: bool = False):
     """
     用户上传的zip文件分析处理
+    上传流水线已解密的库文件修改时间未变，此处直接跳过
+    解密文件逐个原子替换，已打开的连接继续读取旧文件，解密完成后再清除缓存切换到新文件，解析期间浏览数据保持一致
     :param sys_session_id: 用户建立的 session_id
     :param deep，全量解析
     :return:
     """
     client = ClientFactory.get_client_by_id(sys_session_id)
     if client:
-        client.clear()
-        client.get_decryptor().decrypt(deep)
-
+        with session_lock(sys_session_id):
+            client.get_decryptor().decrypt(deep)
+            client.clear()
+            client.build_indexes(deep)
+            client.build_stats(deep)
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+from itertools import zip_longest
+
+from app.models.sys import SysTask
+from app.services.job_queue import job_queue, func_path
+from app.services.sys_task_maker import TaskObj, task_queued, task_running, task_success, priority_sync, \
+    priority_cron
+from config.job_config import settings as job_settings
+from config.log_config import logger
+from db.sys_db import SessionLocal
+
+# 检查与合并排队任务需要串行，避免并发触发各自入队
+trigger_lock = threading.Lock()
+
+
+def merge_args(old: list, new: list) -> list:
+    """
+    合并两次触发的参数，逐位取或：analyze(sys_session_id, deep) 任一次要求全量解析则全量解析
+    """
+    return [o or n for o, n in zip_longest(old, new)]
+
+
+def submit(obj: TaskObj) -> int | None:
+    """
+    提交会话级任务，同一会话、同一函数的触发合并为一个任务：
+    排队中已有相同任务时合并参数与优先级；客户端同步触发延迟执行，连续同步只解析一次；
+    定时触发时该会话正在解析或刚解析完成则跳过
+    :return: 任务 id，跳过时返回 None
+    """
+    if obj.session_id is None:
+        return job_queue.submit(obj)
+    now = time.time()
+    job = func_path(obj.func)
+    if obj.priority == priority_sync:
+        obj.run_after = now + job_settings.sync_debounce
+    with trigger_lock:
+        with SessionLocal() as db:
+            tasks = db.query(SysTask).filter_by(session_id=obj.session_id, job=job)
+            if obj.priority == priority_cron:
+                if tasks.filter(SysTask.state.in_([task_queued, task_running])).first() is not None:
+                    logger.info(f"会话 {obj.session_id} 已有解析任务，跳过定时触发")
+                    return None
+                fresh = (tasks.filter_by(state=task_success)
+                         .filter(SysTask.update_time >= now - job_settings.cron_fresh_window).first())
+                if fresh is not None:
+                    logger.info(f"会话 {obj.session_id} 刚完成解析（任务 {fresh.id}），跳过定时触发")
+                    return None
+            queued = tasks.filter_by(state=task_queued).order_by(SysTask.id).first()
+            if queued is not None:
+                queued.args = json.dumps(merge_args(json.loads(queued.args or "[]"), list(obj.args)))
+                queued.priority = min(queued.priority, obj.priority)
+                # 按合并后的优先级决定：含手动触发的任务立即执行；否则同步触发顺延（不晚于首次入队后 sync_max_delay），
+                # 定时触发不改变执行时间
+                if queued.priority < priority_sync:
+                    queued.run_after = None
+                elif obj.priority == priority_sync:
+                    queued.run_after = min(obj.run_after, (queued.create_time or now) + job_settings.sync_max_delay)
+                queued.update_time = now
+                db.commit()
+                logger.info(f"会话 {obj.session_id} 的触发合并到排队任务 {queued.id}")
+                job_queue.wakeup.set()
+                return queued.id
+        return job_queue.submit(obj)
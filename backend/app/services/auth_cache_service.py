@@ -0,0 +1,66 @@
+import threading
+
+from app.helper import metrics_helper
+from app.models.sys import SysUser, SysSession
+from config.cache_config import user_cache, sys_session_cache
+from db.sys_db import get_sys_db
+
+# TTLCache 非线程安全
+cache_lock = threading.Lock()
+# 每次失效加一，查询期间发生失效则不写入缓存，避免写回旧数据
+generation = 0
+
+
+def cached(cache, key, cache_name: str, load):
+    """
+    从缓存读取，未命中时用独立 session 查询并脱离 session 后缓存，
+    缓存的对象不随请求 session 的提交而过期
+    """
+    with cache_lock:
+        value = cache.get(key)
+        current_generation = generation
+    if value is not None:
+        metrics_helper.cache_hit(cache_name)
+        return value
+    metrics_helper.cache_miss(cache_name)
+    with get_sys_db() as db:
+        value = load(db)
+        if value is None:
+            return None
+        db.expunge(value)
+    with cache_lock:
+        if current_generation == generation:
+            cache[key] = value
+    return value
+
+
+def get_user(username: str) -> SysUser | None:
+    return cached(user_cache, username, "auth_user",
+                  lambda db: db.query(SysUser).filter_by(username=username).first())
+
+
+def get_sys_session(sys_session_id: int) -> SysSession | None:
+    return cached(sys_session_cache, sys_session_id, "auth_session",
+                  lambda db: db.query(SysSession).filter_by(id=sys_session_id).first())
+
+
+def invalidate_user(user_id: int = None):
+    """
+    用户信息（密码、状态、当前会话）修改后调用，user_id 为空时清空全部用户缓存
+    """
+    global generation
+    with cache_lock:
+        generation += 1
+        for username, user in list(user_cache.items()):
+            if user_id is None or user.id == user_id:
+                del user_cache[username]
+
+
+def invalidate_sys_session(sys_session_id: int):
+    """
+    会话修改、删除、同步时间更新后调用
+    """
+    global generation
+    with cache_lock:
+        generation += 1
+        sys_session_cache.pop(sys_session_id, None)
@@ -0,0 +1,109 @@
+import os
+import queue
+import threading
+from collections import defaultdict
+from typing import Dict, Set, Tuple
+
+from config.app_config import settings as app_settings
+from config.log_config import logger
+from wx.client_factory import ClientFactory
+
+# 同一会话的解密、建索引与全量解析串行执行
+session_locks: Dict[int, threading.RLock] = defaultdict(threading.RLock)
+
+
+def session_lock(sys_session_id: int) -> threading.RLock:
+    return session_locks[sys_session_id]
+
+
+class DecryptPipeline(object):
+    """
+    上传与解密流水线：文件上传完成即入队，后台线程逐个解密数据库、为附件建立索引
+    队列空闲时为有新解密库的会话重建索引，同步结束时数据已基本可浏览，最终解析只需跳过未变化的文件
+    """
+
+    def __init__(self, idle_delay: float):
+        """
+        :param idle_delay: 队列空闲多少秒后重建索引，避免每个库解密完都重建
+        """
+        self.idle_delay = idle_delay
+        self.queue: queue.Queue = queue.Queue()
+        # 已入队未处理的文件，重复上传同一文件只处理一次
+        self.pending: Set[Tuple[int, str]] = set()
+        # 有新解密库、需要重建索引的会话 -> 重新解密的库文件名
+        self.dirty: Dict[int, Set[str]] = defaultdict(set)
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+        self.decrypted = 0
+        self.indexed = 0
+        self.failed = 0
+
+    def submit(self, sys_session_id: int, file_path: str):
+        """
+        文件上传完成后调用
+        :param file_path: 文件绝对路径
+        """
+        item = (sys_session_id, os.path.abspath(file_path))
+        with self.lock:
+            if item in self.pending:
+                return
+            self.pending.add(item)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='decrypt-pipeline', daemon=True)
+                self.thread.start()
+        self.queue.put(item)
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_delay)
+            except queue.Empty:
+                self.flush()
+                continue
+            with self.lock:
+                self.pending.discard(item)
+            self.process(*item)
+
+    def process(self, sys_session_id: int, file_path: str):
+        if not os.path.exists(file_path):
+            return
+        try:
+            with session_lock(sys_session_id):
+                client = ClientFactory.get_client_by_id(sys_session_id)
+                if file_path.endswith('.db'):
+                    if client.get_decryptor().decrypt_file(file_path):
+                        self.decrypted += 1
+                        self.dirty[sys_session_id].add(os.path.basename(file_path))
+                elif client.get_resource_manager().index_attachment(file_path):
+                    self.indexed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"流水线处理失败 {file_path}: {e}")
+
+    def flush(self):
+        """
+        为有新解密库的会话重建索引，只清理依赖这些库的连接与缓存，浏览中的其他缓存保留
+        会话统计不在此构建：同步结束时触发的解析任务在任务进程中构建，不占用 Web 进程
+        """
+        while self.dirty:
+            sys_session_id, db_names = self.dirty.popitem()
+            try:
+                with session_lock(sys_session_id):
+                    client = ClientFactory.get_client_by_id(sys_session_id)
+                    client.clear_dbs(db_names)
+                    client.build_indexes()
+                logger.info(f"会话 {sys_session_id} 流水线解密完成，索引已更新")
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"会话 {sys_session_id} 重建索引失败: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "decrypted": self.decrypted,
+            "indexed": self.indexed,
+            "failed": self.failed,
+        }
+
+
+decrypt_pipeline = DecryptPipeline(app_settings.pipeline_idle_delay)
@@ -0,0 +1,26 @@
+import functools
+from concurrent.futures import Future
+
+from sqlalchemy.orm import Session
+
+from app.models.sys import SysDecryptRecord
+from db.sys_db import sys_db_writer
+
+
+def save_decrypt_record(db: Session, session_id: int, db_file: str, file_last_ts: float):
+    """
+    记录库文件解密时的修改时间，下次解析时修改时间未变则跳过
+    """
+    record = db.query(SysDecryptRecord).filter_by(db_file=db_file, session_id=session_id).first()
+    if record is None:
+        db.add(SysDecryptRecord(db_file=db_file, file_last_ts=file_last_ts, session_id=session_id))
+    else:
+        record.file_last_ts = file_last_ts
+
+
+def record_decrypted(session_id: int, db_file: str, file_last_ts: float) -> Future:
+    """
+    解密记录交给系统库写线程提交，解密过程不持有写锁
+    """
+    return sys_db_writer.submit(functools.partial(save_decrypt_record, session_id=session_id, db_file=db_file,
+                                                  file_last_ts=file_last_ts))
@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict
+
+import anyio
+import httpx
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.helper.cache_helper import key_etag, not_modified
+from app.helper.executor_helper import run_io
+from config.app_config import settings as app_settings
+from config.log_config import logger
+from config.proxy_config import settings as proxy_settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+def http2_enabled() -> bool:
+    if not proxy_settings.http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.info("未安装 h2，图片代理使用 HTTP/1.1")
+        return False
+    return True
+
+
+class ProxyStreamingResponse(StreamingResponse):
+    """
+    回源转发响应：无论 body 是否开始迭代（客户端可能在发送前断开），响应结束后都执行 release
+    """
+
+    def __init__(self, content, release: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.release()
+
+
+class ImageProxy(object):
+    """
+    远程图片代理：进程内共享一个带连接池的 AsyncClient，响应按 URL 缓存到磁盘
+    缓存文件 <cache_dir>/<sha256 前两位>/<sha256>，元数据保存在同名 .json 中
+    """
+
+    def __init__(self, cache_dir: str, ttl: int, max_size: int, client: httpx.AsyncClient | None = None):
+        """
+        :param cache_dir: 缓存目录
+        :param ttl: 缓存有效期（秒）
+        :param max_size: 缓存最大占用（字节）
+        :param client: 自定义 http 客户端，不传时按配置创建
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        self._client = client
+        self.inflight: Dict[str, asyncio.Event] = {}
+        self.total_size: int | None = None
+        self.origin_fetches = 0
+        self.cache_hits = 0
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=http2_enabled(),
+                follow_redirects=True,
+                timeout=proxy_settings.timeout,
+                limits=httpx.Limits(
+                    max_connections=proxy_settings.max_connections,
+                    max_keepalive_connections=proxy_settings.max_keepalive_connections,
+                    keepalive_expiry=proxy_settings.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def body_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def read_meta(self, key: str) -> dict | None:
+        try:
+            with open(f"{self.body_path(key)}.json", encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(self.body_path(key)) else None
+
+    def cached_response(self, request: Request, key: str, meta: dict) -> Response:
+        body_path = self.body_path(key)
+        # 更新访问时间，用于淘汰
+        os.utime(body_path)
+        self.cache_hits += 1
+        max_age = max(int(meta["expires"] - time.time()), 0)
+        cache_control = f"public, max-age={max_age}"
+        etag = key_etag(key, meta["stored"])
+        return not_modified(request, etag, cache_control) or FileResponse(
+            body_path,
+            media_type=meta.get("content_type") or None,
+            headers={"etag": etag, "cache-control": cache_control},
+        )
+
+    async def fetch(self, request: Request, url: str) -> Response:
+        """
+        获取远程图片：缓存有效直接返回；同一 URL 并发请求只回源一次，其余等待后读取缓存
+        """
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        meta = await run_io(self.read_meta, key)
+        if meta and meta["expires"] > time.time():
+            return await run_io(self.cached_response, request, key, meta)
+        event = self.inflight.get(key)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), proxy_settings.inflight_wait)
+            except asyncio.TimeoutError:
+                logger.warning(f"等待图片回源超时，自行回源: {url}")
+            meta = await run_io(self.read_meta, key) or meta
+            if meta and meta["expires"] > time.time():
+                return await run_io(self.cached_response, request, key, meta)
+        event = asyncio.Event()
+        self.inflight[key] = event
+        try:
+            self.origin_fetches += 1
+            response = await self.client().send(self.client().build_request("GET", url), stream=True)
+        except httpx.RequestError as e:
+            self.finish(key, event)
+            if meta:
+                logger.warning(f"图片回源失败，使用过期缓存: {e}")
+                return await run_io(self.cached_response, request, key, meta)
+            raise HTTPException(status_code=400, detail=f"Error fetching the image: {e}")
+        except BaseException:
+            self.finish(key, event)
+            raise
+        if response.status_code >= 400:
+            await response.aclose()
+            self.finish(key, event)
+            if meta:
+                return await run_io(self.cached_response, request, key, meta)
+            raise HTTPException(status_code=response.status_code, detail="Error from the image server")
+        content_type = response.headers.get("Content-Type", "")
+
+        async def release():
+            await response.aclose()
+            self.finish(key, event)
+
+        return ProxyStreamingResponse(
+            self.stream_and_store(key, url, response, event),
+            release,
+            media_type=content_type,
+            headers={"cache-control": f"public, max-age={self.ttl}"},
+        )
+
+    async def stream_and_store(self, key: str, url: str, response: httpx.Response, event: asyncio.Event):
+        """
+        边转发边写入缓存，传输完整后再替换缓存文件；文件操作不在事件循环线程中执行
+        回源响应的关闭与等待者的唤醒由 ProxyStreamingResponse 负责，body 未开始迭代时同样执行
+        """
+        body_path = self.body_path(key)
+        tmp_path = f"{body_path}.{id(event)}.tmp"
+        size = 0
+        completed = False
+        try:
+            await run_io(os.makedirs, os.path.dirname(body_path), exist_ok=True)
+            async with await anyio.open_file(tmp_path, 'wb') as f:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    await f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            completed = True
+            await run_io(self.store, tmp_path, body_path, {
+                "url": url,
+                "content_type": response.headers.get("Content-Type", ""),
+                "size": size,
+            })
+        finally:
+            if not completed:
+                # 客户端断开时任务已被取消，清理需屏蔽取消才能执行完
+                with anyio.CancelScope(shield=True):
+                    await run_io(self.remove_tmp, tmp_path)
+        if completed:
+            await run_io(self.record_size, size)
+
+    def store(self, tmp_path: str, body_path: str, meta: dict):
+        """替换缓存文件并写入元数据"""
+        os.replace(tmp_path, body_path)
+        now = time.time()
+        with open(f"{body_path}.json", 'w', encoding='utf-8') as f:
+            json.dump({**meta, "stored": now, "expires": now + self.ttl}, f)
+
+    @staticmethod
+    def remove_tmp(tmp_path: str):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def finish(self, key: str, event: asyncio.Event):
+        if self.inflight.get(key) is event:
+            del self.inflight[key]
+        event.set()
+
+    def record_size(self, size: int):
+        if self.total_size is None:
+            self.total_size = sum(size for _, size, _ in self.entries())
+        else:
+            self.total_size += size
+        if self.total_size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        """返回缓存文件 (路径, 大小, 访问时间)"""
+        if not os.path.exists(self.cache_dir):
+            return []
+        result = []
+        for folder in os.scandir(self.cache_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith(('.json', '.tmp')):
+                    continue
+                stat_result = entry.stat()
+                result.append((entry.path, stat_result.st_size, stat_result.st_mtime))
+        return result
+
+    def evict(self):
+        """按最近访问时间淘汰，直到占用降到上限的 90%"""
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_size * 0.9)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            for p in (path, f"{path}.json"):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        self.total_size = total
+        logger.info(f"图片代理缓存淘汰 {removed} 个文件，当前占用 {total // 1024} KB")
+
+    def stats(self) -> dict:
+        return {
+            "origin_fetches": self.origin_fetches,
+            "cache_hits": self.cache_hits,
+            "inflight": len(self.inflight),
+            "cache_size": self.total_size,
+        }
+
+
+image_proxy = ImageProxy(
+    os.path.join(app_settings.sys_dir, proxy_settings.cache_dir),
+    proxy_settings.cache_ttl,
+    proxy_settings.cache_max_size_mb * 1024 * 1024,
+)
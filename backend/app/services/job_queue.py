@@ -0,0 +1,243 @@
+import importlib
+import json
+import multiprocessing
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from sqlalchemy import or_
+
+from app.exception.biz_exception import BizException
+from app.models.sys import SysTask
+from app.services.decrypt_pipeline import session_lock
+from app.services.sys_task_maker import TaskObj, run_task, task_log_path, task_queued, task_running, task_fail, \
+    task_cancelled
+from config.job_config import settings as job_settings
+from config.log_config import logger, flush_logs
+from db.sys_db import SessionLocal
+from wx.client_factory import ClientFactory
+
+
+def func_path(func) -> str:
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def resolve_func(path: str):
+    module_name, qualname = path.split(":", 1)
+    target = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        target = getattr(target, attr)
+    return target
+
+
+def execute_job(task_id: int):
+    """
+    执行一个已入队的任务，子进程入口，只能引用模块级函数
+    """
+    with SessionLocal() as db:
+        task = db.query(SysTask).filter_by(id=task_id).first()
+        if task is None or task.state != task_queued:
+            return
+        try:
+            run_task(db, task, resolve_func(task.job), json.loads(task.args or "[]"))
+        finally:
+            # 子进程退出不等待后台日志线程，先写完队列中的日志
+            flush_logs()
+
+
+@dataclass
+class RunningJob:
+    task_id: int
+    session_id: int | None
+    worker: multiprocessing.Process | threading.Thread
+    started: float = field(default_factory=time.time)
+    cancel_at: float | None = None
+
+
+class JobQueue(object):
+    """
+    基于 SysTask 的任务队列：任务先写入 sys_task 排队，调度线程按优先级取出，在独立子进程中执行
+    同一会话同一时间只执行一个任务，并与上传解密流水线互斥；全局并发数受 max_concurrency 限制
+    """
+
+    def __init__(self, max_concurrency: int, poll_interval: float, use_process: bool):
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self.use_process = use_process
+        self.running: Dict[int, RunningJob] = {}
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+        self.finished = 0
+        self.cancelled = 0
+
+    def submit(self, obj: TaskObj) -> int:
+        """
+        任务入队
+        :return: 任务 id
+        """
+        now = time.time()
+        _, relative_path = task_log_path(obj.name)
+        with SessionLocal() as db:
+            task = SysTask(name=obj.name, owner_id=obj.owner_id, state=task_queued, detail=str(relative_path),
+                           create_time=now, update_time=now, session_id=obj.session_id, priority=obj.priority,
+                           job=func_path(obj.func), args=json.dumps(list(obj.args)), run_after=obj.run_after)
+            db.add(task)
+            db.commit()
+            task_id = task.id
+        logger.info(f"任务入队 {task_id}：{obj.name}，优先级 {obj.priority}")
+        self.wakeup.set()
+        return task_id
+
+    def cancel(self, task_id: int, owner_id: int | None = None) -> bool:
+        """
+        取消任务：排队中的任务直接标记取消，运行中的任务结束子进程
+        :return: 是否取消成功
+        """
+        with SessionLocal() as db:
+            task = db.query(SysTask).filter_by(id=task_id).first()
+            if task is None or (owner_id is not None and task.owner_id != owner_id):
+                raise BizException("任务不存在", status_code=404)
+            if task.state == task_queued:
+                task.state = task_cancelled
+                task.update_time = time.time()
+                db.commit()
+                self.cancelled += 1
+                return True
+        with self.lock:
+            job = self.running.get(task_id)
+            if job is None or not isinstance(job.worker, multiprocessing.Process):
+                return False
+            if job.cancel_at is None:
+                job.cancel_at = time.time()
+                job.worker.terminate()
+        self.wakeup.set()
+        return True
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.recover()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='job-dispatcher', daemon=True)
+        self.thread.start()
+        logger.info(f"任务队列启动，并发上限 {self.max_concurrency}，子进程执行 {self.use_process}")
+
+    def shutdown(self):
+        self.stopped.set()
+        self.wakeup.set()
+        with self.lock:
+            jobs = list(self.running.values())
+        for job in jobs:
+            if isinstance(job.worker, multiprocessing.Process) and job.worker.is_alive():
+                job.worker.terminate()
+
+    def recover(self):
+        """
+        服务重启后，上次运行中的任务已随进程结束，标记为失败；排队中的任务继续执行
+        """
+        with SessionLocal() as db:
+            count = db.query(SysTask).filter_by(state=task_running).update(
+                {SysTask.state: task_fail, SysTask.update_time: time.time()})
+            db.commit()
+        if count:
+            logger.info(f"{count} 个任务在服务重启前未完成，已标记为失败")
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                self.reap()
+                self.dispatch()
+            except Exception as e:
+                logger.error(f"任务调度异常: {e}")
+
+    def reap(self):
+        """
+        回收已结束的任务，释放会话锁
+        """
+        with self.lock:
+            done = [job for job in self.running.values() if not job.worker.is_alive()]
+            for job in self.running.values():
+                # 超过等待时间仍未退出的子进程强制结束
+                if (job.cancel_at is not None and job.worker.is_alive()
+                        and time.time() - job.cancel_at > job_settings.cancel_grace):
+                    job.worker.kill()
+        for job in done:
+            with self.lock:
+                del self.running[job.task_id]
+            self.finish(job)
+
+    def finish(self, job: RunningJob):
+        with SessionLocal() as db:
+            task = db.query(SysTask).filter_by(id=job.task_id).first()
+            if task is not None and task.state in (task_queued, task_running):
+                task.state = task_cancelled if job.cancel_at is not None else task_fail
+                task.update_time = time.time()
+                db.commit()
+        if job.cancel_at is not None:
+            self.cancelled += 1
+        self.finished += 1
+        if job.session_id is not None and self.use_process:
+            # 子进程更新了库文件，丢弃服务进程中缓存的连接与索引
+            ClientFactory.evict(job.session_id)
+            session_lock(job.session_id).release()
+        logger.info(f"任务 {job.task_id} 结束，耗时 {time.time() - job.started:.1f}s")
+
+    def dispatch(self):
+        """
+        按优先级、入队顺序启动任务，跳过会话正忙的任务
+        """
+        with self.lock:
+            if len(self.running) >= self.max_concurrency:
+                return
+            busy = {job.session_id for job in self.running.values() if job.session_id is not None}
+        with SessionLocal() as db:
+            queued: List[SysTask] = (db.query(SysTask).filter_by(state=task_queued)
+                                     .filter(or_(SysTask.run_after.is_(None), SysTask.run_after <= time.time()))
+                                     .order_by(SysTask.priority, SysTask.id).all())
+        for task in queued:
+            with self.lock:
+                if len(self.running) >= self.max_concurrency:
+                    return
+                # 已启动的子进程尚未把状态改为运行中
+                if task.id in self.running:
+                    continue
+            if task.session_id is not None:
+                if task.session_id in busy:
+                    continue
+                # 子进程不共享线程锁，由调度线程代为持有会话锁；上传解密流水线正在处理该会话时稍后再试
+                # 线程内执行时由任务函数自行加锁
+                if self.use_process and not session_lock(task.session_id).acquire(blocking=False):
+                    continue
+                busy.add(task.session_id)
+            self.launch(task)
+
+    def launch(self, task: SysTask):
+        if self.use_process:
+            # 服务进程内有多个线程，使用 spawn 避免 fork 继承锁状态
+            worker = multiprocessing.get_context('spawn').Process(target=execute_job, args=(task.id,),
+                                                                  name=f"job-{task.id}")
+        else:
+            worker = threading.Thread(target=execute_job, args=(task.id,), name=f"job-{task.id}", daemon=True)
+        with self.lock:
+            self.running[task.id] = RunningJob(task.id, task.session_id, worker)
+        worker.start()
+        logger.info(f"任务 {task.id} 开始执行：{task.name}")
+
+    def stats(self) -> dict:
+        with SessionLocal() as db:
+            queued = db.query(SysTask).filter_by(state=task_queued).count()
+        return {
+            "queued": queued,
+            "running": len(self.running),
+            "finished": self.finished,
+            "cancelled": self.cancelled,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+job_queue = JobQueue(job_settings.max_concurrency, job_settings.poll_interval, job_settings.use_process)
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import closing
+from typing import Dict, List
+
+from app.exception.biz_exception import IllegalArgumentsException
+from app.helper.directory_helper import get_session_dir, get_wx_dir_directly
+from app.schemas.sys_schemas import SyncManifestIn, SyncManifestOut, SyncFile
+from app.services.upload_service import resolve_target_path
+from config.log_config import logger
+
+SYNC_MANIFEST_DB = 'sync_manifest.db'
+# 客户端上报后尚未确认到达的文件
+STATE_PENDING = 0
+# 服务器上已存在且与客户端一致的文件
+STATE_CONFIRMED = 1
+
+# 同一会话的清单串行处理
+session_locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+
+
+def connect(sys_session_id: int) -> sqlite3.Connection:
+    session_dir = get_session_dir(sys_session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(session_dir, SYNC_MANIFEST_DB), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sync_file ("
+        "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT, state INTEGER)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS sync_file_sha256 ON sync_file (sha256)")
+    return conn
+
+
+def normalize_path(path: str) -> str:
+    return path.replace("\\", "/").lstrip("/")
+
+
+def same_version(record, file: SyncFile) -> bool:
+    size, mtime, sha256, _ = record
+    if size != file.size or mtime != file.mtime:
+        return False
+    return not file.sha256 or not sha256 or sha256 == file.sha256.lower()
+
+
+def link_file(source: str, target: str) -> bool:
+    """
+    相同内容的文件优先使用硬链接，不支持时复制
+    """
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.link.tmp"
+        try:
+            os.link(source, tmp)
+        except OSError:
+            shutil.copy2(source, tmp)
+        os.replace(tmp, target)
+        return True
+    except OSError as e:
+        logger.warning(f"去重链接失败 {source} -> {target}: {e}")
+        return False
+
+
+def find_duplicate(conn: sqlite3.Connection, wx_dir: str, file: SyncFile) -> str | None:
+    """
+    查找服务器上内容相同且已确认的文件
+    """
+    if not file.sha256:
+        return None
+    for path, size in conn.execute(
+            "SELECT path, size FROM sync_file WHERE sha256 = ? AND state = ?", (file.sha256.lower(), STATE_CONFIRMED)):
+        source = os.path.join(wx_dir, path)
+        if size == file.size and os.path.exists(source) and os.path.getsize(source) == size:
+            return source
+    return None
+
+
+def diff_manifest(manifest: SyncManifestIn) -> SyncManifestOut:
+    """
+    对比客户端清单与服务器已有文件，返回需要上传的文件
+    已确认且大小、修改时间、哈希均一致、服务器文件存在时视为未变化；哈希命中已有文件时直接链接，无需上传
+    """
+    wx_dir = get_wx_dir_directly(manifest.sys_session_id, manifest.wx_id)
+    missing: List[str] = []
+    linked: List[str] = []
+    unchanged = 0
+    with session_locks[manifest.sys_session_id], closing(connect(manifest.sys_session_id)) as conn, conn:
+        for file in manifest.files:
+            path = normalize_path(file.path)
+            try:
+                target = resolve_target_path(manifest.sys_session_id, manifest.wx_id, path)
+            except IllegalArgumentsException:
+                logger.warning(f"忽略非法路径：{file.path}")
+                continue
+            record = conn.execute("SELECT size, mtime, sha256, state FROM sync_file WHERE path = ?",
+                                  (path,)).fetchone()
+            # 只有上传完成后确认过的文件才视为未变化，待确认的记录说明上次上传未完成
+            exists = os.path.exists(target) and os.path.getsize(target) == file.size
+            if record is not None and record[3] == STATE_CONFIRMED and exists and same_version(record, file):
+                unchanged += 1
+                continue
+            sha256 = file.sha256.lower() if file.sha256 else None
+            source = find_duplicate(conn, wx_dir, file)
+            if source and os.path.abspath(source) != os.path.abspath(target) and link_file(source, target):
+                state = STATE_CONFIRMED
+                linked.append(path)
+            else:
+                state = STATE_PENDING
+                missing.append(path)
+            conn.execute("INSERT OR REPLACE INTO sync_file VALUES (?, ?, ?, ?, ?)",
+                         (path, file.size, file.mtime, sha256, state))
+    logger.info(f"同步清单 {len(manifest.files)} 个文件：未变化 {unchanged}，去重 {len(linked)}，需上传 {len(missing)}")
+    return SyncManifestOut(missing=missing, linked=linked, unchanged=unchanged)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def confirm_upload(sys_session_id: int, wx_id: str | None, file_path: str, verified_sha256: str | None = None) -> bool:
+    """
+    文件上传完成并写入目标路径后调用，将清单中待确认的记录标记为已确认
+    大小不一致或哈希不一致时保持待确认，下次同步仍需上传
+    :param file_path: 相对微信目录的路径
+    :param verified_sha256: 上传时已校验过的文件哈希，与记录一致时不再重新计算
+    :return: 是否已确认
+    """
+    if not wx_id:
+        return False
+    path = normalize_path(file_path)
+    target = resolve_target_path(sys_session_id, wx_id, path)
+    with session_locks[sys_session_id], closing(connect(sys_session_id)) as conn, conn:
+        record = conn.execute("SELECT size, sha256, state FROM sync_file WHERE path = ?", (path,)).fetchone()
+        if record is None or record[2] == STATE_CONFIRMED:
+            return record is not None
+        size, sha256, _ = record
+        if not os.path.exists(target) or os.path.getsize(target) != size:
+            logger.warning(f"上传文件与同步清单大小不一致，保持待确认：{path}")
+            return False
+        if sha256 and (not verified_sha256 or verified_sha256.lower() != sha256) and file_sha256(target) != sha256:
+            logger.warning(f"上传文件与同步清单哈希不一致，保持待确认：{path}")
+            return False
+        conn.execute("UPDATE sync_file SET state = ? WHERE path = ?", (STATE_CONFIRMED, path))
+    return True
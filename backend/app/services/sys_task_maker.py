@@ -1,22 +1,37 @@
 import time
 import os
 
-from db.sys_db import SessionLocal
+from db.sys_db import SessionLocal, sys_db_writer
 from app.models.sys import SysTask
 from config.log_config import analyze_logger, set_context_logger, clear_logger
 from config.app_config import settings
+from app.services.task_progress import TaskProgress, set_progress
 
 task_running = 2  # 任务执行中
 task_success = 0  # 任务执行完成
 task_fail = 1  # 任务执行失败
+task_queued = 3  # 任务排队中
+task_cancelled = 4  # 任务已取消
+
+priority_interactive = 0  # 用户手动触发
+priority_sync = 1  # 客户端同步后触发
+priority_cron = 2  # 定时任务
 
 
 class TaskObj:
-    def __init__(self, owner_id, name, func, *args):
+    def __init__(self, owner_id, name, func, *args, session_id=None, priority=priority_interactive, run_after=None):
+        """
+        :param session_id: 任务所属会话，同一会话的任务不会同时执行
+        :param priority: 任务优先级，越小越先执行
+        :param run_after: 不早于该时间戳执行
+        """
         self.owner_id = owner_id
         self.name = name
         self.func = func
         self.args = args
+        self.session_id = session_id
+        self.priority = priority
+        self.run_after = run_after
 
 
 class TaskExecutionError(Exception):
@@ -28,29 +43,39 @@ class TaskExecutionError(Exception):
         return f"TaskExecutionError: {self.message}"
 
 
-def task_execute(obj: TaskObj):
-    start_time = time.time()
+def task_log_path(name: str):
+    """
+    生成任务日志文件
+    :return: 日志文件名, 相对 sys_dir 的路径
+    """
     log_dir = os.path.join(settings.sys_dir, settings.log_dir, settings.log_task_dir)
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
-    # log_file_name = int(time.time() * 1000)
-    log_file_name = f"{int(time.time() * 1000)}-{obj.name}.log"
-    log_file_path = os.path.join(str(log_dir), str(log_file_name))
-    logger = analyze_logger(str(log_file_name), log_file_path)
+    log_file_name = f"{int(time.time() * 1000)}-{name}.log"
+    return log_file_name, os.path.join(settings.log_dir, settings.log_task_dir, log_file_name)
+
+
+def run_task(db, task: SysTask, func, args):
+    """
+    执行任务函数并记录状态、日志，task.detail 为日志相对路径
+    """
+    start_time = time.time()
+    log_file_name = os.path.basename(task.detail)
+    logger = analyze_logger(log_file_name, os.path.join(settings.sys_dir, task.detail))
     # 设置上下文 logger
     set_context_logger(logger)
-    logger.info(f'执行任务：{obj.name}')
-    db = SessionLocal()
-    relative_path = os.path.join(settings.log_dir, settings.log_task_dir, str(log_file_name))
-    task = SysTask(name=obj.name, owner_id=obj.owner_id, state=task_running, detail=str(relative_path), create_time=start_time, update_time=start_time)
+    # 设置上下文任务进度，解密、建索引各阶段上报
+    progress = TaskProgress(task.id)
+    set_progress(progress)
+    logger.info(f'执行任务：{task.name}')
     try:
-        db.add(task)
+        task.state = task_running
+        task.update_time = start_time
         db.commit()
-        db.refresh(task)
         # 调用函数
         try:
-            logger.info(f"args: {obj.args}")
-            obj.func(*obj.args)
+            logger.info(f"args: {args}")
+            func(*args)
             task.state = task_success
         except TaskExecutionError as e:
             task.state = task_fail
@@ -67,9 +92,27 @@ def task_execute(obj: TaskObj):
         # 更新时间
         task.update_time = time.time()
         db.commit()
-        db.close()
+        progress.persist(force=True)
+        sys_db_writer.flush()
+        set_progress(None)
         # 计算执行时间，单位为秒
         execution_time = time.time() - start_time
         logger.info(f'任务执行完成，花费时间: {execution_time}s')
         # 销毁 logger
-        clear_logger(str(log_file_name))
+        clear_logger(log_file_name)
+
+
+def task_execute(obj: TaskObj):
+    """
+    在当前线程中立即执行任务
+    """
+    start_time = time.time()
+    _, relative_path = task_log_path(obj.name)
+    with SessionLocal() as db:
+        task = SysTask(name=obj.name, owner_id=obj.owner_id, state=task_running, detail=str(relative_path),
+                       create_time=start_time, update_time=start_time, session_id=obj.session_id,
+                       priority=obj.priority)
+        db.add(task)
+        db.commit()
+        db.refresh(task)
+        run_task(db, task, obj.func, obj.args)
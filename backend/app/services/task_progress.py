@@ -0,0 +1,128 @@
+import contextvars
+import json
+import threading
+import time
+
+from app.models.sys import SysTask
+from db.sys_db import SessionLocal, sys_db_writer
+
+# 快照写入 sys_task 的最小间隔（秒），避免频繁写库
+PERSIST_INTERVAL = 1.0
+
+context_progress = contextvars.ContextVar('context_progress', default=None)
+
+
+class TaskProgress(object):
+    """
+    任务进度：当前阶段、文件数、字节数、页数，按字节吞吐估算剩余时间
+    快照定期写入 sys_task.progress，任务在子进程执行时服务进程也能读取
+    """
+
+    def __init__(self, task_id: int | None = None):
+        self.task_id = task_id
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stage_name = None
+        self.stage_started = self.started
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.pages_done = 0
+        self.current = None
+        self.persisted_at = 0.0
+
+    def stage(self, name: str, files_total: int = 0, bytes_total: int = 0):
+        """
+        进入新阶段，计数清零
+        :param name: 阶段名称：decrypt / msg_index / thumbnails 等
+        """
+        with self.lock:
+            self.stage_name = name
+            self.stage_started = time.time()
+            self.files_total = files_total
+            self.bytes_total = bytes_total
+            self.files_done = 0
+            self.bytes_done = 0
+            self.pages_done = 0
+            self.current = None
+        self.persist(force=True)
+
+    def advance(self, files: int = 0, bytes_done: int = 0, pages: int = 0, current: str | None = None):
+        with self.lock:
+            self.files_done += files
+            self.bytes_done += bytes_done
+            self.pages_done += pages
+            if current is not None:
+                self.current = current
+        self.persist()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            now = time.time()
+            elapsed = now - self.stage_started
+            # 有字节总量时按字节估算，否则按文件数估算
+            if self.bytes_total:
+                done, total = self.bytes_done, self.bytes_total
+            else:
+                done, total = self.files_done, self.files_total
+            rate = done / elapsed if elapsed > 0 else 0
+            eta = (total - done) / rate if rate > 0 and total > done else None
+            return {
+                "stage": self.stage_name,
+                "current": self.current,
+                "files_done": self.files_done,
+                "files_total": self.files_total,
+                "bytes_done": self.bytes_done,
+                "bytes_total": self.bytes_total,
+                "pages_done": self.pages_done,
+                "percent": round(done * 100 / total, 1) if total else None,
+                "bytes_per_second": round(self.bytes_done / elapsed) if elapsed > 0 else 0,
+                "eta_seconds": round(eta) if eta is not None else None,
+                "elapsed_seconds": round(now - self.started),
+                "updated_at": now,
+            }
+
+    def persist(self, force: bool = False):
+        if self.task_id is None:
+            return
+        now = time.time()
+        if not force and now - self.persisted_at < PERSIST_INTERVAL:
+            return
+        self.persisted_at = now
+        progress = json.dumps(self.snapshot())
+        task_id = self.task_id
+        # 交给系统库写线程提交，解密、建索引过程不等待写锁
+        sys_db_writer.submit(lambda db: db.query(SysTask).filter_by(id=task_id).update({SysTask.progress: progress}))
+
+
+def set_progress(progress: TaskProgress | None):
+    """
+    设置上下文任务进度
+    """
+    context_progress.set(progress)
+
+
+def get_progress() -> TaskProgress:
+    """
+    获取上下文任务进度，没有时返回不写库的进度对象，调用方无需判断
+    """
+    progress = context_progress.get()
+    if progress is None:
+        return TaskProgress()
+    return progress
+
+
+def load_progress(task_id: int, owner_id: int | None = None) -> tuple[int | None, dict | None]:
+    """
+    读取任务状态与最近一次进度快照
+    :param owner_id: 不为空时只读取该用户的任务，其他用户的任务视为不存在
+    """
+    with SessionLocal() as db:
+        query = db.query(SysTask.state, SysTask.progress).filter_by(id=task_id)
+        if owner_id is not None:
+            query = query.filter_by(owner_id=owner_id)
+        row = query.first()
+    if row is None:
+        return None, None
+    return row[0], json.loads(row[1]) if row[1] else None
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from app.exception.biz_exception import BizException, IllegalArgumentsException
+from app.helper.directory_helper import get_session_dir, get_wx_dir_directly
+from app.schemas.sys_schemas import ChunkUploadCreate, ChunkUploadOut
+from config.app_config import settings as app_settings
+from config.log_config import logger
+
+# 每个上传一把锁，保护清单文件的读写
+upload_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+
+def upload_dir() -> str:
+    path = os.path.join(app_settings.sys_dir, app_settings.tmp_dir, app_settings.upload_dir)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def manifest_path(upload_id: str) -> str:
+    return os.path.join(upload_dir(), f"{upload_id}.json")
+
+
+def part_path(upload_id: str) -> str:
+    return os.path.join(upload_dir(), f"{upload_id}.part")
+
+
+def resolve_target_path(sys_session_id: int, wx_id: str | None, file_path: str) -> str:
+    """
+    计算文件保存路径，并校验没有穿透到会话目录之外
+    """
+    base_dir = get_wx_dir_directly(sys_session_id, wx_id) if wx_id else get_session_dir(sys_session_id)
+    file_path = file_path.replace("\\", "/").lstrip("/")
+    save_path = Path(base_dir, file_path).resolve(strict=False)
+    if not str(save_path).startswith(str(Path(base_dir).resolve(strict=False))):
+        logger.error("路径非法：尝试穿透目录")
+        raise IllegalArgumentsException("非法文件路径")
+    return str(save_path)
+
+
+def total_chunks(manifest: dict) -> int:
+    return max((manifest["size"] + manifest["chunk_size"] - 1) // manifest["chunk_size"], 1)
+
+
+def to_out(manifest: dict) -> ChunkUploadOut:
+    return ChunkUploadOut(
+        upload_id=manifest["upload_id"],
+        file_path=manifest["file_path"],
+        size=manifest["size"],
+        chunk_size=manifest["chunk_size"],
+        total_chunks=total_chunks(manifest),
+        received=sorted(manifest["received"]),
+        completed=manifest.get("completed", False),
+    )
+
+
+def load_manifest(upload_id: str) -> dict:
+    try:
+        with open(manifest_path(upload_id), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise BizException("上传任务不存在", status_code=404)
+
+
+def save_manifest(manifest: dict):
+    tmp = f"{manifest_path(manifest['upload_id'])}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path(manifest["upload_id"]))
+
+
+def create_upload(form: ChunkUploadCreate) -> ChunkUploadOut:
+    """
+    创建分片上传，同一会话、路径、大小、校验值的上传复用同一个 upload_id，便于断点续传
+    """
+    chunk_size = form.chunk_size or app_settings.upload_chunk_size
+    if chunk_size <= 0 or chunk_size > app_settings.upload_max_chunk_size:
+        raise IllegalArgumentsException(f"分片大小需在 1 ~ {app_settings.upload_max_chunk_size} 之间")
+    if form.size < 0:
+        raise IllegalArgumentsException("文件大小非法")
+    target = resolve_target_path(form.sys_session_id, form.wx_id, form.file_path)
+    key = f"{form.sys_session_id}:{form.wx_id}:{form.file_path}:{form.size}:{chunk_size}:{form.sha256}"
+    upload_id = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    with upload_locks[upload_id]:
+        if os.path.exists(manifest_path(upload_id)) and os.path.exists(part_path(upload_id)):
+            manifest = load_manifest(upload_id)
+            logger.info(f"续传 {form.file_path}，已接收分片 {len(manifest['received'])}")
+            return to_out(manifest)
+        # 预分配文件，分片按偏移写入
+        with open(part_path(upload_id), 'wb') as f:
+            f.truncate(form.size)
+        manifest = {
+            "upload_id": upload_id,
+            "sys_session_id": form.sys_session_id,
+            "wx_id": form.wx_id,
+            "file_path": form.file_path,
+            "target": target,
+            "size": form.size,
+            "chunk_size": chunk_size,
+            "sha256": form.sha256,
+            "received": [],
+        }
+        save_manifest(manifest)
+    logger.info(f"创建分片上传 {upload_id}：{form.file_path}，大小 {form.size}")
+    return to_out(manifest)
+
+
+def upload_status(upload_id: str) -> ChunkUploadOut:
+    return to_out(load_manifest(upload_id))
+
+
+def write_chunk(upload_id: str, index: int, data: bytes, checksum: str | None) -> ChunkUploadOut:
+    """
+    写入一个分片，可乱序、并发调用
+    :param index: 分片序号，从 0 开始
+    :param checksum: 分片 sha256，不为空时校验
+    """
+    manifest = load_manifest(upload_id)
+    if manifest.get("completed"):
+        raise BizException("上传已完成", status_code=409)
+    if index < 0 or index >= total_chunks(manifest):
+        raise IllegalArgumentsException(f"分片序号越界：{index}")
+    offset = index * manifest["chunk_size"]
+    expected = min(manifest["chunk_size"], manifest["size"] - offset)
+    if len(data) != expected:
+        raise IllegalArgumentsException(f"分片 {index} 大小不符，期望 {expected}，实际 {len(data)}")
+    if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+        raise IllegalArgumentsException(f"分片 {index} 校验失败")
+    # 写入与提交、取消互斥，提交移动 .part 文件时不会有分片写入
+    with upload_locks[upload_id]:
+        manifest = load_manifest(upload_id)
+        if manifest.get("completed"):
+            raise BizException("上传已完成", status_code=409)
+        try:
+            with open(part_path(upload_id), 'r+b') as f:
+                f.seek(offset)
+                f.write(data)
+        except FileNotFoundError:
+            raise BizException("上传任务不存在", status_code=404)
+        if index not in manifest["received"]:
+            manifest["received"].append(index)
+            save_manifest(manifest)
+    return to_out(manifest)
+
+
+def missing_chunks(manifest: dict) -> List[int]:
+    received = set(manifest["received"])
+    return [i for i in range(total_chunks(manifest)) if i not in received]
+
+
+def commit_upload(upload_id: str) -> dict:
+    """
+    所有分片到齐后校验并移动到目标路径
+    :return: 上传清单
+    """
+    with upload_locks[upload_id]:
+        manifest = load_manifest(upload_id)
+        if manifest.get("completed"):
+            return manifest
+        if not os.path.exists(part_path(upload_id)):
+            raise BizException("上传任务不存在", status_code=404)
+        missing = missing_chunks(manifest)
+        if missing:
+            raise BizException(f"还有 {len(missing)} 个分片未上传：{missing[:20]}")
+        if manifest.get("sha256"):
+            digest = hashlib.sha256()
+            with open(part_path(upload_id), 'rb') as f:
+                while chunk := f.read(1024 * 1024):
+                    digest.update(chunk)
+            if digest.hexdigest() != manifest["sha256"].lower():
+                raise BizException("文件校验失败，请重新上传")
+        Path(manifest["target"]).parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(part_path(upload_id), manifest["target"])
+        manifest["completed"] = True
+        save_manifest(manifest)
+    upload_locks.pop(upload_id, None)
+    logger.info(f"分片上传完成：{manifest['target']}")
+    return manifest
+
+
+def abort_upload(upload_id: str):
+    with upload_locks[upload_id]:
+        for path in (part_path(upload_id), manifest_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+    upload_locks.pop(upload_id, None)
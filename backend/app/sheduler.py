@@ -10,7 +10,8 @@ from app.models.sys import SysConfig, SysSession
 from db.sys_db import SessionLocal
 from app.services.analyze import analyze
 
-from app.services.sys_task_maker import TaskObj, task_execute
+from app.services import analyze_trigger
+from app.services.sys_task_maker import TaskObj, priority_cron
 from config.log_config import logger
 
 scheduler = BackgroundScheduler()
@@ -49,7 +50,7 @@ def load_jobs():
                     if single.analyze_cron:
                         key = f"{JOB_STABLE_ANALYZE}-{config.user_id}-{sys_session.id}"
                         add_job(key, f"定时数据解析-{sys_session.name}", single.analyze_cron, config.user_id, analyze,
-                                [sys_session.id])
+                                [sys_session.id], sys_session.id)
 
 
 def reload_all_jobs():
@@ -70,7 +71,7 @@ def reload_all_jobs():
     load_jobs()
 
 
-def add_job(key, job_name, job_cron, user_id, func, args):
+def add_job(key, job_name, job_cron, user_id, func, args, session_id=None):
     """
     添加job
     :param key: 用于删除
@@ -79,14 +80,16 @@ def add_job(key, job_name, job_cron, user_id, func, args):
     :param user_id: 属于哪个用户
     :param func: 函数名
     :param args: 函数参数
+    :param session_id: 所属会话，同一会话的任务互斥执行
     :return:
     """
     logger.info(f'add {key}, cron is {job_cron}, user: {user_id}')
     if job_mapping[key]:
         logger.warning('job is exist')
         return
-    task_obj = TaskObj(user_id, job_name, func, *args)
-    job = scheduler.add_job(task_execute, trigger=CronTrigger.from_crontab(job_cron), id=key, args=[task_obj])
+    task_obj = TaskObj(user_id, job_name, func, *args, session_id=session_id, priority=priority_cron)
+    # 到点只入队，由任务队列按优先级执行，刚解析过的会话跳过
+    job = scheduler.add_job(analyze_trigger.submit, trigger=CronTrigger.from_crontab(job_cron), id=key, args=[task_obj])
     job_mapping[key] = job
 
 
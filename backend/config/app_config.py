@@ -1,4 +1,5 @@
 import os
+from typing import List
 
 from pydantic_settings import BaseSettings
 
@@ -16,6 +17,15 @@ class Settings(BaseSettings):
     # 数据解析日志目录
     log_task_dir: str = 'task'
     log_file_name: str = 'app.log'
+    # 全局日志级别
+    log_level: str = 'INFO'
+    # 按模块设置日志级别，格式 模块=级别，逗号分隔，如 wx.win.v4.decryptor=WARNING,app.services=DEBUG
+    log_module_levels: str = ''
+    # 异步日志队列长度，队列满时丢弃日志而不阻塞请求线程
+    log_queue_size: int = 10000
+    # 服务日志采样：INFO 及以下同一代码位置每个周期（秒）最多输出条数，其余计数后丢弃；WARNING 及以上与任务日志不采样
+    log_sample_interval: float = 60.0
+    log_sample_burst: int = 20
     sessions_dir: str = 'sessions'
     server_host: str = '0.0.0.0'
     server_port: int = 8000
@@ -25,6 +35,28 @@ class Settings(BaseSettings):
     license_aes_key: str = 'license.cloudbak.org'
     # 免费使用天数
     free_max_day: int = 30
+    # 缩略图目录（位于会话目录下）
+    thumb_dir: str = 'thumbs'
+    # 缩略图档位，最长边像素
+    thumb_sizes: List[int] = [240, 480]
+    # 缩略图格式：webp / jpeg
+    thumb_format: str = 'webp'
+    thumb_quality: int = 75
+    # 解析时批量生成缩略图的线程数
+    thumb_workers: int = 4
+    # 分片上传临时目录（位于 tmp_dir 下）
+    upload_dir: str = 'uploads'
+    # 默认分片大小
+    upload_chunk_size: int = 8 * 1024 * 1024
+    # 允许的最大分片大小
+    upload_max_chunk_size: int = 64 * 1024 * 1024
+    # 上传即解密：队列空闲多少秒后为新解密的库重建索引
+    pipeline_idle_delay: float = 2.0
+    # 是否允许登录用户通过请求头 X-Profile: 1 采集单次请求的性能分析
+    profile_enabled: bool = True
+    # 性能分析文件目录（位于 log_dir 下）与保留数量
+    profile_dir: str = 'profiles'
+    profile_keep: int = 50
 
     class Config:
         env_prefix = 'APP_'
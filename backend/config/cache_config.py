@@ -1,4 +1,6 @@
 from cachetools import TTLCache
 
-# 三十分钟缓存
-cache_half_hour = TTLCache(maxsize=100, ttl=30*60)
+# 登录用户缓存 username -> SysUser（已脱离 session），用户相关修改接口中主动失效
+user_cache = TTLCache(maxsize=1000, ttl=30*60)
+# 会话缓存 sys_session_id -> SysSession（已脱离 session），会话修改、客户端同步时主动失效
+sys_session_cache = TTLCache(maxsize=1000, ttl=30*60)
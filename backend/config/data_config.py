@@ -14,6 +14,10 @@ class Settings(BaseSettings):
     hard_link_image_db: str = 'decoded_HardLinkImage.db'
     file_storage_path: str = 'FileStorage/'
     msg_attach_path: str = 'MsgAttach/'
+    # 每个会话缓存的群成员名单数量
+    chatroom_roster_cache_size: int = 128
+    # 会话统计按小时、按天划分使用的时区偏移（分钟），为空时取服务器本地时区，修改后下次解析全量重建统计
+    stats_utc_offset_minutes: int | None = None
 
     class Config:
         env_prefix = 'DATA_'
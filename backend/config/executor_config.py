@@ -0,0 +1,25 @@
+import os
+
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # 阻塞 IO（数据库查询、文件读写）线程池大小
+    io_workers: int = min(32, (os.cpu_count() or 1) + 4)
+    # CPU 密集任务（图片解密、WxGF 解码）进程池大小，0 表示不使用进程池，退回线程池
+    cpu_workers: int = max((os.cpu_count() or 1) - 1, 1)
+    # 事件循环延迟检测间隔（秒）
+    loop_lag_interval: float = 0.5
+    # 超过该延迟（秒）记为一次卡顿
+    loop_lag_threshold: float = 0.1
+    # 保留最近多少次采样用于计算分位数
+    loop_lag_samples: int = 1200
+
+    class Config:
+        env_prefix = 'EXECUTOR_'
+        env_file = ".env"
+        env_file_encoding = 'utf-8'
+        extra = 'allow'
+
+
+settings = Settings()
@@ -0,0 +1,27 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # 同时执行的任务数上限
+    max_concurrency: int = 2
+    # 调度线程检查队列的间隔（秒）
+    poll_interval: float = 1.0
+    # 在独立子进程中执行任务，关闭时在服务进程的线程中执行
+    use_process: bool = True
+    # 取消运行中的任务时，等待子进程退出的时间（秒），超时后强制结束
+    cancel_grace: float = 5.0
+    # 客户端同步触发的解析延迟执行（秒），期间的重复触发合并为一次
+    sync_debounce: int = 30
+    # 连续同步触发时，自首次入队起最多延迟执行的时间（秒），避免持续同步导致解析一直推迟
+    sync_max_delay: int = 300
+    # 定时解析前该时间内（秒）已成功解析过则跳过
+    cron_fresh_window: int = 600
+
+    class Config:
+        env_prefix = 'JOB_'
+        env_file = ".env"
+        env_file_encoding = 'utf-8'
+        extra = 'allow'
+
+
+settings = Settings()
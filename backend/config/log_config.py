@@ -1,15 +1,21 @@
+import atexit
 import logging
 import os.path
+import queue
+import threading
 import time
 import uuid
 import contextvars
-from logging import Logger, LogRecord, getLogger
-from typing import Optional
+from logging import Logger, LogRecord
+from typing import Dict, List, Optional, Tuple
 from config.app_config import settings
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
 
 context_logger = contextvars.ContextVar('context_logger', default=None)
+log_request_id = contextvars.ContextVar('log_request_id', default=None)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 class CustomContextFilter(logging.Filter):
@@ -18,14 +24,81 @@ class CustomContextFilter(logging.Filter):
         self.request_id = initial_request_id
 
     def filter(self, record: logging.LogRecord) -> bool:
-        record.request_id = self.request_id
+        # request_id 保存在上下文变量中，并发请求互不覆盖；在调用线程中取值后随日志入队
+        record.request_id = log_request_id.get() or self.request_id
+        return True
+
+
+class ModuleLevelFilter(logging.Filter):
+    """
+    按模块过滤日志级别，模块名由日志所在文件路径得出，最长前缀匹配
+    """
+
+    def __init__(self, default_level: int, module_levels: Dict[str, int]):
+        super().__init__()
+        self.default_level = default_level
+        self.module_levels = module_levels
+        # 文件路径 -> 生效级别
+        self.path_levels: Dict[str, int] = {}
+
+    def level_of(self, pathname: str) -> int:
+        level = self.path_levels.get(pathname)
+        if level is None:
+            module = module_name(pathname)
+            level = self.default_level
+            matched = -1
+            for prefix, prefix_level in self.module_levels.items():
+                if (module == prefix or module.startswith(prefix + ".")) and len(prefix) > matched:
+                    level, matched = prefix_level, len(prefix)
+            self.path_levels[pathname] = level
+        return level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.level_of(record.pathname)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    日志采样：同一代码位置（文件、行号）每个周期最多输出 burst 条，
+    其余丢弃并计数，下一条输出的日志附带被抑制的条数。WARNING 及以上不采样
+    """
+
+    def __init__(self, interval: float, burst: int):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.lock = threading.Lock()
+        # (文件, 行号) -> [周期开始时间, 周期内条数, 被抑制条数]
+        self.sites: Dict[Tuple[str, int], List[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None or now - site[0] >= self.interval:
+                suppressed = site[2] if site else 0
+                site = self.sites[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            site[1] += 1
+            if site[1] > self.burst:
+                site[2] += 1
+                return False
+        record.suppressed = int(suppressed)
         return True
 
 
 class RequestFormatter(logging.Formatter):
     def format(self, record: LogRecord) -> str:
         record.request_id = getattr(record, 'request_id', '')  # Safe retrieval of request_id
-        return super().format(record)
+        message = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            message += f" (同位置已抑制 {suppressed} 条日志)"
+        return message
 
     def formatTime(self, record, datefmt=None):
         """重写 formatTime 方法，使日志时间精确到毫秒"""
@@ -35,6 +108,155 @@ class RequestFormatter(logging.Formatter):
         return f"{t}.{ms}"  # 返回最终时间格式（精确到毫秒）
 
 
+class LogWorker(QueueListener):
+    """
+    后台日志线程：从队列取出日志写入控制台、文件，请求线程只负责入队
+    队列项为 (动作, handlers, 数据)，动作为 record / close / flush
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.stopped = False
+
+    def ensure_started(self):
+        # fork 出的子进程中线程不存在，需重新启动
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self.lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = None
+                self.start()
+
+    def put(self, item, timeout: float = 0) -> bool:
+        """
+        :param timeout: 队列满时最多阻塞等待的秒数，为 0 时直接丢弃
+        :return: 是否入队
+        """
+        if self.stopped:
+            # 进程退出阶段后台线程已停止，直接在调用线程中写入
+            self.handle(item)
+            return True
+        self.ensure_started()
+        try:
+            if timeout > 0:
+                self.queue.put(item, timeout=timeout)
+            else:
+                self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def handle(self, item):
+        action, handlers, payload = item
+        try:
+            if action == "record":
+                for handler in handlers:
+                    if payload.levelno >= handler.level:
+                        handler.handle(payload)
+                self.written += 1
+            elif action == "close":
+                for handler in handlers:
+                    handler.close()
+            elif action == "flush":
+                payload.set()
+        except Exception:
+            pass
+
+    def flush(self, timeout: float = 5.0):
+        """等待已入队的日志写完"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        if self.put(("flush", [], done), timeout):
+            done.wait(timeout)
+
+    def stop(self, timeout: float = 5.0):
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            self.stopped = True
+            return
+        self.flush(timeout)
+        self.stopped = True
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+
+log_worker = LogWorker(settings.log_queue_size)
+atexit.register(log_worker.stop)
+
+# 关闭 handler 等控制项入队的最长等待（秒），控制项不丢弃
+CONTROL_PUT_TIMEOUT = 5.0
+# 任务日志队列满时的最长等待（秒）
+TASK_LOG_PUT_TIMEOUT = 5.0
+
+
+class AsyncLogHandler(QueueHandler):
+    """
+    异步日志 handler：在调用线程中只做过滤、消息定稿（msg % args、异常堆栈）与入队，写入在后台日志线程中完成
+    队列满时普通日志丢弃不阻塞调用方；block_timeout 大于 0 时阻塞等待，用于需完整保留的任务日志
+    """
+
+    def __init__(self, handlers: List[logging.Handler], block_timeout: float = 0):
+        super().__init__(log_worker.queue)
+        self.handlers = handlers
+        self.block_timeout = block_timeout
+
+    def enqueue(self, record: LogRecord):
+        if not log_worker.put(("record", self.handlers, record), self.block_timeout):
+            log_worker.dropped += 1
+
+    def close(self):
+        if not log_worker.put(("close", self.handlers, None), CONTROL_PUT_TIMEOUT):
+            # 队列持续已满，在调用线程中直接关闭，避免文件句柄泄漏
+            for handler in self.handlers:
+                handler.close()
+        super().close()
+
+
+def module_name(pathname: str) -> str:
+    """
+    日志所在文件对应的模块名，如 wx/win/v4/decryptor/windos_v4_decryptor.py -> wx.win.v4.decryptor.windos_v4_decryptor
+    """
+    path = os.path.abspath(pathname)
+    if path.startswith(PROJECT_DIR + os.sep):
+        path = path[len(PROJECT_DIR) + 1:]
+    else:
+        path = pathname
+    return os.path.splitext(path)[0].replace("\\", "/").strip("/").replace("/", ".")
+
+
+def parse_level(level: str) -> int:
+    value = logging.getLevelName(level.strip().upper())
+    return value if isinstance(value, int) else logging.INFO
+
+
+def parse_module_levels(text: str) -> Dict[str, int]:
+    levels = {}
+    for item in text.split(","):
+        module, _, level = item.partition("=")
+        if module.strip() and level.strip():
+            levels[module.strip()] = parse_level(level)
+    return levels
+
+
+default_level = parse_level(settings.log_level)
+module_levels = parse_module_levels(settings.log_module_levels)
+# logger 级别取全局与各模块中最低的，具体模块的级别由 ModuleLevelFilter 判断
+logger_level = min([default_level, *module_levels.values()])
+module_level_filter = ModuleLevelFilter(default_level, module_levels)
+sampling_filter = SamplingFilter(settings.log_sample_interval, settings.log_sample_burst)
+
 # 创建一个自定义的 ContextFilter，并设置初始的 request_id
 context_filter = CustomContextFilter(None)
 
@@ -43,24 +265,32 @@ def set_log_id():
     # 生成一个唯一的 request_id
     request_id = str(uuid.uuid4())
 
-    # 更新 ContextFilter 中的 request_id
-    context_filter.request_id = request_id
+    # 更新上下文中的 request_id
+    log_request_id.set(request_id)
+
+
+def async_handler(handlers: List[logging.Handler], sampling: bool = True) -> AsyncLogHandler:
+    """
+    :param sampling: 是否对 INFO 及以下的日志采样；任务日志需完整保留，不采样且队列满时阻塞等待而不丢弃
+    """
+    handler = AsyncLogHandler(handlers, block_timeout=0 if sampling else TASK_LOG_PUT_TIMEOUT)
+    handler.addFilter(module_level_filter)
+    if sampling:
+        handler.addFilter(sampling_filter)
+    handler.addFilter(context_filter)
+    return handler
 
 
 def logger():
     # 创建一个日志记录器
     app_logger = logging.getLogger('fastapi_app')
-    app_logger.setLevel(logging.INFO)
-
-    # 添加 ContextFilter 到全局 Logger
-    app_logger.addFilter(context_filter)
+    app_logger.setLevel(logger_level)
 
     formatter = RequestFormatter(fmt='%(asctime)s - %(request_id)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
     # 创建一个 handler 将日志输出到控制台
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    app_logger.addHandler(console_handler)
 
     log_dir = os.path.join(settings.sys_dir, settings.log_dir)
     if not os.path.exists(log_dir):
@@ -73,7 +303,8 @@ def logger():
         str(log_file_path), when='midnight', interval=1, backupCount=7, encoding='utf-8'
     )
     file_handler.setFormatter(formatter)
-    app_logger.addHandler(file_handler)
+    # 控制台与文件写入均在后台日志线程中完成
+    app_logger.addHandler(async_handler([console_handler, file_handler]))
     return app_logger
 
 
@@ -83,21 +314,18 @@ def analyze_logger(logger_name: str, path: str):
     :return:
     """
     a_logger = logging.getLogger(logger_name)
-    a_logger.setLevel(logging.INFO)
-
-    # 添加 ContextFilter 到全局 Logger
-    a_logger.addFilter(context_filter)
+    a_logger.setLevel(logger_level)
 
-    formatter = logging.Formatter(fmt='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    formatter = RequestFormatter(fmt='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
     # 创建一个 handler 将日志输出到控制台
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    a_logger.addHandler(console_handler)
     # 创建一个文件处理器，并设置编码为 UTF-8
     file_handler = logging.FileHandler(path, encoding='utf-8')
     file_handler.setFormatter(formatter)
-    a_logger.addHandler(file_handler)
+    # 任务日志供用户查看解析过程，不采样
+    a_logger.addHandler(async_handler([console_handler, file_handler], sampling=False))
     return a_logger
 
 
@@ -121,11 +349,27 @@ def get_context_logger() -> Logger:
     return c_logger
 
 
+def flush_logs(timeout: float = 5.0):
+    """
+    等待队列中的日志写完，子进程退出前调用
+    """
+    log_worker.flush(timeout)
+
+
+def log_stats() -> dict:
+    return log_worker.stats()
+
+
 def clear_logger(logger_name: str):
     """
-    删除 loging 中的 logger
+    删除 loging 中的 logger，关闭其文件句柄（在已入队日志写完后关闭）
     :param logger_name:
     :return:
     """
     if logger_name in logging.Logger.manager.loggerDict:
+        c_logger = logging.Logger.manager.loggerDict[logger_name]
+        if isinstance(c_logger, Logger):
+            for handler in list(c_logger.handlers):
+                c_logger.removeHandler(handler)
+                handler.close()
         del logging.Logger.manager.loggerDict[logger_name]
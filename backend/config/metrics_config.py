@@ -0,0 +1,17 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # 是否开放 /metrics，指标包含路由名与任务、上传、队列计数，默认关闭；对外暴露时应同时配置 token
+    enabled: bool = False
+    # 不为空时要求请求头 Authorization: Bearer <token>
+    token: str | None = None
+
+    class Config:
+        env_prefix = 'METRICS_'
+        env_file = ".env"
+        env_file_encoding = 'utf-8'
+        extra = 'allow'
+
+
+settings = Settings()
@@ -0,0 +1,29 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # 远程图片缓存目录（位于 sys_dir 下）
+    cache_dir: str = 'proxy_cache'
+    # 缓存有效期（秒）
+    cache_ttl: int = 7 * 24 * 3600
+    # 缓存目录最大占用（MB），超出后按最近访问时间淘汰
+    cache_max_size_mb: int = 512
+    # 连接池大小
+    max_connections: int = 50
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60
+    # 请求超时（秒）
+    timeout: float = 15
+    # 是否启用 HTTP/2，需要安装 h2
+    http2: bool = True
+    # 同一 URL 并发请求等待首个回源完成的最长时间（秒），超时后自行回源
+    inflight_wait: float = 30
+
+    class Config:
+        env_prefix = 'PROXY_'
+        env_file = ".env"
+        env_file_encoding = 'utf-8'
+        extra = 'allow'
+
+
+settings = Settings()
@@ -0,0 +1,21 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # 是否记录慢查询
+    enabled: bool = True
+    # 慢查询阈值（毫秒），超过阈值的语句记录日志并附带 EXPLAIN QUERY PLAN
+    slow_threshold_ms: float = 200
+    # 是否对慢查询执行 EXPLAIN QUERY PLAN，每条语句只执行一次
+    explain: bool = True
+    # 最多保留的慢查询语句条数，超出时淘汰累计耗时最少的
+    max_entries: int = 200
+
+    class Config:
+        env_prefix = 'SQL_TRACE_'
+        env_file = ".env"
+        env_file_encoding = 'utf-8'
+        extra = 'allow'
+
+
+settings = Settings()
@@ -0,0 +1,21 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # 日志模式，WAL 下读写互不阻塞，接口读取不必等待解析任务写入
+    journal_mode: str = 'WAL'
+    # WAL 下 NORMAL 只在检查点时同步磁盘，断电最多丢失最近的提交，不会损坏库文件
+    synchronous: str = 'NORMAL'
+    # 等待写锁的时间（毫秒），多个进程同时写入时等待而不是立即报 database is locked
+    busy_timeout_ms: int = 15000
+    # 后台写入队列长度，队列满时提交方等待
+    writer_queue_size: int = 10000
+
+    class Config:
+        env_prefix = 'SYS_DB_'
+        env_file = ".env"
+        env_file_encoding = 'utf-8'
+        extra = 'allow'
+
+
+settings = Settings()
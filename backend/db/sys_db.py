@@ -1,9 +1,16 @@
+import atexit
 import os.path
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, inspect, text, event
+from sqlalchemy.orm import sessionmaker, Session
 
 from config.app_config import settings
+from config.log_config import logger
+from config.sys_db_config import settings as sys_db_settings
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -12,7 +19,22 @@ sys_db_path = os.path.join(settings.sys_dir, settings.sys_db_dir)
 if not os.path.exists(sys_db_path):
     os.makedirs(sys_db_path)
 sys_db_file_path = os.path.join(str(sys_db_path), settings.sys_db_file_name)
-engine = create_engine(f"sqlite:///{sys_db_file_path}", connect_args={"check_same_thread": False})
+engine = create_engine(f"sqlite:///{sys_db_file_path}",
+                       connect_args={"check_same_thread": False,
+                                     "timeout": sys_db_settings.busy_timeout_ms / 1000})
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    """
+    每个连接建立时设置日志模式、同步级别与锁等待时间
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={sys_db_settings.journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={sys_db_settings.synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(sys_db_settings.busy_timeout_ms)}")
+    cursor.close()
+
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -29,6 +51,99 @@ def get_sys_db():
     return SessionLocal()
 
 
+class SysDbWriter(object):
+    """
+    系统库单写线程：后台记账类写入（解密记录、任务进度）排队后由一个线程依次提交，
+    同一进程内的写入不再相互争抢写锁，提交方不必等待
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+        self.written = 0
+        self.failed = 0
+
+    def ensure_started(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="sys-db-writer", daemon=True)
+                self.thread.start()
+
+    def submit(self, func: Callable[[Session], Any]) -> Future:
+        """
+        提交写入，func(db) 在写线程的 session 中执行后提交
+        :return: Future，需要确认写入完成时等待其结果
+        """
+        future = Future()
+        self.ensure_started()
+        self.queue.put((func, future))
+        return future
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            func, future = item
+            if func is None:
+                future.set_result(None)
+                continue
+            try:
+                with SessionLocal() as db:
+                    result = func(db)
+                    db.commit()
+                self.written += 1
+                future.set_result(result)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"系统库写入失败: {e}")
+                future.set_exception(e)
+
+    def flush(self, timeout: float | None = 30):
+        """等待已提交的写入完成"""
+        if self.thread is None or not self.thread.is_alive():
+            return
+        future = Future()
+        self.queue.put((None, future))
+        try:
+            future.result(timeout)
+        except TimeoutError:
+            logger.warning(f"等待系统库写入超时，剩余 {self.queue.qsize()} 条")
+
+    def stop(self, timeout: float = 30):
+        if self.thread is None or not self.thread.is_alive():
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "written": self.written, "failed": self.failed}
+
+
+sys_db_writer = SysDbWriter(sys_db_settings.writer_queue_size)
+atexit.register(sys_db_writer.stop)
+
+
+def add_missing_columns():
+    """
+    为已存在的表补充新增的列，create_all 只创建缺失的表，不会修改已有表结构
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+
 def clear_all():
     session = SessionLocal()
     session.close()  # 关闭会话
@@ -1,9 +1,15 @@
+import multiprocessing
+
 import uvicorn
-from app.application import create_app
 from config.app_config import settings
 
+# 打包后的可执行文件被用作任务子进程时，在此执行子进程任务并退出
+multiprocessing.freeze_support()
 
-app = create_app()
+# spawn 子进程以 __mp_main__ 名称重新导入本模块，不创建应用
+if __name__ != "__mp_main__":
+    from app.application import create_app
+    app = create_app()
 
 if __name__ == "__main__":
     uvicorn.run(app=app, host=settings.server_host, port=settings.server_port)
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
-from app.api import auth, msg, wx, user_api, task_api, conf_api, resources_api, resources_v4_api, fts_api, sys_api
+from app.api import auth, msg, wx, user_api, task_api, conf_api, resources_api, resources_v4_api, fts_api, sys_api, \
+    stats_api
 
 router = APIRouter(prefix="/api")
 
@@ -13,4 +14,5 @@ router.include_router(resources_api.router, tags=["resources"])
 router.include_router(resources_v4_api.router, tags=["resources-v4"])
 router.include_router(fts_api.router, tags=["fts"])
 router.include_router(sys_api.router, tags=["sys"])
+router.include_router(stats_api.router, tags=["stats"])
 
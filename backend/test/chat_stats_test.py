@@ -0,0 +1,94 @@
+"""
+会话统计本地测试：构造微信3 MSG 分库，验证增量累加、CreateTime 为空时首末时间不被清空、全量重建与时区变更重建
+
+用法（在 backend 目录下）：
+    python -m test.chat_stats_test
+"""
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+from config.data_config import settings as data_settings
+from wx.win.v3.db.windows_v3_chat_stats import WindowsV3ChatStats
+from wx.win.v3.enums.v3_enums import V3DBEnum
+
+SELF = "wxid_self"
+DB_NAME = "decoded_MSG0.db"
+
+
+class FakeDBManager(object):
+
+    def multi_msg_db_array(self):
+        return [DB_NAME]
+
+
+class FakeClient(object):
+
+    def __init__(self, wx_dir: str):
+        self.wx_dir = wx_dir
+
+    def get_wx_dir(self):
+        return self.wx_dir
+
+    def get_db_manager(self):
+        return FakeDBManager()
+
+    def get_real_wx_id(self):
+        return SELF
+
+
+def insert(db_path: str, rows):
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.executemany(
+            "INSERT INTO MSG (StrTalker, Type, IsSender, CreateTime, BytesExtra) VALUES (?, ?, ?, ?, NULL)", rows
+        )
+
+
+def main():
+    wx_dir = tempfile.mkdtemp(prefix="chat_stats_")
+    os.makedirs(os.path.join(wx_dir, V3DBEnum.DB_MULTI))
+    db_path = os.path.join(wx_dir, V3DBEnum.DB_MULTI, DB_NAME)
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute("CREATE TABLE MSG (localId INTEGER PRIMARY KEY, StrTalker TEXT, Type INTEGER, "
+                     "IsSender INTEGER, CreateTime INTEGER, BytesExtra BLOB)")
+    data_settings.stats_utc_offset_minutes = 0
+    stats = WindowsV3ChatStats(FakeClient(wx_dir))
+
+    insert(db_path, [("bob", 1, 0, 3600), ("bob", 1, 1, 7200)])
+    stats.build()
+    bob = stats.chat("bob")
+    assert (bob.msg_count, bob.sent_count, bob.first_time, bob.last_time) == (2, 1, 3600, 7200)
+
+    # 增量中只有 CreateTime 为空的消息，首末时间保持不变
+    insert(db_path, [("bob", 3, 0, None)])
+    stats.build()
+    bob = stats.chat("bob")
+    assert (bob.msg_count, bob.first_time, bob.last_time) == (3, 3600, 7200), bob
+
+    insert(db_path, [("bob", 1, 0, 10800), ("alice", 1, 0, 60)])
+    stats.build()
+    bob = stats.chat("bob")
+    assert (bob.msg_count, bob.first_time, bob.last_time) == (4, 3600, 10800), bob
+    overview = stats.overview()
+    assert overview.chat_count == 2 and overview.total.msg_count == 5, overview
+    assert overview.total.first_time == 60 and overview.total.last_time == 10800, overview
+
+    # 再次构建没有新消息，不重复累加
+    stats.build()
+    assert stats.chat("bob").msg_count == 4
+
+    stats.build(deep=True)
+    bob = stats.chat("bob")
+    assert (bob.msg_count, bob.sent_count, bob.first_time, bob.last_time) == (4, 1, 3600, 10800), bob
+
+    # 时区变更后全量重建，按小时分布随之平移
+    data_settings.stats_utc_offset_minutes = 60
+    stats.build()
+    bob = stats.chat("bob")
+    assert bob.msg_count == 4 and bob.hours[2] == 1 and bob.hours[3] == 1 and bob.hours[4] == 1, bob.hours
+    print(f"bob: {bob.msg_count} 条，{bob.first_time} - {bob.last_time}")
+
+
+if __name__ == '__main__':
+    main()
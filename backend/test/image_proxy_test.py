@@ -0,0 +1,62 @@
+"""
+图片代理本地测试：启动本地 HTTP 服务作为源站，并发请求同一 URL，验证只回源一次且后续命中磁盘缓存
+
+用法（在 backend 目录下）：
+    python -m test.image_proxy_test
+"""
+import asyncio
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.services.image_proxy_service import ImageProxy
+
+BODY = b"\x89PNG" + bytes(range(256)) * 64
+origin_hits = 0
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        global origin_hits
+        origin_hits += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+async def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/avatar.png"
+
+    proxy = ImageProxy(tempfile.mkdtemp(prefix="proxy_cache_"), ttl=60, max_size=len(BODY) * 4)
+    app = FastAPI()
+
+    @app.get("/proxy")
+    async def proxy_endpoint(request: Request):
+        return await proxy.fetch(request, url)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(*[client.get("/proxy") for _ in range(20)])
+        assert all(r.status_code == 200 and r.content == BODY for r in responses)
+        again = await client.get("/proxy")
+        assert again.content == BODY
+        not_modified = await client.get("/proxy", headers={"If-None-Match": again.headers["etag"]})
+        assert not_modified.status_code == 304
+    await proxy.close()
+    server.shutdown()
+    print(f"origin hits: {origin_hits}, proxy stats: {proxy.stats()}")
+    assert origin_hits == 1
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+"""
+慢查询统计本地测试：验证淘汰不会丢弃刚插入的慢语句、执行失败的语句不在连接上遗留开始时间
+
+用法（在 backend 目录下）：
+    python -m test.sql_trace_test
+"""
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from config.sql_trace_config import settings as trace_settings
+from wx.common.util.sql_trace import SlowQueryLog, instrument_engine, slow_query_log
+
+
+def test_evict():
+    trace_settings.max_entries = 3
+    log = SlowQueryLog()
+    for i in range(3):
+        log.record("win.v4", "message_0.db", "test", f"SELECT {i}", (), 0.3 + i * 0.1)
+    # 已满时插入新语句，淘汰累计耗时最少的已有语句，新语句保留
+    log.record("win.v4", "message_0.db", "test", "SELECT slow", (), 5)
+    statements = [entry["statement"] for entry in log.top()]
+    assert len(statements) == 3, statements
+    assert "SELECT slow" in statements and "SELECT 0" not in statements, statements
+    # 同一语句再次出现只累加，不淘汰其他语句
+    log.record("win.v4", "message_0.db", "test", "SELECT   slow", (), 1)
+    top = log.top()
+    assert len(top) == 3 and top[0]["statement"] == "SELECT slow" and top[0]["count"] == 2, top
+
+
+def test_failed_statement():
+    trace_settings.slow_threshold_ms = 0
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "win.v4", "decoded_message_0.db")
+    slow_query_log.clear()
+    with engine.connect() as conn:
+        for _ in range(3):
+            try:
+                conn.execute(text("SELECT * FROM missing_table"))
+            except OperationalError:
+                pass
+        conn.execute(text("SELECT 1")).fetchall()
+        assert "query_start" not in conn.info, conn.info
+    statements = [entry["statement"] for entry in slow_query_log.top()]
+    assert statements == ["SELECT 1"], statements
+
+
+if __name__ == '__main__':
+    test_evict()
+    test_failed_statement()
+    print("sql trace ok")
@@ -1,10 +1,12 @@
 import base64
 import struct
+import time
 from pathlib import Path
 
 from Crypto.Cipher import AES
 from Crypto.Util import Padding
 
+from app.helper import metrics_helper
 from app.services.decode_wx_pictures import decrypt_file
 from test.decrypt import decrypt_dat, decrypt_dat_v3
 from wx.win.v4.wxgf_dat2img import decode_wxgf
@@ -145,13 +147,30 @@ class WeixinInfo:
 
 info = WeixinInfo()
 
+wxgf_seconds = metrics_helper.histogram("cloudbak_wxgf_decode_duration_seconds", "WxGF 转码耗时", ("result",))
+
 def decrypt_wechat_dat(dat_path: str):
+    """
+    解密微信 .dat 文件，并返回 data URI
+    """
+    raw, mime = decrypt_wechat_dat_bytes(dat_path)
+    b64 = base64.b64encode(raw).decode("utf-8")
+    return f"data:{mime};base64,{b64}"
+
+
+def decrypt_wechat_dat_bytes(dat_path: str):
     """
     解密微信 .dat 文件，并返回：
     - raw_bytes: 解密后的 bytes
-    - ext: 文件扩展名 (".jpg" / ".png" / ".mp4" / None)
-    - b64: base64 编码内容
-    - version: dat 加密版本
+    - mime: 推断的 MIME 类型
+    """
+    return convert_dat_bytes(decrypt_wechat_dat_raw(dat_path))
+
+
+def decrypt_wechat_dat_raw(dat_path: str) -> bytes:
+    """
+    只解密 .dat 文件，不做 WxGF 转码，可在进程池中执行
+    WxGF 转码依赖 ffmpeg 进程池，需在服务进程中调用 convert_dat_bytes，保证 ffmpeg 并发上限全局生效
     """
 
     dat_path = Path(dat_path)
@@ -179,19 +198,28 @@ def decrypt_wechat_dat(dat_path: str):
             raw = decrypt_dat_v4(dat_path, info.xor_key, info.aes_key)
         case _:
             raise ValueError(f"不支持的 dat 加密版本: {version}")
+    return raw
+
 
+def convert_dat_bytes(raw: bytes):
+    """
+    处理解密后的数据：WxGF 转码并推断 MIME 类型
+    :return: (raw_bytes, mime)
+    """
     # 4. 处理 WxGF 文件格式
     ext = None
     if raw.startswith(b"wxgf"):  # WxGF wrapper
         print("[+] WxGF 文件，尝试转换...")
+        start = time.perf_counter()
         try:
             raw, ext = decode_wxgf(raw)
+            wxgf_seconds.observe(time.perf_counter() - start, result="success")
             print(f"[+] WxGF 转换成功，推断文件类型: {ext}")
         except Exception as exc:
+            wxgf_seconds.observe(time.perf_counter() - start, result="fail")
             print(f"[!] WxGF 转换失败: {exc}")
 
-    # 5. 生成 base64，并补全 data URI 前缀
-    b64 = base64.b64encode(raw).decode("utf-8")
+    # 5. 推断 MIME 类型
     mime = "application/octet-stream"
     if ext and ext.lower() in ("jpg", "jpeg"):
         mime = "image/jpeg"
@@ -201,9 +229,8 @@ def decrypt_wechat_dat(dat_path: str):
         mime = "image/gif"
     elif ext and ext.lower() in ("mp4", "mov"):
         mime = "video/mp4"
-    data_uri = f"data:{mime};base64,{b64}"
 
-    return data_uri
+    return raw, mime
     # return {
     #     "version": version,
     #     "raw_bytes": raw,
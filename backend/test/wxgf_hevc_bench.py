@@ -0,0 +1,176 @@
+"""
+wxgf hevc 处理的微基准：对比旧的逐字节实现与基于 bytes.find 的实现，并校验输出一致
+
+用法（在 backend 目录下）：
+    python -m test.wxgf_hevc_bench [wxgf 文件或目录 ...]
+不传参数时使用合成的码流。
+"""
+import os
+import random
+import sys
+import timeit
+from typing import List
+
+from wx.win.v4.wxgf_dat2img.formats import WXGF
+from wx.win.v4.wxgf_dat2img.hevc import AnnexB, collect_parameter_sets, ensure_parameter_sets, fix_slice_headers
+from wx.win.v4.wxgf_dat2img.partitions import find_partitions
+
+START_CODE_LONG = b"\x00\x00\x00\x01"
+START_CODE_SHORT = b"\x00\x00\x01"
+
+
+def legacy_split_annexb(data: bytes) -> List[bytes]:
+    nalus = []
+    i = 0
+    start = None
+    while i < len(data):
+        if data.startswith(START_CODE_LONG, i):
+            if start is not None:
+                nalus.append(data[start:i])
+            start = i + 4
+            i = start
+        elif data.startswith(START_CODE_SHORT, i):
+            if start is not None:
+                nalus.append(data[start:i])
+            start = i + 3
+            i = start
+        else:
+            i += 1
+    if start is not None and start < len(data):
+        nalus.append(data[start:])
+    return [n for n in nalus if n]
+
+
+def legacy_nal_type(nalu: bytes) -> int:
+    return (nalu[0] >> 1) & 0x3F if nalu else -1
+
+
+def legacy_collect(chunks):
+    params = {32: [], 33: [], 34: []}
+    for chunk in chunks:
+        for nalu in legacy_split_annexb(chunk):
+            nt = legacy_nal_type(nalu)
+            if nt in params and nalu not in params[nt]:
+                params[nt].append(nalu)
+    return params
+
+
+def legacy_ensure(data: bytes, params) -> bytes:
+    nalus = legacy_split_annexb(data)
+    present = {legacy_nal_type(n) for n in nalus}
+    prefix = bytearray()
+    for nt in (32, 33, 34):
+        if nt in present:
+            continue
+        for nalu in params.get(nt, []):
+            prefix += START_CODE_LONG + nalu
+    return bytes(prefix) + data if prefix else data
+
+
+def legacy_remove_emulation_prevention(payload: bytes) -> bytes:
+    cleaned = bytearray()
+    zero_count = 0
+    for byte in payload:
+        if zero_count == 2 and byte == 0x03:
+            zero_count = 0
+            continue
+        cleaned.append(byte)
+        zero_count = zero_count + 1 if byte == 0x00 else 0
+    return bytes(cleaned)
+
+
+def legacy_fix(data: bytes) -> bytes:
+    nalus = legacy_split_annexb(data)
+    fixed = []
+    first_slice_seen = False
+    for nalu in nalus:
+        if legacy_nal_type(nalu) >= 22:
+            fixed.append(nalu)
+        elif not first_slice_seen:
+            first_slice_seen = True
+            fixed.append(nalu)
+        elif len(nalu) <= 2 or not (legacy_remove_emulation_prevention(nalu[2:]) or b"\x00")[0] & 0x80:
+            fixed.append(nalu)
+    if len(fixed) == len(nalus):
+        return data
+    return b"".join(START_CODE_LONG + n for n in fixed)
+
+
+def legacy_pipeline(data: bytes):
+    partitions = find_partitions(data)
+    chunks = [data[p.offset:p.offset + p.size] for p in partitions.partitions]
+    params = legacy_collect(chunks)
+    results = []
+    for chunk in chunks:
+        ensured = legacy_ensure(chunk, params)
+        results.append((ensured, legacy_fix(ensured)))
+    return results
+
+
+def fast_pipeline(data: bytes):
+    partitions = find_partitions(data)
+    streams = [AnnexB(data, p.offset, p.offset + p.size) for p in partitions.partitions]
+    params = collect_parameter_sets(streams)
+    results = []
+    for stream in streams:
+        ensured = ensure_parameter_sets(stream, params)
+        results.append((ensured.to_bytes(), fix_slice_headers(ensured)))
+    return results
+
+
+def synthetic_stream(slices: int = 8, slice_size: int = 64 * 1024, seed: int = 1) -> bytes:
+    """生成带 SPS/PPS 与多个 slice 的 Annex-B 码流（不含 VPS，触发补参数集）"""
+    rnd = random.Random(seed)
+    parts = [START_CODE_LONG, b"\x42\x01" + bytes(rnd.getrandbits(8) | 1 for _ in range(32)),
+             START_CODE_LONG, b"\x44\x01" + bytes(rnd.getrandbits(8) | 1 for _ in range(8))]
+    for idx in range(slices):
+        body = bytearray(rnd.getrandbits(8) for _ in range(slice_size))
+        # 移除随机产生的起始码，并插入若干防竞争字节
+        body = body.replace(b"\x00\x00", b"\x00\x00\x03")
+        parts += [START_CODE_SHORT if idx % 2 else START_CODE_LONG, b"\x26\x01" + (b"\x80" if idx == 0 else b"\x00")
+                  + bytes(body)]
+    return b"".join(parts)
+
+
+def sample_payloads(paths: List[str]) -> List[tuple]:
+    samples = []
+    for path in paths:
+        files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names] \
+            if os.path.isdir(path) else [path]
+        for file in files:
+            with open(file, 'rb') as f:
+                data = f.read()
+            if data.startswith(WXGF.header):
+                samples.append((file, data))
+    return samples
+
+
+def bench(name: str, func, number: int) -> float:
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print(f"  {name:<8} {seconds * 1000:10.3f} ms")
+    return seconds
+
+
+def main(argv: List[str]):
+    samples = sample_payloads(argv)
+    if samples:
+        for file, data in samples:
+            print(f"{file} ({len(data)} bytes)")
+            assert legacy_pipeline(data) == fast_pipeline(data), "输出不一致"
+            old = bench("legacy", lambda: legacy_pipeline(data), 5)
+            new = bench("fast", lambda: fast_pipeline(data), 5)
+            print(f"  speedup  {old / new:10.1f}x")
+        return
+    data = synthetic_stream()
+    print(f"synthetic stream ({len(data)} bytes)")
+    params = collect_parameter_sets([synthetic_stream(1, 128, seed=2)])
+    legacy_params = legacy_collect([synthetic_stream(1, 128, seed=2)])
+    assert fix_slice_headers(ensure_parameter_sets(data, params)) == legacy_fix(legacy_ensure(data, legacy_params))
+    assert [bytes(n) for n in legacy_split_annexb(data)] == [data[o:o + n] for o, n in AnnexB(data).spans]
+    old = bench("legacy", lambda: legacy_fix(legacy_ensure(data, legacy_params)), 3)
+    new = bench("fast", lambda: fix_slice_headers(ensure_parameter_sets(data, params)), 3)
+    print(f"  speedup  {old / new:10.1f}x")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
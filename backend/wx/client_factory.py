@@ -1,3 +1,4 @@
+from app.helper import metrics_helper
 from app.models.sys import SysSession, SysSessionExtra
 from config.log_config import logger
 from db.sys_db import get_sys_db
@@ -22,11 +23,9 @@ class ClientFactory:
 
     @staticmethod
     def get_client(sys_session: SysSession, sys_session_extra: SysSessionExtra = None) -> ClientInterface:
-        logger.info("get_client")
-        logger.info(f"sys_session: {sys_session}")
-        logger.info(f"sys_session_extra: {sys_session_extra}")
-        # 映射client_id到实现类
-        logger.info(f"session_client_cache keys: {session_client_cache.keys()}")
+        # 每个请求都会调用，只在 DEBUG 级别输出
+        logger.debug("get_client sys_session: %s, sys_session_extra: %s, cached: %s",
+                     sys_session, sys_session_extra, list(session_client_cache.keys()))
         if sys_session.id in session_client_cache:
             return session_client_cache[sys_session.id]
         if sys_session_extra:
@@ -44,15 +43,33 @@ class ClientFactory:
         session_client_cache[sys_session.id] = session_client
         return session_client
 
+    @staticmethod
+    def get_cached_client(sys_session_id: int) -> ClientInterface | None:
+        """已创建的客户端，不存在时返回 None"""
+        client = session_client_cache.get(sys_session_id)
+        if client is not None:
+            metrics_helper.cache_hit("client")
+        return client
+
     @staticmethod
     def get_client_by_id(sys_session_id: int) -> ClientInterface:
         """根据传入的client_id选择对应的实现类"""
-        logger.info("get_client_by_id")
+        client = ClientFactory.get_cached_client(sys_session_id)
+        if client is not None:
+            return client
+        metrics_helper.cache_miss("client")
         with get_sys_db() as db:
             sys_session = db.query(SysSession).filter_by(id=sys_session_id).one()
             sys_session_extra = db.query(SysSessionExtra).filter_by(sys_session_id=sys_session_id).first()
             return ClientFactory.get_client(sys_session, sys_session_extra)
 
+    @staticmethod
+    def evict(sys_session_id: int):
+        """关闭并移除缓存的客户端，下次访问时重新创建"""
+        client = session_client_cache.pop(sys_session_id, None)
+        if client:
+            client.clear()
+
     @staticmethod
     def refresh_client_by_id(sys_session_id: int) -> ClientInterface:
         if sys_session_id in session_client_cache:
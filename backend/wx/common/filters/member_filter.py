@@ -0,0 +1,10 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class MemberFilterObj(BaseModel):
+    # 需要解析的成员 username
+    usernames: List[str] = []
+    # 群聊 username，不为空时优先使用群昵称
+    chatroom: Optional[str] = None
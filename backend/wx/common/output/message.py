@@ -2,6 +2,8 @@ from typing import Optional, Dict, List, Any
 
 from pydantic import BaseModel
 
+from wx.common.output.chat_room import ChatRoomMember
+
 
 class WindowsV3Properties(BaseModel):
     localId: int
@@ -67,3 +69,5 @@ class MsgSearchOut(BaseModel):
     start: int
     start_db: Optional[str] = None
     messages: List[Msg]
+    # 本页发送者 username -> 显示名称、头像，每个发送者只出现一次
+    senders: Optional[Dict[str, ChatRoomMember]] = None
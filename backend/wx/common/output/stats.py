@@ -0,0 +1,43 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class TypeCount(BaseModel):
+    type: int
+    count: int
+
+
+class SenderCount(BaseModel):
+    username: str
+    count: int
+
+
+class DayCount(BaseModel):
+    # 日期 yyyy-mm-dd
+    day: str
+    count: int
+
+
+class ChatStatsSummary(BaseModel):
+    username: str
+    msg_count: int = 0
+    # 当前微信发出的消息数
+    sent_count: int = 0
+    received_count: int = 0
+    first_time: Optional[int] = None
+    last_time: Optional[int] = None
+
+
+class ChatStatsDetail(ChatStatsSummary):
+    types: List[TypeCount] = []
+    senders: List[SenderCount] = []
+    # 0 - 23 点各小时消息数
+    hours: List[int] = []
+    days: List[DayCount] = []
+
+
+class StatsOverview(BaseModel):
+    chat_count: int = 0
+    total: ChatStatsDetail
+    top_chats: List[ChatStatsSummary] = []
@@ -0,0 +1,229 @@
+import datetime
+import sqlite3
+import time
+from abc import abstractmethod
+from collections import Counter
+from typing import Dict, List
+
+from config.data_config import settings as data_settings
+from config.log_config import get_context_logger
+from wx.common.output.stats import ChatStatsDetail, ChatStatsSummary, DayCount, SenderCount, StatsOverview, TypeCount
+from wx.common.util.incremental_index import IncrementalIndex
+
+# 整个微信账号的汇总行使用的 username
+ACCOUNT = ''
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS chat_stats ("
+    "username TEXT PRIMARY KEY, msg_count INTEGER, sent_count INTEGER, first_time INTEGER, last_time INTEGER)",
+    "CREATE TABLE IF NOT EXISTS chat_type_stats ("
+    "username TEXT, type INTEGER, count INTEGER, PRIMARY KEY (username, type))",
+    "CREATE TABLE IF NOT EXISTS chat_sender_stats ("
+    "username TEXT, sender TEXT, count INTEGER, PRIMARY KEY (username, sender))",
+    "CREATE TABLE IF NOT EXISTS chat_hour_stats ("
+    "username TEXT, hour INTEGER, count INTEGER, PRIMARY KEY (username, hour))",
+    "CREATE TABLE IF NOT EXISTS chat_day_stats ("
+    "username TEXT, day INTEGER, count INTEGER, PRIMARY KEY (username, day))",
+    "CREATE TABLE IF NOT EXISTS chat_stats_meta (key TEXT PRIMARY KEY, value TEXT)",
+)
+
+
+def utc_offset() -> int:
+    """
+    按小时、按天统计使用的时区偏移（秒），未配置时取服务器本地时区
+    """
+    if data_settings.stats_utc_offset_minutes is not None:
+        return data_settings.stats_utc_offset_minutes * 60
+    return time.localtime().tm_gmtoff
+
+
+def bucket_columns(time_column: str, offset: int) -> str:
+    """
+    消息时间换算为本地小时、本地天序号（自 1970-01-01 起的天数）的 SQL 表达式，
+    在消息库中与 GROUP BY 一起完成聚合，不逐条读取消息
+    """
+    return f"(({time_column} + {offset}) / 3600) % 24, ({time_column} + {offset}) / 86400"
+
+
+def day_text(day: int) -> str:
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=day)).isoformat()
+
+
+class StatsBatch(object):
+    """
+    一次构建的聚合结果，每个会话同时累加到账号汇总行
+    """
+
+    def __init__(self):
+        # username -> [消息数, 发出数, 最早时间, 最晚时间]
+        self.summary: Dict[str, list] = {}
+        self.types = Counter()
+        self.senders = Counter()
+        self.hours = Counter()
+        self.days = Counter()
+
+    def add(self, username: str, msg_type: int, sender: str | None, is_self: bool, hour: int, day: int,
+            count: int, first_time: int, last_time: int):
+        """
+        累加一组 GROUP BY 结果
+        :param sender: 发送者，为空时不计入发送者统计（由调用方另行累加）
+        :param is_self: 是否为当前微信发出
+        """
+        for key in (username, ACCOUNT):
+            summary = self.summary.get(key)
+            if summary is None:
+                summary = self.summary[key] = [0, 0, first_time, last_time]
+            summary[0] += count
+            if is_self:
+                summary[1] += count
+            if first_time is not None:
+                summary[2] = first_time if summary[2] is None else min(summary[2], first_time)
+                summary[3] = last_time if summary[3] is None else max(summary[3], last_time)
+            self.types[(key, msg_type)] += count
+            if hour is not None:
+                self.hours[(key, hour)] += count
+                self.days[(key, day)] += count
+            if sender:
+                self.senders[(key, sender)] += count
+
+    def add_sender(self, username: str, sender: str, count: int = 1):
+        self.senders[(username, sender)] += count
+        self.senders[(ACCOUNT, sender)] += count
+
+    def merge(self, other: 'StatsBatch'):
+        """
+        合并一个表的聚合结果，表读取成功后再合并，失败的表不留下部分计数
+        """
+        for username, (count, sent, first_time, last_time) in other.summary.items():
+            summary = self.summary.get(username)
+            if summary is None:
+                self.summary[username] = [count, sent, first_time, last_time]
+                continue
+            summary[0] += count
+            summary[1] += sent
+            if first_time is not None:
+                summary[2] = first_time if summary[2] is None else min(summary[2], first_time)
+                summary[3] = last_time if summary[3] is None else max(summary[3], last_time)
+        self.types.update(other.types)
+        self.senders.update(other.senders)
+        self.hours.update(other.hours)
+        self.days.update(other.days)
+
+    def __len__(self):
+        return self.summary.get(ACCOUNT, [0])[0]
+
+
+class ChatStats(IncrementalIndex):
+    """
+    会话统计：每个会话及整个账号的消息数、首末消息时间、按类型、发送者、小时、天的消息数
+    解析完成后在消息库上按表 GROUP BY 聚合，按库、表记录已统计的最大 local_id 增量更新，接口只读取汇总表
+    """
+    stage = "stats"
+    title = "会话统计"
+    schema = SCHEMA
+    tables = ("chat_stats", "chat_type_stats", "chat_sender_stats", "chat_hour_stats", "chat_day_stats",
+              "chat_stats_meta")
+    progress_table = "chat_stats_progress"
+
+    def save(self, conn: sqlite3.Connection, batch: StatsBatch):
+        """
+        将增量聚合结果累加到汇总表
+        """
+        # SQLite 多参数 MIN / MAX 任一参数为 NULL 时结果为 NULL，两侧都需 COALESCE
+        conn.executemany(
+            "INSERT INTO chat_stats VALUES (?, ?, ?, ?, ?) ON CONFLICT(username) DO UPDATE SET "
+            "msg_count = msg_count + excluded.msg_count, sent_count = sent_count + excluded.sent_count, "
+            "first_time = MIN(COALESCE(first_time, excluded.first_time), "
+            "COALESCE(excluded.first_time, first_time)), "
+            "last_time = MAX(COALESCE(last_time, excluded.last_time), COALESCE(excluded.last_time, last_time))",
+            [(username, *summary) for username, summary in batch.summary.items()]
+        )
+        for table, column, counter in (("chat_type_stats", "type", batch.types),
+                                       ("chat_sender_stats", "sender", batch.senders),
+                                       ("chat_hour_stats", "hour", batch.hours),
+                                       ("chat_day_stats", "day", batch.days)):
+            conn.executemany(
+                f"INSERT INTO {table} VALUES (?, ?, ?) ON CONFLICT(username, {column}) DO UPDATE SET "
+                f"count = count + excluded.count",
+                [(username, key, count) for (username, key), count in counter.items()]
+            )
+
+    def needs_rebuild(self, conn: sqlite3.Connection) -> bool:
+        """
+        时区偏移与已有统计不一致时全量重建
+        """
+        row = conn.execute("SELECT value FROM chat_stats_meta WHERE key = 'utc_offset'").fetchone()
+        if row is not None and int(row[0]) != utc_offset():
+            get_context_logger().info("统计时区已变更，全量重建会话统计")
+            return True
+        return False
+
+    def build_index(self, conn: sqlite3.Connection) -> int:
+        offset = utc_offset()
+        batch = StatsBatch()
+        self.build_stats(conn, batch, offset)
+        self.save(conn, batch)
+        conn.execute("INSERT OR REPLACE INTO chat_stats_meta VALUES ('utc_offset', ?)", (str(offset),))
+        return len(batch)
+
+    @abstractmethod
+    def build_stats(self, conn: sqlite3.Connection, batch: StatsBatch, offset: int):
+        """
+        遍历消息库中 local_id 大于已统计值的消息，聚合到 batch 并更新进度
+        :param offset: 时区偏移（秒），用于 bucket_columns
+        """
+        pass
+
+    def summaries(self, limit: int = 20, order_by: str = "msg_count") -> List[ChatStatsSummary]:
+        """
+        会话统计排行
+        :param order_by: msg_count / sent_count / last_time / first_time
+        """
+        if order_by not in ("msg_count", "sent_count", "last_time", "first_time"):
+            order_by = "msg_count"
+        rows = self.read(
+            f"SELECT username, msg_count, sent_count, first_time, last_time FROM chat_stats "
+            f"WHERE username != ? ORDER BY {order_by} DESC LIMIT ?", (ACCOUNT, limit)
+        )
+        return [to_summary(row) for row in rows]
+
+    def chat(self, username: str, senders: int = 50) -> ChatStatsDetail | None:
+        """
+        单个会话的统计，username 为空串时为整个账号
+        :param senders: 返回发送者数量上限，按消息数倒序
+        """
+        rows = self.read(
+            "SELECT username, msg_count, sent_count, first_time, last_time FROM chat_stats WHERE username = ?",
+            (username,)
+        )
+        if not rows:
+            return None
+        detail = ChatStatsDetail(**to_summary(rows[0]).model_dump())
+        detail.types = [TypeCount(type=t, count=c) for t, c in self.read(
+            "SELECT type, count FROM chat_type_stats WHERE username = ? ORDER BY count DESC", (username,))]
+        detail.senders = [SenderCount(username=s, count=c) for s, c in self.read(
+            "SELECT sender, count FROM chat_sender_stats WHERE username = ? ORDER BY count DESC LIMIT ?",
+            (username, senders))]
+        hours = [0] * 24
+        for hour, count in self.read("SELECT hour, count FROM chat_hour_stats WHERE username = ?", (username,)):
+            hours[hour] = count
+        detail.hours = hours
+        detail.days = [DayCount(day=day_text(d), count=c) for d, c in self.read(
+            "SELECT day, count FROM chat_day_stats WHERE username = ? ORDER BY day", (username,))]
+        return detail
+
+    def overview(self, top: int = 20) -> StatsOverview | None:
+        """
+        整个账号的统计与消息数最多的会话
+        """
+        total = self.chat(ACCOUNT)
+        if total is None:
+            return None
+        rows = self.read("SELECT COUNT(*) FROM chat_stats WHERE username != ?", (ACCOUNT,))
+        return StatsOverview(chat_count=rows[0][0] if rows else 0, total=total, top_chats=self.summaries(top))
+
+
+def to_summary(row: tuple) -> ChatStatsSummary:
+    username, msg_count, sent_count, first_time, last_time = row
+    return ChatStatsSummary(username=username, msg_count=msg_count, sent_count=sent_count,
+                            received_count=msg_count - sent_count, first_time=first_time, last_time=last_time)
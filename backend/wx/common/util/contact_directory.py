@@ -0,0 +1,148 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, Iterable, List, NamedTuple
+
+from app.helper import metrics_helper
+from config.log_config import get_context_logger
+from wx.common.output.contact import Contact
+
+# 非主联系人表的来源（如 v3 的 OpenIM 联系人）使用的类型值
+EXTERNAL_TYPE = -1
+
+
+class ContactRow(NamedTuple):
+    username: str
+    type: int | None = None
+    alias: str | None = None
+    remark: str | None = None
+    remark_quanpin: str | None = None
+    remark_quanpin_initial: str | None = None
+    nickname: str | None = None
+    nickname_quanpin: str | None = None
+    nickname_quanpin_initial: str | None = None
+    small_head_url: str | None = None
+
+
+class DirectoryData(object):
+    """
+    构建完成后只读的联系人数据，按昵称排序存放在列数组中：
+    前缀索引为排序后的 (小写键, 序号) 两个并列数组，键来自昵称、备注、微信号、全拼、首字母；
+    包含匹配在昵称、备注拼成的一个小写字符串上查找，与原 LIKE '%…%' 的结果一致
+    """
+
+    def __init__(self, rows: List[ContactRow]):
+        rows.sort(key=lambda row: row.nickname or "")
+        self.columns = tuple(zip(*rows)) if rows else tuple(() for _ in ContactRow._fields)
+        self.size = len(rows)
+        self.types = array('i', (EXTERNAL_TYPE if row.type is None else row.type for row in rows))
+        self.positions = {row.username: i for i, row in enumerate(rows)}
+        keys = []
+        for i, row in enumerate(rows):
+            for value in (row.nickname, row.remark, row.alias, row.nickname_quanpin, row.nickname_quanpin_initial,
+                          row.remark_quanpin, row.remark_quanpin_initial):
+                if value:
+                    keys.append((value.lower(), i))
+        keys.sort()
+        self.prefix_keys = [key for key, _ in keys]
+        self.prefix_ids = array('i', (i for _, i in keys))
+        parts = []
+        self.offsets = array('i')
+        offset = 0
+        for row in rows:
+            text = f"{(row.nickname or '').lower()}\x00{(row.remark or '').lower()}\n"
+            self.offsets.append(offset)
+            parts.append(text)
+            offset += len(text)
+        self.blob = "".join(parts)
+
+    def row(self, i: int) -> ContactRow:
+        return ContactRow(*(column[i] for column in self.columns))
+
+    def search(self, text: str) -> List[int]:
+        """
+        返回匹配的序号，按昵称排序
+        """
+        key = text.lower()
+        hits = set()
+        start = bisect_left(self.prefix_keys, key)
+        for i in range(start, len(self.prefix_keys)):
+            if not self.prefix_keys[i].startswith(key):
+                break
+            hits.add(self.prefix_ids[i])
+        pos = self.blob.find(key)
+        while pos != -1:
+            hits.add(bisect_right(self.offsets, pos) - 1)
+            pos = self.blob.find(key, pos + 1)
+        return sorted(hits)
+
+
+class ContactDirectory(object):
+    """
+    会话级联系人目录：首次使用时从联系人库加载一次，客户端 clear（每次解析后）时丢弃，
+    联系人列表、搜索在内存中完成，不再逐次查询联系人库
+    """
+
+    def __init__(self, loader: Callable[[], Iterable[ContactRow]]):
+        """
+        :param loader: 读取全部联系人，由具体客户端实现
+        """
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.data: DirectoryData | None = None
+
+    def clear(self):
+        self.data = None
+
+    def get_data(self) -> DirectoryData:
+        data = self.data
+        if data is not None:
+            metrics_helper.cache_hit("contact_directory")
+            return data
+        with self.lock:
+            if self.data is None:
+                metrics_helper.cache_miss("contact_directory")
+                self.data = DirectoryData(list(self.loader()))
+                get_context_logger().info("联系人目录加载完成，共 %d 个联系人", self.data.size)
+            return self.data
+
+    def get(self, username: str) -> ContactRow | None:
+        data = self.get_data()
+        i = data.positions.get(username)
+        return None if i is None else data.row(i)
+
+    def query(self, search: str | None = None, type_filter: Callable[[int], bool] = None,
+              row_filter: Callable[[ContactRow], bool] = None) -> List[ContactRow]:
+        """
+        按关键字、类型查询联系人，结果按昵称排序
+        :param search: 关键字，匹配昵称、备注、微信号、全拼、首字母前缀，以及昵称、备注包含
+        :param type_filter: 按联系人类型过滤
+        :param row_filter: 其余条件
+        """
+        data = self.get_data()
+        ids = data.search(search) if search else range(data.size)
+        if type_filter is not None:
+            ids = [i for i in ids if type_filter(data.types[i])]
+        rows = [data.row(i) for i in ids]
+        if row_filter is not None:
+            rows = [row for row in rows if row_filter(row)]
+        return rows
+
+
+def to_contact(row: ContactRow) -> Contact:
+    return Contact(
+        username=row.username,
+        alias=row.alias,
+        remark=row.remark,
+        remark_quanpin=row.remark_quanpin,
+        remark_quanpin_initial=row.remark_quanpin_initial,
+        nickname=row.nickname,
+        nickname_quanpin=row.nickname_quanpin,
+        nickname_quanpin_initial=row.nickname_quanpin_initial,
+        small_head_url=row.small_head_url
+    )
+
+
+def page(rows: List, page_no: int, size: int) -> List:
+    start = (page_no - 1) * size
+    return rows[start:start + size]
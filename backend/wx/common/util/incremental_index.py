@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import List, Tuple
+
+from app.services.task_progress import get_progress
+from config.log_config import get_context_logger
+
+
+class IncrementalIndex(ABC):
+    """
+    解析完成后由消息库生成的 sqlite 附属库，持久化在会话目录下
+    按 (库名, 表名) 记录已处理的最大 local_id 实现增量更新；查询时每个线程复用一个只读连接
+    """
+    # 阶段名称与日志中的名称，由子类定义
+    stage = ""
+    title = ""
+    # 建表语句与全量重建时清空的表（含进度表）
+    schema: Tuple[str, ...] = ()
+    tables: Tuple[str, ...] = ()
+    progress_table = ""
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        构建用的写连接，建表只在这里执行
+        """
+        folder = os.path.dirname(self.index_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in self.schema:
+            conn.execute(statement)
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.progress_table} ("
+            f"db_name TEXT, table_name TEXT, max_local_id INTEGER, PRIMARY KEY (db_name, table_name))"
+        )
+        return conn
+
+    def reader(self) -> sqlite3.Connection | None:
+        """
+        当前线程的只读连接，附属库尚未生成时返回 None
+        """
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            if not os.path.exists(self.index_path):
+                return None
+            conn = self.local.conn = sqlite3.connect(self.index_path, timeout=30)
+        return conn
+
+    def read(self, sql: str, parameters=()) -> List[tuple]:
+        """
+        在当前线程的只读连接上查询，附属库不存在或查询失败时返回空列表
+        """
+        try:
+            conn = self.reader()
+            if conn is None:
+                return []
+            return conn.execute(sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            get_context_logger().warning(f"{self.title}查询失败: {e}")
+            return []
+
+    def max_local_id(self, conn: sqlite3.Connection, db_name: str, table_name: str) -> int:
+        row = conn.execute(
+            f"SELECT max_local_id FROM {self.progress_table} WHERE db_name = ? AND table_name = ?",
+            (db_name, table_name)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def set_max_local_id(self, conn: sqlite3.Connection, db_name: str, table_name: str, max_local_id: int | None):
+        if max_local_id is not None:
+            conn.execute(f"INSERT OR REPLACE INTO {self.progress_table} VALUES (?, ?, ?)",
+                         (db_name, table_name, max_local_id))
+
+    def needs_rebuild(self, conn: sqlite3.Connection) -> bool:
+        """已有数据失效、需要全量重建时返回 True"""
+        return False
+
+    def build(self, deep: bool = False):
+        """
+        增量构建，deep 为 True 时全量重建
+        重建在同一事务内清空各表而不是删除文件，查询线程持有的连接仍然有效
+        """
+        logger = get_context_logger()
+        get_progress().stage(self.stage)
+        with self.lock:
+            with closing(self.connect()) as conn:
+                with conn:
+                    if deep or self.needs_rebuild(conn):
+                        logger.info(f"全量重建{self.title}：{self.index_path}")
+                        for table in (*self.tables, self.progress_table):
+                            conn.execute(f"DELETE FROM {table}")
+                    count = self.build_index(conn)
+            logger.info(f"{self.title}更新完成，新增 {count} 条")
+
+    @abstractmethod
+    def build_index(self, conn: sqlite3.Connection) -> int:
+        """遍历消息库，增量写入附属库，返回新增数量"""
+        pass
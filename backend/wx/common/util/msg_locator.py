@@ -0,0 +1,48 @@
+import sqlite3
+from typing import Iterable, Tuple
+
+from wx.common.util.incremental_index import IncrementalIndex
+
+
+class MsgLocator(IncrementalIndex):
+    """
+    消息定位索引：server_id -> (库名, 表名, local_id)
+    解析时构建，按库、表记录已索引的最大 local_id 实现增量更新
+    """
+    stage = "msg_index"
+    title = "消息定位索引"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS msg_locator ("
+        "server_id INTEGER PRIMARY KEY, db_name TEXT, table_name TEXT, local_id INTEGER)",
+    )
+    tables = ("msg_locator",)
+    progress_table = "msg_locator_progress"
+
+    def locate(self, server_id: int) -> Tuple[str, str, int] | None:
+        """
+        根据 server_id 定位消息所在库
+        :return: (db_name, table_name, local_id)，索引中不存在返回 None
+        """
+        if not server_id:
+            return None
+        rows = self.read("SELECT db_name, table_name, local_id FROM msg_locator WHERE server_id = ?", (server_id,))
+        if not rows:
+            return None
+        return rows[0][0], rows[0][1], rows[0][2]
+
+    def save(self, conn: sqlite3.Connection, db_name: str, table_name: str, rows: Iterable[Tuple[int, int]]):
+        """
+        写入一个表的增量索引
+        :param rows: (local_id, server_id) 列表，需按 local_id 升序
+        """
+        max_local_id = None
+        data = []
+        for local_id, server_id in rows:
+            max_local_id = local_id
+            if server_id:
+                data.append((server_id, db_name, table_name, local_id))
+        if max_local_id is None:
+            return 0
+        conn.executemany("INSERT OR REPLACE INTO msg_locator VALUES (?, ?, ?, ?)", data)
+        self.set_max_local_id(conn, db_name, table_name, max_local_id)
+        return len(data)
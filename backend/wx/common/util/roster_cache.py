@@ -0,0 +1,34 @@
+import threading
+
+from cachetools import LRUCache
+
+from app.helper import metrics_helper
+from wx.common.output.chat_room import ChatRoomInfo
+
+
+class RosterCache(object):
+    """
+    群成员名单缓存：chatroom -> 解析后的 ChatRoomInfo，按最近使用淘汰，客户端 clear（每次解析后）时清空
+    缓存的对象被多个请求共用，调用方不应修改
+    """
+
+    def __init__(self, maxsize: int):
+        self.lock = threading.Lock()
+        self.cache = LRUCache(maxsize=maxsize)
+
+    def get(self, chatroom: str) -> ChatRoomInfo | None:
+        with self.lock:
+            info = self.cache.get(chatroom)
+        if info is None:
+            metrics_helper.cache_miss("chatroom_roster")
+        else:
+            metrics_helper.cache_hit("chatroom_roster")
+        return info
+
+    def put(self, chatroom: str, info: ChatRoomInfo):
+        with self.lock:
+            self.cache[chatroom] = info
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
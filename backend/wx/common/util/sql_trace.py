@@ -0,0 +1,179 @@
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import Engine, event
+
+from app.helper import metrics_helper
+from config.log_config import logger
+from config.metrics_config import settings as metrics_settings
+from config.sql_trace_config import settings as trace_settings
+
+# 执行耗时只按客户端、分片统计，查找调用方需遍历栈帧，只对慢查询执行
+sql_seconds = metrics_helper.histogram("cloudbak_wx_sql_duration_seconds", "微信库 SQL 执行耗时",
+                                       ("client", "shard"))
+slow_queries = metrics_helper.counter("cloudbak_wx_sql_slow_total", "微信库慢查询次数",
+                                      ("client", "shard", "manager"))
+
+# 动态模型的表名带 md5，归一化后同一类查询合并统计
+TABLE_MD5_PATTERN = re.compile(r'\b(Msg|Chat|ChatMsg)_[0-9a-fA-F]{32}\b')
+IN_LIST_PATTERN = re.compile(r'\(\s*\?(\s*,\s*\?)+\s*\)')
+# 这些文件中的栈帧是引擎、库管理本身，不作为调用方
+TRACE_SKIP_FILES = ("sql_trace.py", "windows_v3_db.py", "windows_v4_db.py")
+# code 对象 -> 是否为微信管理类方法
+manager_codes: Dict[object, bool] = {}
+
+
+def shard_name(db_path: str) -> str:
+    """库文件名作为分片标签，去掉 decoded_ 前缀"""
+    return os.path.basename(db_path).removeprefix("decoded_")
+
+
+def normalize(statement: str) -> str:
+    """
+    归一化语句：md5 表名、IN 参数列表替换为占位，压缩空白
+    """
+    statement = TABLE_MD5_PATTERN.sub(lambda m: f"{m.group(1)}_<md5>", statement)
+    statement = IN_LIST_PATTERN.sub("(?, ...)", statement)
+    return " ".join(statement.split())
+
+
+def is_manager_code(code) -> bool:
+    flag = manager_codes.get(code)
+    if flag is None:
+        path = code.co_filename.replace("\\", "/")
+        flag = (("/wx/" in path or path.startswith("wx/")) and os.path.basename(path) not in TRACE_SKIP_FILES
+                and code.co_argcount > 0 and code.co_varnames[0] == "self")
+        manager_codes[code] = flag
+    return flag
+
+
+def caller_manager() -> str:
+    """
+    向上查找发起查询的微信管理类（ContactManagerWindowsV4、WindowsV4MsgLocator 等），作为 manager 标签
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        if is_manager_code(frame.f_code):
+            instance = frame.f_locals.get("self")
+            if instance is not None:
+                return type(instance).__name__
+        frame = frame.f_back
+    return "unknown"
+
+
+class SlowQueryLog(object):
+    """
+    慢查询统计：按分片与归一化语句聚合，保留执行计划与最近一次参数
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: Dict[tuple, dict] = {}
+
+    def record(self, client: str, shard: str, manager: str, statement: str, parameters, elapsed: float) -> dict:
+        key = (client, shard, normalize(statement))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                # 先腾出位置再插入，新语句不会因累计耗时为 0 被立即淘汰
+                self.evict(trace_settings.max_entries - 1)
+                entry = self.entries[key] = {
+                    "client": client,
+                    "shard": shard,
+                    "statement": key[2],
+                    "managers": [],
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "plan": None,
+                }
+            if manager not in entry["managers"]:
+                entry["managers"].append(manager)
+            entry["count"] += 1
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+            entry["last_ms"] = elapsed * 1000
+            entry["last_time"] = time.time()
+            entry["last_parameters"] = repr(parameters)[:500]
+            return entry
+
+    def evict(self, limit: int):
+        """
+        淘汰累计耗时最少的语句，保留 limit 条
+        """
+        overflow = len(self.entries) - max(limit, 0)
+        if overflow <= 0:
+            return
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["total_ms"])[:overflow]:
+            del self.entries[key]
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[dict]:
+        if order_by not in ("total_ms", "max_ms", "count"):
+            order_by = "total_ms"
+        with self.lock:
+            entries = [dict(entry, managers=list(entry["managers"])) for entry in self.entries.values()]
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        for entry in entries:
+            entry["avg_ms"] = entry["total_ms"] / entry["count"]
+        return entries[:limit]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain(cursor, statement: str, parameters) -> List[str] | None:
+    """
+    在同一连接上执行 EXPLAIN QUERY PLAN，返回计划各行描述
+    """
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    plan_cursor = cursor.connection.cursor()
+    try:
+        plan_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [str(row[-1]) for row in plan_cursor.fetchall()]
+    except Exception as e:
+        return [f"explain failed: {e}"]
+    finally:
+        plan_cursor.close()
+
+
+def instrument_engine(engine: Engine, client: str, db_path: str):
+    """
+    为微信库 engine 注册 SQL 执行耗时统计，超过阈值的语句记录日志、执行计划并汇总到 slow_query_log
+    耗时为 execute 阶段（SQLite 执行到第一行结果），不含后续逐行读取
+    :param client: 客户端版本标签，如 win.v3 / win.v4
+    :param db_path: 库文件路径
+    """
+    shard = shard_name(db_path)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # 开始时间保存在本次执行的 context 上，执行失败时随 context 一起释放，不在连接上累积
+        if context is not None:
+            context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if metrics_settings.enabled:
+            sql_seconds.observe(elapsed, client=client, shard=shard)
+        if not trace_settings.enabled or elapsed * 1000 < trace_settings.slow_threshold_ms:
+            return
+        manager = caller_manager()
+        slow_queries.inc(client=client, shard=shard, manager=manager)
+        entry = slow_query_log.record(client, shard, manager, statement, parameters, elapsed)
+        if entry["plan"] is None and trace_settings.explain and not executemany:
+            entry["plan"] = explain(cursor, statement, parameters) or []
+        logger.warning(f"慢查询 {elapsed * 1000:.1f}ms [{client} {shard} {manager}] {entry['statement'][:1000]} "
+                       f"plan: {entry['plan']}")
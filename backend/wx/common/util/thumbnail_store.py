@@ -0,0 +1,189 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Callable, Iterable, List, Tuple
+
+from PIL import Image, ImageOps
+
+from config.app_config import settings as app_settings
+from app.helper import metrics_helper
+from app.services.task_progress import get_progress
+from config.log_config import get_context_logger
+
+THUMB_MIME = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+
+class ThumbnailStore(object):
+    """
+    图片缩略图存储：按源文件内容 sha1 寻址，同一图片无论被多少路径引用只生成一份
+    thumbs/<sha1 前两位>/<sha1>_<size>.<format>
+    源文件相对路径 -> (sha1, 源文件修改时间) 的映射保存在 thumbs/thumb_index.db
+    """
+
+    def __init__(self, base_dir: str, thumb_dir: str, decoder: Callable[[str], Tuple[bytes, str]]):
+        """
+        :param base_dir: 源文件相对路径的根目录
+        :param thumb_dir: 缩略图存放目录
+        :param decoder: 源文件解码函数，返回 (原图 bytes, mime)
+        """
+        self.base_dir = base_dir
+        self.thumb_dir = thumb_dir
+        self.index_path = os.path.join(thumb_dir, 'thumb_index.db')
+        self.decoder = decoder
+        self.sizes = sorted(app_settings.thumb_sizes)
+        self.format = 'jpeg' if app_settings.thumb_format.lower() in ('jpg', 'jpeg') else 'webp'
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @property
+    def mime(self) -> str:
+        return THUMB_MIME[self.format]
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        生成用的写连接，建表只在这里执行
+        """
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS thumb_index (rel_path TEXT PRIMARY KEY, digest TEXT, mtime INTEGER)"
+        )
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        当前线程的只读连接，调用方需确认索引库已存在
+        """
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.index_path, timeout=30)
+        return conn
+
+    def pick_size(self, size: int | None) -> int:
+        """把请求尺寸归到最接近且不小于它的档位"""
+        if not size:
+            return self.sizes[0]
+        for s in self.sizes:
+            if s >= size:
+                return s
+        return self.sizes[-1]
+
+    def thumb_path(self, digest: str, size: int) -> str:
+        return os.path.join(self.thumb_dir, digest[:2], f"{digest}_{size}.{self.format}")
+
+    def lookup(self, rel_path: str, size: int | None = None) -> str | None:
+        """
+        查询已生成的缩略图，源文件有变化或缩略图不存在时返回 None
+        """
+        abs_path = os.path.join(self.base_dir, rel_path)
+        if not os.path.exists(self.index_path) or not os.path.exists(abs_path):
+            return None
+        try:
+            row = self.reader().execute(
+                "SELECT digest, mtime FROM thumb_index WHERE rel_path = ?", (rel_path,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            # 索引库已创建但表尚未建好
+            get_context_logger().warning(f"查询缩略图索引失败: {e}")
+            return None
+        if row is None or row[1] != int(os.path.getmtime(abs_path)):
+            return None
+        path = self.thumb_path(row[0], self.pick_size(size))
+        return path if os.path.exists(path) else None
+
+    def get(self, rel_path: str, size: int | None = None) -> str | None:
+        """
+        获取缩略图路径，未生成时即时生成
+        """
+        path = self.lookup(rel_path, size)
+        if path:
+            metrics_helper.cache_hit("thumbnail")
+            return path
+        metrics_helper.cache_miss("thumbnail")
+        digest = self.generate(rel_path)
+        if digest is None:
+            return None
+        path = self.thumb_path(digest, self.pick_size(size))
+        return path if os.path.exists(path) else None
+
+    def generate(self, rel_path: str, conn: sqlite3.Connection | None = None) -> str | None:
+        """
+        生成单个源文件的全部档位缩略图，返回内容 sha1，失败返回 None
+        """
+        abs_path = os.path.join(self.base_dir, rel_path)
+        try:
+            mtime = int(os.path.getmtime(abs_path))
+            with open(abs_path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            missing = [s for s in self.sizes if not os.path.exists(self.thumb_path(digest, s))]
+            if missing:
+                raw, _ = self.decoder(abs_path)
+                self.render(raw, digest, missing)
+        except Exception as e:
+            get_context_logger().warning(f"生成缩略图失败 {rel_path}: {e}")
+            return None
+        if conn is None:
+            with closing(self.connect()) as conn, conn:
+                self.save(conn, [(rel_path, digest, mtime)])
+        else:
+            self.save(conn, [(rel_path, digest, mtime)])
+        return digest
+
+    def render(self, raw: bytes, digest: str, sizes: List[int]):
+        with Image.open(io.BytesIO(raw)) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            if self.format == 'jpeg' and image.mode == 'RGBA':
+                image = image.convert('RGB')
+            folder = os.path.join(self.thumb_dir, digest[:2])
+            os.makedirs(folder, exist_ok=True)
+            for size in sorted(sizes, reverse=True):
+                thumb = image.copy()
+                thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+                target = self.thumb_path(digest, size)
+                tmp = f"{target}.tmp"
+                thumb.save(tmp, format=self.format.upper(), quality=app_settings.thumb_quality)
+                os.replace(tmp, target)
+
+    def save(self, conn: sqlite3.Connection, rows: Iterable[Tuple[str, str, int]]):
+        with self.lock:
+            conn.executemany("INSERT OR REPLACE INTO thumb_index VALUES (?, ?, ?)", rows)
+
+    def build(self, rel_paths: Iterable[str], deep: bool = False) -> int:
+        """
+        批量生成缩略图，已生成且源文件未变化的跳过
+        :param rel_paths: 源文件相对 base_dir 的路径
+        :param deep: 全量重建
+        """
+        logger = get_context_logger()
+        with closing(self.connect()) as conn:
+            if deep:
+                with conn:
+                    conn.execute("DELETE FROM thumb_index")
+            indexed = {row[0]: row[1] for row in conn.execute("SELECT rel_path, mtime FROM thumb_index")}
+            pending = [p for p in rel_paths
+                       if indexed.get(p) != int(os.path.getmtime(os.path.join(self.base_dir, p)))]
+            logger.info(f"待生成缩略图 {len(pending)} 个")
+            # 工作线程中没有上下文进度，在此取出后传入
+            progress = get_progress()
+            progress.stage("thumbnails", len(pending))
+
+            def generate(rel_path: str):
+                digest = self.generate(rel_path, conn)
+                progress.advance(files=1)
+                return digest
+
+            with conn, ThreadPoolExecutor(max_workers=max(app_settings.thumb_workers, 1)) as executor:
+                results = list(executor.map(generate, pending))
+        count = sum(1 for r in results if r)
+        logger.info(f"缩略图生成完成，成功 {count} 个，失败 {len(pending) - count} 个")
+        return count
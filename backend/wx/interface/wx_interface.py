@@ -1,20 +1,22 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Set
 
 from sqlalchemy.orm import sessionmaker
 
 from app.enum.resource_enum import ResourceType
 from app.models.sys import SysSession, SysSessionExtra
+from config.log_config import logger
 from wx.common.enum.contact_type import ContactType
 from wx.common.filters.contact_filter import ContactFilterObj
 from wx.common.filters.fts_filter import FtsFilterObj
 from wx.common.filters.msg_filter import MsgFilterObj, SingleMsgFilterObj
 from wx.common.filters.session_filter import SessionFilterObj
-from wx.common.output.chat_room import ChatRoomInfo
+from wx.common.output.chat_room import ChatRoomInfo, ChatRoomMember
 from wx.common.output.contact import Contact, ContactSearchOut
 from wx.common.output.fts import FtsMsgCountTop, FtsMsgCount, FtsMsgCross
 from wx.common.output.message import MsgSearchOut, Msg
 from wx.common.output.session import Session, CheckResult
+from wx.common.util.contact_directory import ContactRow
 
 
 class DBManager(ABC):
@@ -23,6 +25,14 @@ class DBManager(ABC):
         """清除连接"""
         pass
 
+    @abstractmethod
+    def clear_dbs(self, db_names: Set[str]):
+        """
+        只关闭指定库的连接
+        :param db_names: 库文件名（解密前的原文件名，如 MSG0.db）
+        """
+        pass
+
 
 class Decryptor(ABC):
     @abstractmethod
@@ -30,6 +40,15 @@ class Decryptor(ABC):
         """数据库解析"""
         pass
 
+    @abstractmethod
+    def decrypt_file(self, db_file: str) -> bool:
+        """
+        解密单个数据库文件，文件未变化且已解密时跳过
+        :param db_file: 数据库文件绝对路径
+        :return: 是否产生了新的解密文件
+        """
+        pass
+
 
 class ContactManager(ABC):
     """
@@ -74,6 +93,65 @@ class ChatRoomManager(ABC):
     def chatroom_info(self, username: str) -> ChatRoomInfo:
         pass
 
+    def clear(self):
+        """清除缓存的群成员名单"""
+        pass
+
+    def lookup_contact(self, username: str) -> ContactRow | None:
+        """联系人目录中的联系人，由具体客户端实现"""
+        return None
+
+    def default_head_url(self, username: str) -> str | None:
+        """联系人目录中没有头像地址时使用的头像地址"""
+        return None
+
+    def members(self, usernames: List[str], chatroom: str = None) -> List[ChatRoomMember]:
+        """
+        批量解析成员的显示名称与头像，群昵称优先，其次备注、昵称
+        :param usernames: 成员 username，重复的只返回一次
+        :param chatroom: 群聊 username，为空时只从联系人目录解析
+        """
+        roster = {}
+        if chatroom:
+            roster = {member.username: member for member in self.chatroom_info(chatroom).members or []}
+        members = []
+        for username in dict.fromkeys(usernames):
+            member = roster.get(username)
+            if member is None:
+                contact = self.lookup_contact(username)
+                if contact is None:
+                    member = ChatRoomMember(username=username)
+                else:
+                    member = ChatRoomMember(username=username, nickname=contact.nickname, remark=contact.remark,
+                                            display_name=contact.remark or contact.nickname,
+                                            small_head_img=contact.small_head_url)
+            if not member.small_head_img:
+                head_url = self.default_head_url(username)
+                if head_url:
+                    member = member.model_copy(update={"small_head_img": head_url})
+            members.append(member)
+        return members
+
+    def enrich_senders(self, username: str, out: MsgSearchOut) -> MsgSearchOut:
+        """
+        为消息分页附加本页发送者的显示名称与头像，前端渲染无需再逐个请求群成员、头像
+        :param username: 聊天 username，群聊时优先使用群昵称
+        """
+        senders = []
+        for msg in out.messages:
+            properties = msg.windows_v3_properties or msg.windows_v4_properties
+            if properties is not None and properties.sender:
+                senders.append(properties.sender)
+        if not senders:
+            return out
+        chatroom = username if username and username.endswith("@chatroom") else None
+        try:
+            out.senders = {member.username: member for member in self.members(senders, chatroom)}
+        except Exception as e:
+            # 发送者信息只是附加数据，失败时仍返回消息
+            logger.warning(f"发送者信息解析失败: {e}")
+        return out
+
 
 class MessageManager(ABC):
     """
@@ -147,6 +225,14 @@ class ResourceManager(ABC):
         """
         pass
 
+    def index_attachment(self, file_path: str) -> bool:
+        """
+        附件上传完成后建立索引（缩略图等），默认不处理
+        :param file_path: 附件绝对路径
+        :return: 是否建立了索引
+        """
+        return False
+
 
 class ClientInterface(ABC):
 
@@ -183,11 +269,28 @@ class ClientInterface(ABC):
         """清理数据"""
         pass
 
+    def clear_dbs(self, db_names: Set[str]):
+        """
+        只清理依赖指定库的连接与缓存，默认全部清理
+        :param db_names: 重新解密的库文件名（解密前的原文件名，如 MSG0.db）
+        """
+        self.clear()
+
     @abstractmethod
     def decrypt_db(self):
         """执行一次数据解析"""
         pass
 
+    @abstractmethod
+    def build_indexes(self, deep: bool = False):
+        """数据解析完成后构建索引"""
+        pass
+
+    @abstractmethod
+    def build_stats(self, deep: bool = False):
+        """数据解析完成后构建会话统计，需遍历全部新增消息，只在任务进程中执行"""
+        pass
+
     @abstractmethod
     def sys_session_check(self) -> CheckResult:
         """执行数据检查"""
@@ -201,6 +304,16 @@ class ClientInterface(ABC):
     def get_taker_id_manager(self):
         pass
 
+    @abstractmethod
+    def get_msg_locator(self):
+        """消息定位索引"""
+        pass
+
+    @abstractmethod
+    def get_chat_stats(self):
+        """会话统计"""
+        pass
+
     @abstractmethod
     def get_contact_manager(self) -> ContactManager:
         pass
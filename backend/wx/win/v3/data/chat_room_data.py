@@ -1,37 +1,56 @@
 from app.models.proto import cr_extra_buf_pb2
+from config.data_config import settings as data_settings
 from config.log_config import logger
 from wx.common.output.chat_room import ChatRoomInfo, ChatRoomMember
+from wx.common.util.contact_directory import ContactRow
+from wx.common.util.roster_cache import RosterCache
 from wx.interface.wx_interface import ChatRoomManager
+from wx.win.v3.data.contact_data import ContactManagerWindowsV3
 from wx.win.v3.db.windows_v3_db import WindowsV3DB
 from wx.win.v3.models.micro_msg import ChatRoom as ChatRoomModel
-from wx.win.v3.models.micro_msg import Contact as ContactModel
 
 
 class WindowsV3ChatRoomManager(ChatRoomManager):
-    def __init__(self, db_manager: WindowsV3DB):
+    def __init__(self, db_manager: WindowsV3DB, contact_manager: ContactManagerWindowsV3):
         self.db_manager = db_manager
+        self.contact_manager = contact_manager
+        self.rosters = RosterCache(data_settings.chatroom_roster_cache_size)
+
+    def clear(self):
+        self.rosters.clear()
+
+    def lookup_contact(self, username: str) -> ContactRow | None:
+        return self.contact_manager.directory.get(username)
+
+    def default_head_url(self, username: str) -> str | None:
+        # 没有头像地址的成员使用 Misc 库中的头像
+        session_id = self.db_manager.client.get_sys_session().id
+        return f"/api/resources/member-head/{session_id}/{username}"
 
     def chatroom_info(self, username: str) -> ChatRoomInfo:
-        logger.info("执行 chatroom_info")
+        info = self.rosters.get(username)
+        if info is not None:
+            return info
         members = []
         try:
             with self.db_manager.wx_db_micro_msg() as db:
                 chat_room = db.query(ChatRoomModel).filter_by(ChatRoomName=username).one()
-                if chat_room.RoomData:
-                    room_data = cr_extra_buf_pb2.RoomData()
-                    room_data.ParseFromString(chat_room.RoomData)
-                    for u in room_data.users:
-                        member = ChatRoomMember(username=u.id, remark=u.name)
-                        if member.remark is None or member.remark == "":
-                            logger.info(f"成员备注为空，username={member.username}，从Contact表查询昵称")
-                            # 查询 Contact 表获取昵称
-                            contact = db.query(ContactModel).filter_by(UserName=member.username).first()
-                            logger.info(f"获取到 Contact {contact}")
-                            if contact:
-                                member.nickname = contact.NickName
-                        members.append(member)
-            return ChatRoomInfo(username=username, members=members, self_display_name=chat_room.SelfDisplayName)
+            if chat_room.RoomData:
+                room_data = cr_extra_buf_pb2.RoomData()
+                room_data.ParseFromString(chat_room.RoomData)
+                for u in room_data.users:
+                    # 昵称、头像从联系人目录批量获取，不再逐个成员查询 Contact 表
+                    contact = self.lookup_contact(u.id)
+                    members.append(ChatRoomMember(
+                        username=u.id,
+                        remark=u.name,
+                        nickname=contact.nickname if contact else None,
+                        display_name=u.name or (contact.remark or contact.nickname if contact else None),
+                        small_head_img=contact.small_head_url if contact else None
+                    ))
+            info = ChatRoomInfo(username=username, members=members, self_display_name=chat_room.SelfDisplayName)
         except Exception as e:
             logger.error(e)
             return ChatRoomInfo(username=username)
-
+        self.rosters.put(username, info)
+        return info
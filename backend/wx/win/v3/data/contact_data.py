@@ -1,11 +1,11 @@
 from collections import defaultdict
 from typing import List
 
-from sqlalchemy import select, or_
+from sqlalchemy import select
 
-from config.log_config import logger
 from wx.common.enum.contact_type import ContactType
 from wx.common.filters.contact_filter import ContactFilterObj
+from wx.common.util.contact_directory import ContactDirectory, ContactRow, EXTERNAL_TYPE, to_contact, page
 from wx.common.output.chat_room import ChatRoom
 from wx.win.v3.enums.v3_enums import V3DBEnum
 from wx.win.v3.models import micro_msg
@@ -22,38 +22,29 @@ class ContactManagerWindowsV3(ContactManager):
     def __init__(self, db_manager: WindowsV3DB):
         self.db_manager = db_manager
         self.contact_type_dict = defaultdict(lambda: None)
+        self.directory = ContactDirectory(self.load_directory)
 
     def clear(self):
         self.contact_type_dict.clear()
+        self.directory.clear()
 
-    def contacts(self, filter_obj: ContactFilterObj = None) -> List[Contact]:
+    def load_directory(self) -> List[ContactRow]:
+        """
+        联系人目录数据：MicroMsg 全部联系人（含头像）与 OpenIM 联系人
+        """
         stmt = (
             select(ContactModel, ContactHeadImgUrl)
             .join(
                 ContactHeadImgUrl,
                 ContactHeadImgUrl.usrName == ContactModel.UserName,
                 isouter=True
-            ).order_by(ContactModel.NickName.asc())
+            )
         )
-        if filter_obj is not None:
-            logger.info("add limit offset")
-            stmt = stmt.limit(filter_obj.size).offset((filter_obj.page - 1) * filter_obj.size)
-            if filter_obj.contact_type is not None:
-                if filter_obj.contact_type == ContactType.CHATROOM:
-                    stmt = stmt.where(ContactModel.Type.is_("2"), ContactModel.NickName.isnot(''))
-                else:
-                    stmt = stmt.where(ContactModel.Type.not_in([2, 4]))
-            if filter_obj.search is not None and filter_obj.search != '':
-                stmt = stmt.where(or_(
-                    ContactModel.NickName.like(f"%{filter_obj.search}%"),
-                    ContactModel.Remark.like(f"%{filter_obj.search}%")
-                ))
-        logger.info(f"query: {stmt}")
         with self.db_manager.wx_db_micro_msg() as db:
-            results = db.execute(stmt).fetchall()
-            contacts = [
-                Contact(
+            rows = [
+                ContactRow(
                     username=contact.UserName,
+                    type=contact.Type if contact.Type is not None else 0,
                     alias=contact.Alias,
                     remark=contact.Remark,
                     remark_quanpin=contact.RemarkQuanPin,
@@ -62,59 +53,44 @@ class ContactManagerWindowsV3(ContactManager):
                     nickname_quanpin=contact.QuanPin,
                     nickname_quanpin_initial=contact.PYInitial,
                     small_head_url=img.smallHeadImgUrl if img else None,
-                    # big_head_url=img.bigHeadImgUrl
                 )
-                for contact, img in results
+                for contact, img in db.execute(stmt).fetchall()
             ]
+        openim_session_maker = self.db_manager.wx_db_for_conf(V3DBEnum.DB_OPENIM_CONTACT)
+        with openim_session_maker() as openim_db:
+            # 查询openIM联系人
+            for contact in openim_db.query(OpenIMContact).all():
+                rows.append(ContactRow(
+                    username=contact.UserName,
+                    type=EXTERNAL_TYPE,
+                    remark=contact.Remark,
+                    nickname=contact.NickName,
+                    nickname_quanpin=contact.NickNameQuanPin,
+                    remark_quanpin=contact.RemarkQuanPin,
+                    small_head_url=contact.SmallHeadImgUrl,
+                ))
+        return rows
+
+    def contacts(self, filter_obj: ContactFilterObj = None) -> List[Contact]:
         if filter_obj is None:
-            openim_session_maker = self.db_manager.wx_db_for_conf(V3DBEnum.DB_OPENIM_CONTACT)
-            with openim_session_maker() as openim_db:
-                # 查询openIM联系人
-                results = openim_db.query(OpenIMContact).all()
-                for contact in results:
-                    contacts.append(Contact(
-                        username=contact.UserName,
-                        remark=contact.Remark,
-                        nickname=contact.NickName,
-                        small_head_url=contact.SmallHeadImgUrl,
-                        # bigHeadImgUrl=contact.BigHeadImgUrl)
-                    ))
-        return contacts
+            return [to_contact(row) for row in self.directory.query()]
+        # 分页查询只包含 MicroMsg 联系人
+        if filter_obj.contact_type == ContactType.CHATROOM:
+            rows = self.directory.query(filter_obj.search, type_filter=lambda t: t == 2,
+                                        row_filter=lambda row: row.nickname != '')
+        elif filter_obj.contact_type is not None:
+            rows = self.directory.query(filter_obj.search, type_filter=lambda t: t not in (2, 4, EXTERNAL_TYPE))
+        else:
+            rows = self.directory.query(filter_obj.search, type_filter=lambda t: t != EXTERNAL_TYPE)
+        return [to_contact(row) for row in page(rows, filter_obj.page, filter_obj.size)]
 
     def contacts_search(self, filter_obj: ContactFilterObj) -> ContactSearchOut:
-        search = filter_obj.search
-        base_stmt = (
-            select(ContactModel)
-            .where(or_(
-                ContactModel.NickName.like(f"%{search}%"),
-                ContactModel.Remark.like(f"%{search}%")
-            ))
-            .where(ContactModel.Type.not_in([2, 4]))
+        rows = self.directory.query(filter_obj.search, type_filter=lambda t: t not in (2, 4, EXTERNAL_TYPE))
+        return ContactSearchOut(
+            contacts=[Contact(username=row.username) for row in rows if not row.username.endswith("@chatroom")],
+            chatrooms=[ChatRoom(username=row.username) for row in rows if row.username.endswith("@chatroom")]
         )
 
-        contact_stmt = base_stmt.where(ContactModel.UserName.notlike("%@chatroom"))
-
-        chatroom_stmt = base_stmt.where(ContactModel.UserName.like("%@chatroom"))
-
-        with self.db_manager.wx_db_micro_msg() as db:
-            contact_result = db.execute(contact_stmt).scalars().all()
-            logger.info(f"query: {contact_stmt}")
-            chatroom_result = db.execute(chatroom_stmt).scalars().all()
-            return ContactSearchOut(
-                contacts=[
-                    Contact(
-                        username=contact.UserName,
-                    )
-                    for contact in contact_result
-                ],
-                chatrooms=[
-                    ChatRoom(
-                        username=contact.UserName,
-                    )
-                    for contact in chatroom_result
-                ]
-            )
-
     def contact_type(self, username: str) -> ContactType:
         if username in self.contact_type_dict:
             return self.contact_type_dict[username]
@@ -137,44 +113,5 @@ class ContactManagerWindowsV3(ContactManager):
         return ContactType.NORMAL
 
     def base_contacts(self) -> List[Contact]:
-        stmt = (
-            select(ContactModel, ContactHeadImgUrl)
-            .join(
-                ContactHeadImgUrl,
-                ContactHeadImgUrl.usrName == ContactModel.UserName,
-                isouter=True
-            )
-            .where(ContactModel.Type.is_not(4))  # 4为陌生人
-            .order_by(ContactModel.NickName.asc())
-        )
-        with self.db_manager.wx_db_micro_msg() as db:
-            results = db.execute(stmt).fetchall()
-            contacts = [
-                Contact(
-                    username=contact.UserName,
-                    alias=contact.Alias,
-                    remark=contact.Remark,
-                    remark_quanpin=contact.RemarkQuanPin,
-                    remark_quanpin_initial=contact.RemarkPYInitial,
-                    nickname=contact.NickName,
-                    nickname_quanpin=contact.QuanPin,
-                    nickname_quanpin_initial=contact.PYInitial,
-                    small_head_url=img.smallHeadImgUrl if img else None,
-                    # big_head_url=img.bigHeadImgUrl
-                )
-                for contact, img in results
-            ]
-
-        openim_session_maker = self.db_manager.wx_db_for_conf(V3DBEnum.DB_OPENIM_CONTACT)
-        with openim_session_maker() as openim_db:
-            # 查询openIM联系人
-            results = openim_db.query(OpenIMContact).all()
-            for contact in results:
-                contacts.append(Contact(
-                    username=contact.UserName,
-                    remark=contact.Remark,
-                    nickname=contact.NickName,
-                    small_head_url=contact.SmallHeadImgUrl
-                ))
-
-        return contacts
+        # 4为陌生人
+        return [to_contact(row) for row in self.directory.query(type_filter=lambda t: t != 4)]
@@ -29,11 +29,13 @@ class MessageManagerWindowsV3(MessageManager):
         """
         contact_type = ContactUtils.contact_type(filter_obj.username)
         if contact_type == ContactType.OPENIM:
-            return self.message_filter_for_openim(filter_obj)
+            out = self.message_filter_for_openim(filter_obj)
         elif contact_type == ContactType.GH:
-            return self.message_filter_for_gh(filter_obj)
+            out = self.message_filter_for_gh(filter_obj)
         else:
-            return self.message_filter(filter_obj)
+            out = self.message_filter(filter_obj)
+        # 附加发送者显示名称、头像
+        return self.client.get_chat_room_manager().enrich_senders(filter_obj.username, out)
 
     def message_filter_for_openim(self, filter_obj: MsgFilterObj) -> MsgSearchOut:
         talker_id_subq = (
@@ -224,7 +226,17 @@ class MessageManagerWindowsV3(MessageManager):
     def message(self, filter_obj: SingleMsgFilterObj) -> Msg | None:
         """
         单条消息查询
+        优先通过消息定位索引直接查询所在库，索引未命中再遍历所有库
         """
+        located = self.client.get_msg_locator().locate(filter_obj.v3_msg_svr_id)
+        if located:
+            db_name, table_name, local_id = located
+            logger.info(f"定位索引命中：{db_name}, localId={local_id}")
+            msg = self.message_by_local_id(db_name, local_id, filter_obj.v3_msg_svr_id)
+            if msg:
+                return msg
+            # 索引已过期（库重新解析或重新编号），回退到遍历所有库
+            logger.info("定位索引所指消息不匹配，遍历所有库")
         db_array = self.client.get_db_order_manager().msg_db_array()
         for db_name in db_array:
             session_local = self.client.get_db_manager().wx_db_msg_by_name(db_name)
@@ -237,11 +249,31 @@ class MessageManagerWindowsV3(MessageManager):
         openimdb = self.client.get_db_manager().wx_db_for_conf(V3DBEnum.DB_OPENIM_MSG)
         with openimdb() as db:
             m = db.query(OpenIMMsgModel).filter_by(MsgSvrID=filter_obj.v3_msg_svr_id).first()
-            # openim_msg.Msg 转 msg.Msg
-            msg = MsgModel(localId=m.localId, TalkerId=m.talkerId, MsgSvrID=m.MsgSvrID, Type=m.type,
-                             IsSender=m.IsSender, CreateTime=m.CreateTime, Sequence=m.sequence, StatusEx=m.StatusEx,
-                             FlagEx=m.FlagEx, Status=m.Status, StrTalker=m.strTalker, StrContent=m.StrContent,
-                             BytesExtra=m.BytesExtra, BytesTrans=m.BytesTrans)
-            logger.info(f"msg = {msg}")
-            return self.parse_msg(msg)
+            if m is None:
+                return None
+            return self.parse_openim_msg(m)
+
+    def message_by_local_id(self, db_name: str, local_id: int, msg_svr_id: int) -> Msg | None:
+        """
+        根据库名与 localId 查询单条消息，MsgSvrID 不一致（索引过期）时视为未命中
+        """
+        if db_name == V3DBEnum.OPENIM_MSG_DB_NAME:
+            session_local = self.client.get_db_manager().wx_db_for_conf(V3DBEnum.DB_OPENIM_MSG)
+            with session_local() as db:
+                m = db.query(OpenIMMsgModel).filter_by(localId=local_id, MsgSvrID=msg_svr_id).first()
+                return self.parse_openim_msg(m) if m else None
+        session_local = self.client.get_db_manager().wx_db_msg_by_name(db_name)
+        if session_local is None:
+            return None
+        with session_local() as db:
+            db_msg = db.query(MsgModel).filter_by(localId=local_id, MsgSvrID=msg_svr_id).first()
+            return self.parse_msg(db_msg) if db_msg else None
 
+    def parse_openim_msg(self, m: OpenIMMsgModel) -> Msg:
+        # openim_msg.Msg 转 msg.Msg
+        msg = MsgModel(localId=m.localId, TalkerId=m.talkerId, MsgSvrID=m.MsgSvrID, Type=m.type,
+                       IsSender=m.IsSender, CreateTime=m.CreateTime, Sequence=m.sequence, StatusEx=m.StatusEx,
+                       FlagEx=m.FlagEx, Status=m.Status, StrTalker=m.strTalker, StrContent=m.StrContent,
+                       BytesExtra=m.BytesExtra, BytesTrans=m.BytesTrans)
+        logger.info(f"msg = {msg}")
+        return self.parse_msg(msg)
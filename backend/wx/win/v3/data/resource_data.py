@@ -6,6 +6,7 @@ from sqlalchemy.orm import aliased
 from config.log_config import logger
 from wx.common.enum.contact_type import ContactType
 from wx.interface.wx_interface import ResourceManager, ClientInterface
+from wx.win.v3.db.windows_v3_hardlink_index import WindowsV3HardlinkIndex
 from wx.win.v3.enums.v3_enums import V3DBEnum
 from wx.win.v3.models.hard_link_image import HardLinkImageID, HardLinkImageAttribute
 from wx.win.v3.models.micro_msg import ContactHeadImgUrl
@@ -19,8 +20,21 @@ class WindowsV3ResourceManager(ResourceManager):
 
     def __init__(self, client: ClientInterface):
         self.client = client
+        self.hardlink_index = WindowsV3HardlinkIndex(client)
+
+    def clear(self):
+        self.hardlink_index.clear()
 
     def windows_v3_image_from_full_md5(self, full_md5: str, prev: str = 'Thumb'):
+        # 优先从内存索引获取，文件名不以 md5 开头等未命中情况再走 LIKE 查询
+        if self.hardlink_index.ensure_loaded():
+            hit = self.hardlink_index.image(full_md5)
+            if hit:
+                dir_name1, dir_name2, file_name = hit
+                relative_path = f'FileStorage/MsgAttach/{dir_name1}/{prev}/{dir_name2}/{file_name}'
+                logger.info(f'path: {relative_path}')
+                return os.path.join(self.client.get_wx_dir(), relative_path)
+
         HardLinkImageID2 = aliased(HardLinkImageID)
 
         # 构建查询
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+from collections import Counter
+from contextlib import closing
+from typing import NamedTuple
+
+from google.protobuf.message import DecodeError
+
+from app.models.proto import msg_bytes_extra_pb2
+from app.services.task_progress import get_progress
+from config.log_config import get_context_logger
+from wx.common.util.chat_stats import ChatStats, StatsBatch, bucket_columns
+from wx.interface.wx_interface import ClientInterface
+from wx.win.v3.enums.v3_enums import V3DBEnum
+
+
+class MsgSource(NamedTuple):
+    """
+    消息表结构：MSG 分库的会话列为用户名；OpenIMMsg、PublicMsg 的会话列为用户名表的 rowid
+    """
+    table_name: str
+    talker_column: str
+    type_column: str
+    # 会话 id -> 用户名 的表，为空时会话列即用户名
+    names_table: str | None = None
+
+
+MSG_SOURCE = MsgSource('MSG', 'StrTalker', 'Type')
+OPENIM_SOURCE = MsgSource('ChatCRMsg', 'talkerId', 'type', 'Name2ID')
+PUBLIC_SOURCE = MsgSource('PublicMsg', 'TalkerId', 'Type', 'PublicNameToID')
+
+
+def bytes_extra_sender(bytes_extra: bytes | None) -> str | None:
+    """
+    群聊消息发送者 wxid 存放在 BytesExtra 中 s1 == 1 的项
+    """
+    if not bytes_extra:
+        return None
+    proto = msg_bytes_extra_pb2.BytesExtra()
+    try:
+        proto.ParseFromString(bytes_extra)
+    except DecodeError:
+        return None
+    for f3 in proto.f3:
+        if f3.s1 == 1:
+            return f3.s2
+    return None
+
+
+class WindowsV3ChatStats(ChatStats):
+    """
+    微信3 会话统计，遍历 MSG 分库、OpenIMMsg、PublicMsg 按会话聚合
+    非群聊的发送者由 IsSender 得出，群聊他人消息的发送者需解析 BytesExtra，只对增量消息解析一次
+    """
+
+    def __init__(self, client: ClientInterface):
+        super().__init__(os.path.join(client.get_wx_dir(), V3DBEnum.CHAT_STATS_DB))
+        self.client = client
+
+    def build_stats(self, conn: sqlite3.Connection, batch: StatsBatch, offset: int):
+        wx_dir = self.client.get_wx_dir()
+        for db_name in self.client.get_db_manager().multi_msg_db_array():
+            db_path = os.path.join(wx_dir, V3DBEnum.DB_MULTI, db_name)
+            self.stats_table(conn, batch, offset, db_path, db_name, MSG_SOURCE)
+        for db_conf, db_name, source in ((V3DBEnum.DB_OPENIM_MSG, V3DBEnum.OPENIM_MSG_DB_NAME, OPENIM_SOURCE),
+                                         (V3DBEnum.DB_PUBLIC_MSG, V3DBEnum.PUBLIC_MSG_DB_NAME, PUBLIC_SOURCE)):
+            db_path = os.path.join(wx_dir, db_conf)
+            if os.path.exists(db_path):
+                self.stats_table(conn, batch, offset, db_path, db_name, source)
+
+    def stats_table(self, conn: sqlite3.Connection, batch: StatsBatch, offset: int, db_path: str, db_name: str,
+                    source: MsgSource):
+        logger = get_context_logger()
+        get_progress().advance(files=1, current=db_name)
+        self_username = self.client.get_real_wx_id()
+        table_name = source.table_name
+        start = self.max_local_id(conn, db_name, table_name)
+        logger.info(f"统计 {db_name}.{table_name}，起始 localId: {start}")
+        try:
+            with closing(sqlite3.connect(db_path)) as msg_conn:
+                max_local_id = msg_conn.execute(
+                    f"SELECT MAX(localId) FROM {table_name} WHERE localId > ?", (start,)
+                ).fetchone()[0]
+                if max_local_id is None:
+                    return
+                names = None
+                if source.names_table:
+                    names = dict(msg_conn.execute(f"SELECT rowid, UsrName FROM {source.names_table}"))
+                table_batch = StatsBatch()
+                cursor = msg_conn.execute(
+                    f"SELECT {source.talker_column}, {source.type_column}, IsSender, "
+                    f"{bucket_columns('CreateTime', offset)}, COUNT(*), MIN(CreateTime), MAX(CreateTime) "
+                    f"FROM {table_name} WHERE localId > ? AND localId <= ? GROUP BY 1, 2, 3, 4, 5",
+                    (start, max_local_id)
+                )
+                chatroom_talkers = set()
+                for talker_key, msg_type, is_sender, hour, day, count, first_time, last_time in cursor:
+                    talker = names.get(talker_key) if names is not None else talker_key
+                    if not talker:
+                        continue
+                    if is_sender == 1:
+                        sender = self_username
+                    elif talker.endswith("@chatroom"):
+                        chatroom_talkers.add(talker_key)
+                        sender = None
+                    else:
+                        sender = talker
+                    table_batch.add(talker, msg_type, sender, is_sender == 1, hour, day, count, first_time, last_time)
+                if chatroom_talkers:
+                    senders = Counter()
+                    if names is None:
+                        talker_filter = f"{source.talker_column} LIKE '%@chatroom'"
+                    else:
+                        talker_filter = f"{source.talker_column} IN ({', '.join(map(str, map(int, chatroom_talkers)))})"
+                    cursor = msg_conn.execute(
+                        f"SELECT {source.talker_column}, BytesExtra FROM {table_name} "
+                        f"WHERE localId > ? AND localId <= ? AND IsSender = 0 AND {talker_filter}",
+                        (start, max_local_id)
+                    )
+                    for talker_key, bytes_extra in cursor:
+                        sender = bytes_extra_sender(bytes_extra)
+                        if sender:
+                            senders[(talker_key, sender)] += 1
+                    for (talker_key, sender), count in senders.items():
+                        table_batch.add_sender(names.get(talker_key) if names is not None else talker_key,
+                                               sender, count)
+                batch.merge(table_batch)
+                self.set_max_local_id(conn, db_name, table_name, max_local_id)
+        except sqlite3.Error as e:
+            logger.warning(f"统计 {db_name} 失败: {e}")
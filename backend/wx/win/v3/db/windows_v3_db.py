@@ -2,6 +2,7 @@ import os
 import re
 from collections import defaultdict
 from contextlib import contextmanager
+from typing import Set
 
 from fastapi import HTTPException
 from sqlalchemy import create_engine
@@ -9,6 +10,7 @@ from sqlalchemy.orm import sessionmaker
 from starlette import status
 
 from config.log_config import get_context_logger, logger
+from wx.common.util.sql_trace import instrument_engine
 from wx.interface.wx_interface import ClientInterface, DBManager
 from wx.win.v3.enums.v3_enums import V3DBEnum
 
@@ -41,6 +43,19 @@ class WindowsV3DB(DBManager):
         self.session_local_dict.clear()
         self.engine_dict.clear()
 
+    def clear_dbs(self, db_names: Set[str]):
+        decoded_names = {f"{V3DBEnum.DECODED_DB_PREFIX}{name}" for name in db_names}
+        for db_path in [p for p in list(self.engine_dict) if os.path.basename(p) in decoded_names]:
+            get_context_logger().info(f"关闭连接： {db_path}")
+            engine = self.engine_dict.pop(db_path, None)
+            self.session_local_dict.pop(db_path, None)
+            if engine is None:
+                continue
+            try:
+                engine.dispose(close=True)
+            except Exception as e:
+                get_context_logger().warning(f"关闭 engine 失败: {e}")
+
     def clear_all(self):
         pass
 
@@ -66,6 +81,7 @@ class WindowsV3DB(DBManager):
                 pool_timeout=30,
                 pool_recycle=3600
             )
+            instrument_engine(engine, "win.v3", db_path)
             self.engine_dict[db_path] = engine
         return engine
 
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, Tuple
+
+from config.log_config import get_context_logger
+from wx.interface.wx_interface import ClientInterface
+from wx.win.v3.enums.v3_enums import V3DBEnum
+
+
+def md5_key(md5: str) -> bytes | None:
+    """32 位 md5 字符串转 16 字节二进制 key"""
+    try:
+        key = bytes.fromhex(md5[:32])
+    except (TypeError, ValueError):
+        return None
+    return key if len(key) == 16 else None
+
+
+class WindowsV3HardlinkIndex:
+    """
+    HardLinkImage.db 的内存缓存：文件名 md5(16 字节) -> (DirID1, DirID2, FileName)
+    目录名按 DirID 单独保存
+    """
+
+    def __init__(self, client: ClientInterface):
+        self.client = client
+        self.lock = threading.Lock()
+        self.image_index: Dict[bytes, Tuple[int, int, str]] | None = None
+        self.dir_names: Dict[int, str] = {}
+
+    def clear(self):
+        self.image_index = None
+        self.dir_names = {}
+
+    def load(self) -> bool:
+        """
+        加载 HardLinkImage 库到内存，库文件不存在时返回 False
+        """
+        logger = get_context_logger()
+        db_path = os.path.join(self.client.get_wx_dir(), V3DBEnum.DB_HARD_LINK_IMAGE)
+        if not os.path.exists(db_path):
+            logger.info(f"HardLinkImage 库不存在：{db_path}")
+            return False
+        with self.lock:
+            try:
+                with closing(sqlite3.connect(db_path)) as conn:
+                    dir_names = {dir_id: name for dir_id, name in conn.execute("SELECT DirID, Dir FROM HardLinkImageID")}
+                    image_index = {}
+                    for dir1, dir2, file_name in conn.execute(
+                            "SELECT DirID1, DirID2, FileName FROM HardLinkImageAttribute"):
+                        if not file_name:
+                            continue
+                        key = md5_key(file_name)
+                        if key is not None and key not in image_index:
+                            image_index[key] = (dir1, dir2, file_name)
+            except sqlite3.Error as e:
+                logger.warning(f"加载 HardLinkImage 索引失败: {e}")
+                return False
+            self.dir_names = dir_names
+            self.image_index = image_index
+        logger.info(f"HardLinkImage 索引加载完成，图片 {len(image_index)} 条")
+        return True
+
+    def ensure_loaded(self) -> bool:
+        if self.image_index is not None:
+            return True
+        return self.load()
+
+    def image(self, full_md5: str) -> Tuple[str, str, str] | None:
+        """
+        根据 full_md5 获取图片的两级目录名与文件名
+        """
+        key = md5_key(full_md5)
+        if key is None or self.image_index is None:
+            return None
+        value = self.image_index.get(key)
+        if value is None:
+            return None
+        dir1, dir2, file_name = value
+        return self.dir_names.get(dir1), self.dir_names.get(dir2), file_name
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+from contextlib import closing
+
+from app.services.task_progress import get_progress
+from config.log_config import get_context_logger
+from wx.common.util.msg_locator import MsgLocator
+from wx.interface.wx_interface import ClientInterface
+from wx.win.v3.enums.v3_enums import V3DBEnum
+
+
+class WindowsV3MsgLocator(MsgLocator):
+    """
+    微信3 MsgSvrID -> (MSG 分库, localId) 索引，同时索引 OpenIMMsg 库
+    """
+
+    def __init__(self, client: ClientInterface):
+        super().__init__(os.path.join(client.get_wx_dir(), V3DBEnum.MSG_LOCATOR_DB))
+        self.client = client
+
+    def build_index(self, conn: sqlite3.Connection) -> int:
+        logger = get_context_logger()
+        count = 0
+        for db_name in self.client.get_db_manager().multi_msg_db_array():
+            db_path = os.path.join(self.client.get_wx_dir(), V3DBEnum.DB_MULTI, db_name)
+            count += self.index_table(conn, db_path, db_name, 'MSG', 'localId', 'MsgSvrID')
+        openim_path = os.path.join(self.client.get_wx_dir(), V3DBEnum.DB_OPENIM_MSG)
+        if os.path.exists(openim_path):
+            count += self.index_table(conn, openim_path, V3DBEnum.OPENIM_MSG_DB_NAME, 'ChatCRMsg', 'localId',
+                                      'MsgSvrID')
+        logger.info(f"微信3 消息定位索引新增 {count} 条")
+        return count
+
+    def index_table(self, conn: sqlite3.Connection, db_path: str, db_name: str, table_name: str,
+                    local_id_column: str, server_id_column: str) -> int:
+        logger = get_context_logger()
+        get_progress().advance(files=1, current=db_name)
+        start = self.max_local_id(conn, db_name, table_name)
+        logger.info(f"索引 {db_name}.{table_name}，起始 localId: {start}")
+        try:
+            with closing(sqlite3.connect(db_path)) as msg_conn:
+                cursor = msg_conn.execute(
+                    f"SELECT {local_id_column}, {server_id_column} FROM {table_name} "
+                    f"WHERE {local_id_column} > ? ORDER BY {local_id_column}", (start,)
+                )
+                return self.save(conn, db_name, table_name, cursor)
+        except sqlite3.Error as e:
+            logger.warning(f"索引 {db_name} 失败: {e}")
+            return 0
@@ -7,8 +7,11 @@ from pathlib import Path
 
 from Crypto.Cipher import AES
 
+from app.helper import metrics_helper
 from app.models.sys import SysDecryptRecord
-from db.sys_db import SessionLocal
+from app.services.task_progress import get_progress
+from app.services.decrypt_record_service import record_decrypted
+from db.sys_db import SessionLocal, sys_db_writer
 from wx.interface.wx_interface import Decryptor, ClientInterface
 
 from config.log_config import get_context_logger
@@ -20,6 +23,8 @@ HMAC_SHA1_SIZE = 20
 KEY_SIZE = 32
 DEFAULT_PAGESIZE = 4096
 DEFAULT_ITER = 64000
+# 每解密多少页上报一次进度
+PROGRESS_PAGES = 1024
 
 patterns = [
     r'^MicroMsg.db$',
@@ -53,18 +58,25 @@ check_file_list = [
 
 compiled_patterns = [re.compile(pattern) for pattern in patterns]
 
+decrypt_seconds = metrics_helper.histogram("cloudbak_decrypt_file_duration_seconds", "单个数据库文件解密耗时",
+                                           ("client",))
+decrypt_bytes = metrics_helper.counter("cloudbak_decrypt_bytes_total", "已解密数据库字节数", ("client",))
+decrypt_files = metrics_helper.counter("cloudbak_decrypt_files_total", "数据库文件解密次数", ("client", "result"))
 
-def decode_one(input_file, password):
+
+def decode_one(input_file, password, output_file=None):
     """
     解码数据库文件，优化为流式处理以支持大文件
     :param input_file: 输入文件路径
     :param password: 解密密码
+    :param output_file: 输出文件路径，默认为同目录下 decoded_ 前缀的文件
     :return: 解密是否成功
     """
     logger = get_context_logger()
     logger.info('decryption file: %s', input_file)
     input_file = Path(input_file)
-    output_file = input_file.parent / f'decoded_{input_file.name}'
+    if output_file is None:
+        output_file = input_file.parent / f'decoded_{input_file.name}'
 
     try:
         with open(input_file, 'rb') as f_in, open(output_file, 'wb') as f_out:
@@ -93,6 +105,9 @@ def decode_one(input_file, password):
                 return False
 
             logger.info('decryption success, processing file')
+            progress = get_progress()
+            progress.advance(bytes_done=DEFAULT_PAGESIZE, pages=1)
+            pages = 0
 
             # 写入SQLite文件头
             f_out.write(SQLITE_FILE_HEADER)
@@ -113,6 +128,7 @@ def decode_one(input_file, password):
                     logger.info('last chunk incomplete, padding or truncating as needed')
                     # 如果最后一个块不足页面大小，直接写入（通常不需要填充）
                     f_out.write(chunk)
+                    progress.advance(bytes_done=len(chunk))
                     break
 
                 iv = chunk[-48:-32]  # 提取IV
@@ -120,6 +136,11 @@ def decode_one(input_file, password):
                 decrypted = cipher.decrypt(chunk[:-48])  # 解密主体部分
                 f_out.write(decrypted)
                 f_out.write(chunk[-48:])  # 写入未加密的尾部
+                pages += 1
+                if pages == PROGRESS_PAGES:
+                    progress.advance(bytes_done=pages * DEFAULT_PAGESIZE, pages=pages)
+                    pages = 0
+            progress.advance(bytes_done=pages * DEFAULT_PAGESIZE, pages=pages)
 
         return True
 
@@ -139,10 +160,10 @@ class WindowsV3Decryptor(Decryptor):
         logger = get_context_logger()
         logger.info("执行数据库解密任务，版本 win.v3")
         if deep:
-            logger.info("全量解析，先删除 decoded_ 前缀的库文件")
-            self.clear_decoded_files()
+            # 不先删除解密文件，逐个重新解密后替换，解析期间浏览不受影响
+            logger.info("全量解析，重新解密全部库文件")
         with SessionLocal() as db:
-            self.decode_msg(db)
+            self.decode_msg(db, deep)
 
     def clear_decoded_files(self):
         logger = get_context_logger()
@@ -156,48 +177,77 @@ class WindowsV3Decryptor(Decryptor):
                     logger.info(f"删除文件：{file}")
                     os.remove(file)
 
-    def decode_msg(self, db):
+    def decode_msg(self, db, force: bool = False):
         logger = get_context_logger()
         wx_dir = self.client.get_wx_dir()
-        sys_session = self.client.get_sys_session()
         # 2. 数据库解密
         logger.info("数据库解密")
-        # 生成password
-        password = bytes.fromhex(sys_session.wx_key.replace(' ', ''))
-        logger.info(f"password: {password}")
         # Msg 路径
         msg_dir = os.path.join(wx_dir, 'Msg')
         logger.info(f"msg_dir: {msg_dir}")
         # 遍历
+        db_files = []
         for dirpath, dirnames, filenames in os.walk(msg_dir):
             for filename in filenames:
-                logger.info(f"filename: {filename}")
-                for pattern in compiled_patterns:
-                    if pattern.match(filename):
-                        logger.info("match, do decrypt")
-                        db_file = os.path.join(dirpath, filename)
-                        # 检查文件的修改时间与数据库中的修改时间
-                        modification_time = os.path.getmtime(db_file)
-                        record = db.query(SysDecryptRecord).filter_by(db_file=filename,
-                                                                      session_id=sys_session.id).first()
-                        # decoded_文件存在且时间戳相同，则跳过
-                        if record is not None and record.file_last_ts == modification_time:
-                            logger.info(f"file {filename} no modify")
-                            decoded_file = os.path.join(dirpath, f"decoded_{filename}")
-                            if os.path.exists(decoded_file):
-                                continue
-                            else:
-                                logger.info(f"file decoded_{filename} not exists")
-                        # 解密，解密的文件为原文件名加 decoded_ 前缀
-                        is_success = decode_one(db_file, password)
-                        if is_success:
-                            logger.info("record file modification_time")
-                            if record is None:
-                                record = SysDecryptRecord(db_file=filename, file_last_ts=modification_time,
-                                                          session_id=sys_session.id)
-                                db.add(record)
-                                db.commit()
-                            else:
-                                record.file_last_ts = modification_time
-                                db.commit()
+                logger.debug("filename: %s", filename)
+                if is_db_file(filename):
+                    db_files.append(os.path.join(dirpath, filename))
+        progress = get_progress()
+        progress.stage("decrypt", len(db_files), sum(os.path.getsize(f) for f in db_files))
+        for db_file in db_files:
+            logger.info("match, do decrypt: %s", db_file)
+            # 解密过程中按页上报字节数，跳过的文件在此计入
+            if not self.decrypt_one(db, db_file, force):
+                progress.advance(bytes_done=os.path.getsize(db_file))
+            progress.advance(files=1, current=os.path.basename(db_file))
+        # 解密记录由写线程提交，结束前确认全部写入
+        sys_db_writer.flush()
+
+    def decrypt_file(self, db_file: str) -> bool:
+        if not is_db_file(os.path.basename(db_file)):
+            return False
+        with SessionLocal() as db:
+            return self.decrypt_one(db, db_file)
+
+    def decrypt_one(self, db, db_file: str, force: bool = False) -> bool:
+        """
+        解密单个库文件并记录修改时间
+        :param force: 忽略修改时间记录，强制重新解密
+        :return: 是否产生了新的解密文件
+        """
+        logger = get_context_logger()
+        sys_session = self.client.get_sys_session()
+        # 生成password
+        password = bytes.fromhex(sys_session.wx_key.replace(' ', ''))
+        dirpath, filename = os.path.split(db_file)
+        decoded_file = os.path.join(dirpath, f"decoded_{filename}")
+        # 检查文件的修改时间与数据库中的修改时间
+        modification_time = os.path.getmtime(db_file)
+        record = db.query(SysDecryptRecord).filter_by(db_file=filename,
+                                                      session_id=sys_session.id).first()
+        # decoded_文件存在且时间戳相同，则跳过
+        if not force and record is not None and record.file_last_ts == modification_time:
+            logger.info("file %s no modify", filename)
+            if os.path.exists(decoded_file):
+                return False
+            else:
+                logger.info("file decoded_%s not exists", filename)
+        # 解密，解密的文件为原文件名加 decoded_ 前缀
+        # 先写临时文件再替换，已打开的连接仍读取旧文件
+        tmp_file = f"{decoded_file}.tmp"
+        with decrypt_seconds.time(client="win.v3"):
+            is_success = decode_one(db_file, password, tmp_file)
+        decrypt_files.inc(client="win.v3", result="success" if is_success else "fail")
+        if not is_success:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return False
+        os.replace(tmp_file, decoded_file)
+        decrypt_bytes.inc(os.path.getsize(db_file), client="win.v3")
+        logger.info("record file modification_time")
+        record_decrypted(sys_session.id, filename, modification_time)
+        return True
+
 
+def is_db_file(filename: str) -> bool:
+    return any(pattern.match(filename) for pattern in compiled_patterns)
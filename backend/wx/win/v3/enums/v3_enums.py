@@ -16,3 +16,11 @@ class V3DBEnum(StrEnum):
     DECODED_DB_PREFIX = 'decoded_'
     # 存放MEDIA解密数据
     DECODED_MEDIA_PATH = 'decoded_Media'
+    # 消息定位索引库
+    MSG_LOCATOR_DB = 'Msg/cloudbak_msg_locator.db'
+    # 会话统计库
+    CHAT_STATS_DB = 'Msg/cloudbak_chat_stats.db'
+    # openim 消息库在定位索引中的库名
+    OPENIM_MSG_DB_NAME = 'decoded_OpenIMMsg.db'
+    # 公众号消息库在会话统计中的库名
+    PUBLIC_MSG_DB_NAME = 'decoded_PublicMsg.db'
@@ -1,5 +1,6 @@
 import os
 from abc import ABC
+from typing import Set
 
 from app.models.sys import SysSession, SysSessionExtra
 from wx.common.output.session import CheckResult
@@ -13,10 +14,12 @@ from wx.win.v3.data.fts_data import FTSManagerWindowsV3
 from wx.win.v3.data.message_data import MessageManagerWindowsV3
 from wx.win.v3.data.resource_data import WindowsV3ResourceManager
 from wx.win.v3.data.session_data import SessionManagerWindowsV3
+from wx.win.v3.db.windows_v3_chat_stats import WindowsV3ChatStats
 from wx.win.v3.db.windows_v3_db import WindowsV3DB
 from config.log_config import logger
 from wx.win.v3.db.windows_v3_db_order import WindowsV3DBOrder
 from wx.win.v3.db.windows_v3_db_taker_id import WindowsV3TakerId
+from wx.win.v3.db.windows_v3_msg_locator import WindowsV3MsgLocator
 from wx.win.v3.decryptor.windows_v3_decryptor import WindowsV3Decryptor, check_file_list
 
 
@@ -33,11 +36,13 @@ class WindowsClientV3(ClientInterface, ABC):
         self.db_order = WindowsV3DBOrder(self.db_manager)
         self.decryptor = WindowsV3Decryptor(self)
         self.taker_id_manager = WindowsV3TakerId(self.db_manager)
+        self.msg_locator = WindowsV3MsgLocator(self)
+        self.chat_stats = WindowsV3ChatStats(self)
         self.contact_manager = ContactManagerWindowsV3(self.db_manager)
         self.session_manager = SessionManagerWindowsV3(self.db_manager)
         self.message_manager = MessageManagerWindowsV3(self)
         self.fts_manager = FTSManagerWindowsV3(self.db_manager, self.db_order, self)
-        self.chat_room_manager = WindowsV3ChatRoomManager(self.db_manager)
+        self.chat_room_manager = WindowsV3ChatRoomManager(self.db_manager, self.contact_manager)
         self.resource_manager = WindowsV3ResourceManager(self)
 
     def get_real_wx_id(self):
@@ -68,12 +73,43 @@ class WindowsClientV3(ClientInterface, ABC):
         self.taker_id_manager.clear()
         self.fts_manager.clear()
         self.contact_manager.clear()
+        self.chat_room_manager.clear()
+        self.resource_manager.clear()
+
+    def clear_dbs(self, db_names: Set[str]):
+        logger.info(f"{self.name} execute clear dbs method: {db_names}")
+        self.db_manager.clear_dbs(db_names)
+        if any(name.startswith(("MSG", "MediaMSG", "FTSMSG")) for name in db_names):
+            # 分库排序与 talkerId 映射来自消息分库
+            self.db_order.clear()
+            self.taker_id_manager.clear()
+        if any(name.startswith("FTS") for name in db_names):
+            self.fts_manager.clear()
+        if db_names & {"MicroMsg.db", "OpenIMContact.db"}:
+            self.contact_manager.clear()
+            self.chat_room_manager.clear()
+        if any(name.startswith("HardLink") for name in db_names):
+            self.resource_manager.clear()
 
     def decrypt_db(self):
         logger.info(f"{self.name} decrypt db method")
         self.db_manager.clear()
         self.decryptor.decrypt()
 
+    def build_indexes(self, deep: bool = False):
+        logger.info(f"{self.name} build indexes method")
+        self.msg_locator.build(deep)
+        self.resource_manager.hardlink_index.load()
+
+    def build_stats(self, deep: bool = False):
+        self.chat_stats.build(deep)
+
+    def get_msg_locator(self) -> WindowsV3MsgLocator:
+        return self.msg_locator
+
+    def get_chat_stats(self) -> WindowsV3ChatStats:
+        return self.chat_stats
+
     def get_db_order_manager(self):
         return self.db_order
 
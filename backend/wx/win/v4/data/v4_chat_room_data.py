@@ -2,19 +2,34 @@ import subprocess
 
 from sqlalchemy import select
 
+from config.data_config import settings as data_settings
 from config.log_config import logger
 from wx.common.output.chat_room import ChatRoomInfo, ChatRoomMember
+from wx.common.util.contact_directory import ContactRow
+from wx.common.util.roster_cache import RosterCache
 from wx.interface.wx_interface import ChatRoomManager
+from wx.win.v4.data.v4_contact_data import ContactManagerWindowsV4
 from wx.win.v4.db.windows_v4_db import WindowsV4DB
 from wx.win.v4.enums.v4_enums import V4DBEnum
 from wx.win.v4.models.contact import ChatRoomModelV4, ChatRoomMemberModelV4, ContactModelV4
 
 
 class WindowsV4ChatRoomManager(ChatRoomManager):
-    def __init__(self, db_manager: WindowsV4DB):
+    def __init__(self, db_manager: WindowsV4DB, contact_manager: ContactManagerWindowsV4):
         self.db_manager = db_manager
+        self.contact_manager = contact_manager
+        self.rosters = RosterCache(data_settings.chatroom_roster_cache_size)
+
+    def clear(self):
+        self.rosters.clear()
+
+    def lookup_contact(self, username: str) -> ContactRow | None:
+        return self.contact_manager.directory.get(username)
 
     def chatroom_info(self, username: str) -> ChatRoomInfo:
+        info = self.rosters.get(username)
+        if info is not None:
+            return info
         sm = self.db_manager.wx_db(V4DBEnum.CONTACT_DB_PATH)
         stmt = (
             select(ChatRoomModelV4, ChatRoomMemberModelV4, ContactModelV4)
@@ -22,18 +37,20 @@ class WindowsV4ChatRoomManager(ChatRoomManager):
             .join(ContactModelV4, ContactModelV4.id == ChatRoomMemberModelV4.member_id, isouter=True)
             .where(ChatRoomModelV4.username.is_(username))
         )
-        logger.info(f"sql: {stmt}")
-        logger.info(f"params: {username}")
+        logger.debug("chatroom_info sql: %s, params: %s", stmt, username)
         with sm() as db:
             results = db.execute(stmt).fetchall()
-            return ChatRoomInfo(
+            info = ChatRoomInfo(
                 username=username,
                 members=[
                     ChatRoomMember(
                         username=row[2].username,
                         nickname=row[2].nick_name,
                         remark=row[2].remark,
+                        display_name=row[2].remark or row[2].nick_name,
                         small_head_img=row[2].small_head_url
-                    ) for row in results
+                    ) for row in results if row[2] is not None
                 ]
             )
+        self.rosters.put(username, info)
+        return info
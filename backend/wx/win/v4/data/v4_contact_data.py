@@ -1,10 +1,11 @@
 from collections import defaultdict
 from typing import List
 
-from sqlalchemy import select, or_
+from sqlalchemy import select
 
 from wx.common.enum.contact_type import ContactType
 from wx.common.filters.contact_filter import ContactFilterObj
+from wx.common.util.contact_directory import ContactDirectory, ContactRow, to_contact, page
 from wx.common.output.contact import Contact, ContactSearchOut
 
 from wx.interface.wx_interface import ContactManager, ClientInterface
@@ -19,107 +20,74 @@ class ContactManagerWindowsV4(ContactManager):
     def __init__(self, client: ClientInterface):
         self.client = client
         self.contact_type_dict = defaultdict(lambda: None)
+        self.directory = ContactDirectory(self.load_directory)
 
     def clear(self):
         self.contact_type_dict.clear()
+        self.directory.clear()
 
-    def contacts(self, filter_obj: ContactFilterObj = None) -> List[Contact]:
-        stmt = (select(ContactModelV4).order_by(ContactModelV4.nick_name.asc()))
-        if filter_obj is not None:
-            stmt = stmt.limit(filter_obj.size).offset((filter_obj.page - 1)*filter_obj.size)
-            if filter_obj.contact_type:
-                if filter_obj.contact_type == ContactType.CHATROOM:
-                    stmt = stmt.where(ContactModelV4.local_type.is_(2))
-                else:
-                    stmt = stmt.where(ContactModelV4.local_type.is_(1))
-            if filter_obj.search and filter_obj.search != "":
-                stmt = stmt.where(
-                    or_(ContactModelV4.nick_name.like(f"%{filter_obj.search}%"), ContactModelV4.remark.like(f"%{filter_obj.search}%"))
-                )
+    def load_directory(self) -> List[ContactRow]:
+        """
+        联系人目录数据：contact.db 全部联系人
+        """
+        stmt = select(
+            ContactModelV4.username,
+            ContactModelV4.local_type,
+            ContactModelV4.alias,
+            ContactModelV4.remark,
+            ContactModelV4.remark_quan_pin,
+            ContactModelV4.remark_pin_yin_initial,
+            ContactModelV4.nick_name,
+            ContactModelV4.quan_pin,
+            ContactModelV4.pin_yin_initial,
+            ContactModelV4.small_head_url
+        )
         sm = self.client.get_db_manager().wx_db(V4DBEnum.CONTACT_DB_PATH)
         with sm() as db:
-            results = db.execute(stmt).scalars().fetchall()
             return [
-                Contact(
+                ContactRow(
                     username=contact.username,
+                    type=contact.local_type if contact.local_type is not None else 0,
                     alias=contact.alias,
                     remark=contact.remark,
                     remark_quanpin=contact.remark_quan_pin,
+                    remark_quanpin_initial=contact.remark_pin_yin_initial,
                     nickname=contact.nick_name,
                     nickname_quanpin=contact.quan_pin,
                     nickname_quanpin_initial=contact.pin_yin_initial,
                     small_head_url=contact.small_head_url
                 )
-                for contact in results
+                for contact in db.execute(stmt).fetchall()
             ]
 
-    def contacts_search(self, filter_obj: ContactFilterObj = ContactFilterObj) -> ContactSearchOut:
-        stmt = (select(ContactModelV4).order_by(ContactModelV4.nick_name.asc()))
-        stmt = stmt.limit(filter_obj.size).offset((filter_obj.page - 1) * filter_obj.size)
+    def query_directory(self, filter_obj: ContactFilterObj) -> List[Contact]:
+        type_filter = None
         if filter_obj.contact_type:
-            if filter_obj.contact_type == ContactType.CHATROOM:
-                stmt = stmt.where(ContactModelV4.local_type.is_(2))
-            else:
-                stmt = stmt.where(ContactModelV4.local_type.is_(1))
-        if filter_obj.search and filter_obj.search != "":
-            stmt = stmt.where(
-                or_(ContactModelV4.nick_name.like(f"%{filter_obj.search}%"),
-                    ContactModelV4.remark.like(f"%{filter_obj.search}%"))
-            )
-        sm = self.client.get_db_manager().wx_db(V4DBEnum.CONTACT_DB_PATH)
-        with sm() as db:
-            results = db.execute(stmt).scalars().fetchall()
-            return [
-                Contact(
-                    username=contact.username,
-                    alias=contact.alias,
-                    remark=contact.remark,
-                    remark_quanpin=contact.remark_quan_pin,
-                    nickname=contact.nick_name,
-                    nickname_quanpin=contact.quan_pin,
-                    nickname_quanpin_initial=contact.pin_yin_initial,
-                    small_head_url=contact.small_head_url
-                )
-                for contact in results
-            ]
+            local_type = 2 if filter_obj.contact_type == ContactType.CHATROOM else 1
+            type_filter = lambda t: t == local_type
+        rows = self.directory.query(filter_obj.search, type_filter=type_filter)
+        return [to_contact(row) for row in page(rows, filter_obj.page, filter_obj.size)]
+
+    def contacts(self, filter_obj: ContactFilterObj = None) -> List[Contact]:
+        if filter_obj is None:
+            return [to_contact(row) for row in self.directory.query()]
+        return self.query_directory(filter_obj)
+
+    def contacts_search(self, filter_obj: ContactFilterObj = ContactFilterObj) -> ContactSearchOut:
+        return self.query_directory(filter_obj)
 
     def contact_type(self, username: str) -> ContactType:
         pass
 
     def base_contacts(self) -> List[Contact]:
-        stmt = (
-            select(
-                ContactModelV4.username,
-                ContactModelV4.alias,
-                ContactModelV4.remark,
-                ContactModelV4.remark_quan_pin,
-                ContactModelV4.nick_name,
-                ContactModelV4.quan_pin,
-                ContactModelV4.pin_yin_initial,
-                ContactModelV4.small_head_url
-            )
-            .where(ContactModelV4.local_type.is_not(3))  # 3 为陌生人
-            .order_by(ContactModelV4.nick_name.asc())
-        )
-        logger.info(f"sql: {stmt}")
-        sm = self.client.get_db_manager().wx_db(V4DBEnum.CONTACT_DB_PATH)
-        with sm() as db:
-            results = db.execute(stmt).fetchall()
-            contacts = []
-            for contact in results:
-                try:
-                    contacts.append(
-                        Contact(
-                            username=contact.username,
-                            alias=contact.alias,
-                            remark=contact.remark,
-                            remark_quanpin=contact.remark_quan_pin,
-                            nickname=contact.nick_name,
-                            nickname_quanpin=contact.quan_pin,
-                            nickname_quanpin_initial=contact.pin_yin_initial,
-                            small_head_url=contact.small_head_url.encode("latin1").decode("utf-8", "ignore")
-                        )
-                    )
-                except UnicodeDecodeError:
-                    logger.warning(f"Skipping contact {contact.username} due to encoding issue")
-            return contacts
+        contacts = []
+        # 3 为陌生人
+        for row in self.directory.query(type_filter=lambda t: t != 3):
+            try:
+                small_head_url = row.small_head_url.encode("latin1").decode("utf-8", "ignore") \
+                    if row.small_head_url else row.small_head_url
+            except UnicodeError:
+                logger.warning(f"Skipping contact {row.username} due to encoding issue")
+                continue
+            contacts.append(to_contact(row._replace(small_head_url=small_head_url)))
+        return contacts
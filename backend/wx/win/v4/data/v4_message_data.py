@@ -3,6 +3,7 @@ import datetime
 import hashlib
 
 import os
+from typing import List
 
 from sqlalchemy import inspect, select, func, literal_column
 
@@ -207,7 +208,9 @@ class MessageManagerWindowsV4(MessageManager):
                 else:
                     offset = 0
             logger.info(db_name)
-        return MsgSearchOut(start=offset, start_db=current_db, messages=msgs)
+        out = MsgSearchOut(start=offset, start_db=current_db, messages=msgs)
+        # 附加发送者显示名称、头像
+        return self.client.get_chat_room_manager().enrich_senders(filter_obj.username, out)
 
     def message(self, filter_obj: SingleMsgFilterObj) -> Msg | None:
         # 获取动态表
@@ -218,37 +221,50 @@ class MessageManagerWindowsV4(MessageManager):
 
         # 如果未显式传入 db_name，尝试基于 server_id 先定位所在库
         target_db = filter_obj.db_name
-        target_msg = None
         server_id = filter_obj.server_sequence or filter_obj.v3_msg_svr_id
+        local_id = filter_obj.local_id
+
+        if not target_db and server_id:
+            located = self.client.get_msg_locator().locate(server_id)
+            if located and located[1] == table_name and located[0] in self.get_message_db_name_array():
+                logger.info(f"定位索引命中：{located[0]}, local_id={located[2]}")
+                msg = self.message_in_dbs(filter_obj.username, message_model, [located[0]], located[2], server_id)
+                if msg:
+                    return msg
+                # 索引已过期（库重新解析或重新编号），回退到遍历所有库
+                logger.info("定位索引所指库中未找到消息，遍历所有库")
+
+        if target_db:
+            db_arrays = [target_db]
+        else:
+            db_arrays = self.get_table_name_db_list(filter_obj.username, table_name)
+        return self.message_in_dbs(filter_obj.username, message_model, db_arrays, local_id, server_id)
 
-        db_arrays = self.get_table_name_db_list(filter_obj.username, table_name)
-
+    def message_in_dbs(self, username: str, message_model, db_arrays: List[str], local_id: int | None,
+                       server_id: int | None) -> Msg | None:
+        """
+        依次在给定库中按 local_id、server_id 查询单条消息
+        """
         name2id_subquery = (
             select(
                 literal_column("Name2Id.rowid").label("row_num"),
                 Name2Id.user_name
             ).subquery("b")
         )
+        # 创建动态条件列表
+        conditions = []
+        if local_id is not None:
+            conditions.append(message_model.local_id == local_id)
+        if server_id is not None:
+            conditions.append(message_model.server_id == server_id)
         stmt = (
             select(message_model, name2id_subquery)
             .join(name2id_subquery, message_model.real_sender_id == name2id_subquery.c.row_num, isouter=True)
+            .where(*conditions)
         )
         for db_name in db_arrays:
-            if target_db and db_name != target_db:
-                continue
             sm = self.get_message_session_maker_by_db_name(db_name)
             with sm() as db:
-
-                # 创建动态条件列表
-                conditions = []
-                if filter_obj.local_id is not None:
-                    conditions.append(message_model.local_id == filter_obj.local_id)
-                if server_id is not None:
-                    conditions.append(message_model.server_id == server_id)
-                # 一次性应用条件
-                if conditions:
-                    stmt = stmt.where(*conditions)
-
                 row = db.execute(stmt).first()
                 if row:
                     logger.info(f"msg is : {row}")
@@ -260,16 +276,9 @@ class MessageManagerWindowsV4(MessageManager):
                     msg.message_content_data = ZstandardUtils.convert_zstandard(m.message_content)
                     msg.source_data = ZstandardUtils.convert_zstandard(m.source)
                     msg.compress_content_data = ZstandardUtils.convert_zstandard(m.compress_content)
-                    self._append_media_info(filter_obj.username, msg, m.packed_info_data, msg.message_content_data)
+                    self._append_media_info(username, msg, m.packed_info_data, msg.message_content_data)
 
                     return Msg(windows_v4_properties=msg)
-
-        if target_msg is None:
-            logger.info("未找到匹配消息，无法写出 packed_info_data")
-            return None
-
-        with open('d:/packed_info_data', 'wb') as f:
-            f.write(target_msg.packed_info_data)
         return None
 
     def _append_media_info(self, talker_username, msg: WindowsV4Properties, packed_bytes: bytes, content_xml: str):
@@ -6,8 +6,12 @@ import sqlite3
 from datetime import datetime
 from sqlalchemy import select, func
 
-from config.log_config import logger
+from config.app_config import settings as app_settings
+from config.log_config import logger, get_context_logger
+from test.v4_image import decrypt_wechat_dat_bytes
+from wx.common.util.thumbnail_store import ThumbnailStore
 from wx.interface.wx_interface import ResourceManager, ClientInterface
+from wx.win.v4.db.windows_v4_hardlink_index import WindowsV4HardlinkIndex
 from wx.win.v4.enums.v4_enums import V4DBEnum
 from wx.win.v4.models.hardlink import Dir2IdModel, Dir2IdModel, VideoHardlinkInfoModelV3, VideoHardlinkInfoModelV4, ImageHardlinkInfoModelV3, ImageHardlinkInfoModelV4
 from wx.win.v4.models.head_image import HeadImageModel
@@ -18,6 +22,75 @@ class WindowsV4ResourceManager(ResourceManager):
 
     def __init__(self, client: ClientInterface):
         self.client = client
+        self.hardlink_index = WindowsV4HardlinkIndex(client)
+        self.thumbnail_store = ThumbnailStore(
+            client.get_session_dir(),
+            os.path.join(client.get_session_dir(), app_settings.thumb_dir),
+            decrypt_wechat_dat_bytes
+        )
+
+    def clear(self):
+        self.hardlink_index.clear()
+
+    def get_image_thumbnail(self, relative_path: str, size: int | None = None) -> str | None:
+        """
+        获取图片缩略图路径，未生成时即时生成
+        :param relative_path: 图片 .dat 相对会话目录的路径
+        :param size: 期望的最长边像素，归到最接近的档位
+        """
+        relative_path = relative_path.replace("\\", "/")
+        # 解析时同一图片只为 _t.dat 生成缩略图，原图路径先尝试复用；
+        # _t.dat 分辨率有限，只用于最小档位，更大档位由原图即时生成
+        stem, ext = os.path.splitext(relative_path)
+        store = self.thumbnail_store
+        if ext == '.dat' and not stem.endswith('_t') and store.pick_size(size) == store.sizes[0]:
+            base = stem[:-2] if stem.endswith(('_h', '_W')) else stem
+            path = self.thumbnail_store.lookup(f"{base}_t.dat", size)
+            if path:
+                return path
+        return self.thumbnail_store.get(relative_path, size)
+
+    def index_attachment(self, file_path: str) -> bool:
+        """
+        聊天图片到达后立即生成缩略图，同一图片已有 _t.dat 的缩略图时跳过原图
+        """
+        if os.path.basename(os.path.dirname(file_path)) != 'Img' or not file_path.endswith('.dat'):
+            return False
+        relative_path = os.path.relpath(file_path, self.client.get_session_dir()).replace("\\", "/")
+        stem = relative_path[:-4]
+        if not stem.endswith('_t'):
+            base = stem[:-2] if stem.endswith(('_h', '_W')) else stem
+            if self.thumbnail_store.lookup(f"{base}_t.dat"):
+                return False
+        return self.thumbnail_store.generate(relative_path) is not None
+
+    def build_thumbnails(self, deep: bool = False):
+        """
+        批量生成聊天图片缩略图，同一图片优先使用 _t.dat，没有时使用原图
+        由 _t.dat 生成的各档位不超过其分辨率，原图请求更大档位时另行由原图生成
+        """
+        logger = get_context_logger()
+        attach_dir = os.path.join(self.client.get_wx_dir(), 'msg', 'attach')
+        if not os.path.exists(attach_dir):
+            logger.info(f"图片目录不存在：{attach_dir}")
+            return
+        session_dir = self.client.get_session_dir()
+        sources = {}
+        for root, _, files in os.walk(attach_dir):
+            if os.path.basename(root) != 'Img':
+                continue
+            for file_name in files:
+                if not file_name.endswith('.dat'):
+                    continue
+                stem = file_name[:-4]
+                if stem.endswith(('_t', '_h', '_W')):
+                    stem = stem[:-2]
+                key = os.path.join(root, stem)
+                # _t.dat 最小，解码最快
+                if key not in sources or file_name.endswith('_t.dat'):
+                    sources[key] = os.path.relpath(os.path.join(root, file_name), session_dir).replace("\\", "/")
+        logger.info(f"扫描到聊天图片 {len(sources)} 张")
+        self.thumbnail_store.build(sources.values(), deep)
 
     def windows_v3_image_from_full_md5(self, full_md5: str, prev: str = 'Thumb'):
         pass
@@ -75,44 +148,18 @@ class WindowsV4ResourceManager(ResourceManager):
     def get_video_poster(self, md5: str, msg_create_time: int) -> str | None:
         # 优先从表中获取
         logger.info("从hardlink表中获取视频封面")
-        sm = self.client.get_db_manager().wx_db(V4DBEnum.HARDLINK_DB_PATH)
-        dir2id_subquery = (
-            select(
-                func.row_number().over(order_by=None).label("row_num"),
-                Dir2IdModel.username
-            ).subquery("b")
-        )
-
-        # 获取表版本
-        table_version = self._get_table_version()
-        logger.info(f"当前hardlink库版本: {table_version}")
-        # 根据版本选择对应的模型
-        if table_version == 4:
-            VideoModel = VideoHardlinkInfoModelV4
-        else:
-            VideoModel = VideoHardlinkInfoModelV3
-
-        stmt = (
-            select(VideoModel, dir2id_subquery)
-            .join(dir2id_subquery, VideoModel.dir1 == dir2id_subquery.c.row_num, isouter=True)
-            .where(VideoModel.md5.is_(md5))
-        )
-        with sm() as db:
-            row = db.execute(stmt).first()
-            if row:
-                logger.info(f"hardlink data: {row}")
-                hardlink = row[0]
-                # row_num = row[1]
-                dir_name = row[2]
-                name, ext = hardlink.file_name.rsplit('.', 1)
-                poster_abs_path = f"{self.client.get_wx_dir()}/msg/video/{dir_name}/{name}.jpg"
-                if os.path.exists(poster_abs_path):
-                    logger.info(f"poster_abs_path: {poster_abs_path} 不存在")
-                    return poster_abs_path
-                poster_abs_path = f"{self.client.get_wx_dir()}/msg/video/{dir_name}/{name}_thumb.jpg"
-                if os.path.exists(poster_abs_path):
-                    logger.info(f"poster_abs_path: {poster_abs_path} 不存在")
-                    return poster_abs_path
+        hardlink = self._video_hardlink(md5)
+        if hardlink:
+            dir_name, file_name = hardlink
+            name, ext = file_name.rsplit('.', 1)
+            poster_abs_path = f"{self.client.get_wx_dir()}/msg/video/{dir_name}/{name}.jpg"
+            if os.path.exists(poster_abs_path):
+                logger.info(f"poster_abs_path: {poster_abs_path} 存在")
+                return poster_abs_path
+            poster_abs_path = f"{self.client.get_wx_dir()}/msg/video/{dir_name}/{name}_thumb.jpg"
+            if os.path.exists(poster_abs_path):
+                logger.info(f"poster_abs_path: {poster_abs_path} 存在")
+                return poster_abs_path
         logger.info("hardlink表中未找到视频封面")
         # 规则为，优先获取清晰封面图
         # msg/video/月份/{md5}.jpg
@@ -137,6 +184,33 @@ class WindowsV4ResourceManager(ResourceManager):
 
     def get_video(self, md5: str, msg_create_time: int) -> str | None:
         # 优先从表中获取
+        hardlink = self._video_hardlink(md5)
+        if hardlink:
+            dir_name, file_name = hardlink
+            return f"{self.client.get_wx_dir()}/msg/video/{dir_name}/{file_name}"
+        logger.info("hardlink表中未找到视频")
+        # 规则为，msg/video/月份/{md5}.mp4
+        month = datetime.fromtimestamp(msg_create_time).strftime('%Y-%m')
+        folder = os.path.join(self.client.get_wx_dir(), 'msg', 'video', month)
+        video_name = f"{md5}.mp4"
+        video_abs_path = os.path.join(folder, video_name)
+        logger.info(f"video_abs_path: {video_abs_path}")
+        if os.path.exists(video_abs_path):
+            logger.info(f"video_abs_path: {video_abs_path} 存在")
+            return video_abs_path
+        logger.info("规则路径中未找到视频")
+        return None
+
+    def get_member_head(self, username: str) -> bytearray:
+        pass
+
+    def _video_hardlink(self, md5: str):
+        """
+        根据 md5 获取视频所在目录名与文件名
+        hardlink 库已加载到内存时直接查内存索引，否则查询 hardlink 库
+        """
+        if self.hardlink_index.ensure_loaded():
+            return self.hardlink_index.video(md5)
         # 获取表版本
         table_version = self._get_table_version()
         logger.info(f"当前hardlink库版本: {table_version}")
@@ -162,26 +236,9 @@ class WindowsV4ResourceManager(ResourceManager):
             row = db.execute(stmt).first()
             if row:
                 logger.info(f"hardlink data: {row}")
-                hardlink = row[0]
-                # row_num = row[1]
-                dir_name = row[2]
-                return f"{self.client.get_wx_dir()}/msg/video/{dir_name}/{hardlink.file_name}"
-        logger.info("hardlink表中未找到视频")
-        # 规则为，msg/video/月份/{md5}.mp4
-        month = datetime.fromtimestamp(msg_create_time).strftime('%Y-%m')
-        folder = os.path.join(self.client.get_wx_dir(), 'msg', 'video', month)
-        video_name = f"{md5}.mp4"
-        video_abs_path = os.path.join(folder, video_name)
-        logger.info(f"video_abs_path: {video_abs_path}")
-        if os.path.exists(video_abs_path):
-            logger.info(f"video_abs_path: {video_abs_path} 存在")
-            return video_abs_path
-        logger.info("规则路径中未找到视频")
+                return row[2], row[0].file_name
         return None
 
-    def get_member_head(self, username: str) -> bytearray:
-        pass
-
     def _media_db_paths(self):
         message_dir = os.path.join(self.client.get_wx_dir(), V4DBEnum.DB_BASE_PATH, V4DBEnum.MESSAGE_DB_FOLDER)
         if not os.path.exists(message_dir):
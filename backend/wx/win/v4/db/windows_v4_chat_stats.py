@@ -0,0 +1,68 @@
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+
+from app.services.task_progress import get_progress
+from config.log_config import get_context_logger
+from wx.common.util.chat_stats import ChatStats, StatsBatch, bucket_columns
+from wx.interface.wx_interface import ClientInterface
+from wx.win.v4.db.windows_v4_msg_locator import message_table_pattern
+from wx.win.v4.enums.v4_enums import V4DBEnum
+
+
+class WindowsV4ChatStats(ChatStats):
+    """
+    微信4 会话统计，遍历各 message_N 库的 Msg_<md5> 表，发送者为 real_sender_id 对应的 Name2Id 用户名
+    """
+
+    def __init__(self, client: ClientInterface):
+        super().__init__(os.path.join(client.get_wx_dir(), V4DBEnum.DB_BASE_PATH, V4DBEnum.CHAT_STATS_DB))
+        self.client = client
+
+    def build_stats(self, conn: sqlite3.Connection, batch: StatsBatch, offset: int):
+        logger = get_context_logger()
+        message_dir = os.path.join(self.client.get_wx_dir(), V4DBEnum.DB_BASE_PATH, V4DBEnum.MESSAGE_DB_FOLDER)
+        if not os.path.exists(message_dir):
+            logger.info(f"消息库目录不存在：{message_dir}")
+            return
+        self_username = self.client.get_real_wx_id()
+        progress = get_progress()
+        for db_name in self.client.get_db_manager().messages_db_name_array():
+            progress.advance(files=1, current=db_name)
+            db_path = os.path.join(message_dir, db_name)
+            try:
+                with closing(sqlite3.connect(db_path)) as msg_conn:
+                    # Name2Id 的 rowid 即 real_sender_id，表名后缀为会话用户名的 md5
+                    names = dict(msg_conn.execute("SELECT rowid, user_name FROM Name2Id"))
+                    table_users = {f"Msg_{hashlib.md5(name.encode('utf-8')).hexdigest()}": name
+                                   for name in names.values() if name}
+                    tables = [row[0] for row in msg_conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+                    for table_name in tables:
+                        if not message_table_pattern.match(table_name):
+                            continue
+                        username = table_users.get(table_name)
+                        if username is None:
+                            logger.debug("%s.%s 未找到对应会话，跳过统计", db_name, table_name)
+                            continue
+                        start = self.max_local_id(conn, db_name, table_name)
+                        max_local_id = msg_conn.execute(
+                            f"SELECT MAX(local_id) FROM {table_name} WHERE local_id > ?", (start,)
+                        ).fetchone()[0]
+                        if max_local_id is None:
+                            continue
+                        cursor = msg_conn.execute(
+                            f"SELECT local_type & 4294967295, real_sender_id, {bucket_columns('create_time', offset)}, "
+                            f"COUNT(*), MIN(create_time), MAX(create_time) FROM {table_name} "
+                            f"WHERE local_id > ? AND local_id <= ? GROUP BY 1, 2, 3, 4",
+                            (start, max_local_id)
+                        )
+                        table_batch = StatsBatch()
+                        for msg_type, sender_id, hour, day, count, first_time, last_time in cursor:
+                            sender = names.get(sender_id)
+                            table_batch.add(username, msg_type, sender, sender == self_username, hour, day,
+                                            count, first_time, last_time)
+                        batch.merge(table_batch)
+                        self.set_max_local_id(conn, db_name, table_name, max_local_id)
+            except sqlite3.Error as e:
+                logger.warning(f"统计 {db_name} 失败: {e}")
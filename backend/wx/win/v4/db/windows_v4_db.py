@@ -1,6 +1,7 @@
 import os
 import re
 from collections import defaultdict
+from typing import Set
 
 from fastapi import HTTPException
 from sqlalchemy import create_engine, Engine
@@ -9,6 +10,7 @@ from sqlalchemy.orm import sessionmaker
 from starlette import status
 
 from config.log_config import logger, get_context_logger
+from wx.common.util.sql_trace import instrument_engine
 from wx.interface.wx_interface import ClientInterface, DBManager
 from wx.win.v4.enums.v4_enums import V4DBEnum
 
@@ -32,6 +34,15 @@ class WindowsV4DB(DBManager):
         self.session_local_dict.clear()
         self.engine_dict.clear()
 
+    def clear_dbs(self, db_names: Set[str]):
+        decoded_names = {f"{V4DBEnum.DECODED_DB_PREFIX}{name}" for name in db_names}
+        for db_path in [p for p in list(self.engine_dict) if os.path.basename(p) in decoded_names]:
+            get_context_logger().info(f"关闭连接： {db_path}")
+            engine = self.engine_dict.pop(db_path, None)
+            self.session_local_dict.pop(db_path, None)
+            if engine is not None:
+                engine.dispose()
+
     def get_engin(self, db_path) -> Engine:
         engine = self.engine_dict[db_path]
         if engine is None:
@@ -43,6 +54,7 @@ class WindowsV4DB(DBManager):
                 pool_timeout=30,
                 pool_recycle=3600
             )
+            instrument_engine(engine, "win.v4", db_path)
             self.engine_dict[db_path] = engine
         return engine
 
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, List, Tuple
+
+from config.log_config import get_context_logger
+from wx.interface.wx_interface import ClientInterface
+from wx.win.v4.enums.v4_enums import V4DBEnum
+
+
+def md5_key(md5: str) -> bytes | None:
+    """32 位 md5 字符串转 16 字节二进制 key"""
+    try:
+        key = bytes.fromhex(md5)
+    except (TypeError, ValueError):
+        return None
+    return key if len(key) == 16 else None
+
+
+class WindowsV4HardlinkIndex:
+    """
+    hardlink.db 视频索引的内存缓存：md5(16 字节) -> (目录序号, 文件名)
+    目录名单独保存在列表中，由序号引用，避免每条记录重复保存目录字符串
+    """
+
+    def __init__(self, client: ClientInterface):
+        self.client = client
+        self.lock = threading.Lock()
+        self.video_index: Dict[bytes, Tuple[int, str]] | None = None
+        self.dir_names: List[str] = []
+
+    def clear(self):
+        self.video_index = None
+        self.dir_names = []
+
+    def load(self) -> bool:
+        """
+        加载 hardlink 库到内存，库文件不存在时返回 False
+        """
+        logger = get_context_logger()
+        db_path = os.path.join(self.client.get_wx_dir(), V4DBEnum.DB_BASE_PATH, V4DBEnum.HARDLINK_DB_PATH)
+        if not os.path.exists(db_path):
+            logger.info(f"hardlink 库不存在：{db_path}")
+            return False
+        with self.lock:
+            try:
+                with closing(sqlite3.connect(db_path)) as conn:
+                    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+                    # 与 row_number() over() 保持一致，按扫描顺序从 1 开始编号
+                    dir_names = [''] + [row[0] for row in conn.execute("SELECT username FROM dir2id")]
+                    video_table = 'video_hardlink_info_v4' if 'video_hardlink_info_v4' in tables \
+                        else 'video_hardlink_info_v3'
+                    video_index = {}
+                    if video_table in tables:
+                        for md5, dir1, file_name in conn.execute(f"SELECT md5, dir1, file_name FROM {video_table}"):
+                            key = md5_key(md5)
+                            if key is not None and key not in video_index:
+                                video_index[key] = (dir1, file_name)
+            except sqlite3.Error as e:
+                logger.warning(f"加载 hardlink 索引失败: {e}")
+                return False
+            self.dir_names = dir_names
+            self.video_index = video_index
+        logger.info(f"hardlink 索引加载完成，视频 {len(video_index)} 条，目录 {len(dir_names) - 1} 个")
+        return True
+
+    def ensure_loaded(self) -> bool:
+        if self.video_index is not None:
+            return True
+        return self.load()
+
+    def video(self, md5: str) -> Tuple[str, str] | None:
+        """
+        根据 md5 获取视频所在目录名与文件名
+        """
+        key = md5_key(md5)
+        if key is None or self.video_index is None:
+            return None
+        value = self.video_index.get(key)
+        if value is None:
+            return None
+        dir1, file_name = value
+        dir_name = self.dir_names[dir1] if dir1 is not None and 0 < dir1 < len(self.dir_names) else None
+        return dir_name, file_name
@@ -0,0 +1,50 @@
+import os
+import re
+import sqlite3
+from contextlib import closing
+
+from app.services.task_progress import get_progress
+from config.log_config import get_context_logger
+from wx.common.util.msg_locator import MsgLocator
+from wx.interface.wx_interface import ClientInterface
+from wx.win.v4.enums.v4_enums import V4DBEnum
+
+message_table_pattern = re.compile(r'^Msg_[0-9a-f]{32}$')
+
+
+class WindowsV4MsgLocator(MsgLocator):
+    """
+    微信4 server_id -> (message_N 库, Msg_<md5> 表, local_id) 索引
+    """
+
+    def __init__(self, client: ClientInterface):
+        super().__init__(os.path.join(client.get_wx_dir(), V4DBEnum.DB_BASE_PATH, V4DBEnum.MSG_LOCATOR_DB))
+        self.client = client
+
+    def build_index(self, conn: sqlite3.Connection) -> int:
+        logger = get_context_logger()
+        message_dir = os.path.join(self.client.get_wx_dir(), V4DBEnum.DB_BASE_PATH, V4DBEnum.MESSAGE_DB_FOLDER)
+        if not os.path.exists(message_dir):
+            logger.info(f"消息库目录不存在：{message_dir}")
+            return 0
+        count = 0
+        progress = get_progress()
+        for db_name in self.client.get_db_manager().messages_db_name_array():
+            progress.advance(files=1, current=db_name)
+            db_path = os.path.join(message_dir, db_name)
+            try:
+                with closing(sqlite3.connect(db_path)) as msg_conn:
+                    tables = [row[0] for row in msg_conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+                    for table_name in tables:
+                        if not message_table_pattern.match(table_name):
+                            continue
+                        start = self.max_local_id(conn, db_name, table_name)
+                        cursor = msg_conn.execute(
+                            f"SELECT local_id, server_id FROM {table_name} WHERE local_id > ? ORDER BY local_id",
+                            (start,)
+                        )
+                        count += self.save(conn, db_name, table_name, cursor)
+            except sqlite3.Error as e:
+                logger.warning(f"索引 {db_name} 失败: {e}")
+        logger.info(f"微信4 消息定位索引新增 {count} 条")
+        return count
@@ -7,9 +7,12 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
+from app.helper import metrics_helper
 from app.models.sys import SysDecryptRecord
+from app.services.task_progress import get_progress
 from config.log_config import get_context_logger
-from db.sys_db import SessionLocal
+from app.services.decrypt_record_service import record_decrypted
+from db.sys_db import SessionLocal, sys_db_writer
 from wx.interface.wx_interface import Decryptor, ClientInterface
 from wx.win.v4.enums.v4_enums import V4DBEnum
 
@@ -21,6 +24,8 @@ ROUND_COUNT = 256000
 PAGE_SIZE = 4096
 SALT_SIZE = 16
 SQLITE_HEADER = b"SQLite format 3"
+# 每解密多少页上报一次进度
+PROGRESS_PAGES = 1024
 
 patterns = [
     r'^biz.db$',
@@ -51,6 +56,11 @@ patterns = [
 
 compiled_patterns = [re.compile(pattern) for pattern in patterns]
 
+decrypt_seconds = metrics_helper.histogram("cloudbak_decrypt_file_duration_seconds", "单个数据库文件解密耗时",
+                                           ("client",))
+decrypt_bytes = metrics_helper.counter("cloudbak_decrypt_bytes_total", "已解密数据库字节数", ("client",))
+decrypt_files = metrics_helper.counter("cloudbak_decrypt_files_total", "数据库文件解密次数", ("client", "result"))
+
 
 class WindowsV4Decryptor(Decryptor):
 
@@ -61,10 +71,10 @@ class WindowsV4Decryptor(Decryptor):
         logger = get_context_logger()
         logger.info("执行数据库解密任务，版本 win.v4")
         if deep:
-            logger.info("全量解析，先删除 decoded_ 前缀的库文件")
-            self.clear_decoded_files()
+            # 不先删除解密文件，逐个重新解密后替换，解析期间浏览不受影响
+            logger.info("全量解析，重新解密全部库文件")
         with SessionLocal() as db:
-            self.decode_msg(db)
+            self.decode_msg(db, deep)
 
     def clear_decoded_files(self):
         logger = get_context_logger()
@@ -78,49 +88,79 @@ class WindowsV4Decryptor(Decryptor):
                     logger.info(f"删除文件：{file}")
                     os.remove(file)
 
-    def decode_msg(self, db):
+    def decode_msg(self, db, force: bool = False):
         logger = get_context_logger()
         wx_dir = self.client.get_wx_dir()
         # db 基础路径
         db_base_dir = os.path.join(wx_dir, V4DBEnum.DB_BASE_PATH)
         logger.info(f"db_base_dir: {db_base_dir}")
-        sys_session = self.client.get_sys_session()
         # 遍历
-        files = os.walk(db_base_dir)
-        for dirpath, dirnames, filenames in files:
-            for filename in filenames:
-                for pattern in compiled_patterns:
-                    if pattern.match(filename):
-                        decoded_file_name = f"{V4DBEnum.DECODED_DB_PREFIX}{filename}"
-                        db_file = os.path.join(dirpath, filename)
-                        decoded_db_file = os.path.join(dirpath, decoded_file_name)
-                        logger.info(f"db_file: {db_file}")
-                        # 检查文件的修改时间与数据库中的修改时间
-                        modification_time = os.path.getmtime(db_file)
-                        record = db.query(SysDecryptRecord).filter_by(db_file=filename,
-                                                                      session_id=sys_session.id).first()
-                        # decoded_文件存在且时间戳相同，则跳过
-                        if record is not None and record.file_last_ts == modification_time:
-                            logger.info(f"file {filename} no modify")
-                            if os.path.exists(decoded_db_file):
-                                continue
-                            else:
-                                logger.info(f"file {decoded_file_name} not exists")
-                        # 解密，解密的文件为原文件名加 decoded_ 前缀
-                        try:
-                            is_success = decrypt_db_file_v4(db_file, sys_session.wx_key, decoded_db_file)
-                            if is_success:
-                                logger.info("decrypt success, record file modification_time")
-                                if record is None:
-                                    record = SysDecryptRecord(db_file=filename, file_last_ts=modification_time,
-                                                              session_id=sys_session.id)
-                                    db.add(record)
-                                    db.commit()
-                                else:
-                                    record.file_last_ts = modification_time
-                                    db.commit()
-                        except Exception as e:
-                            logger.error(e)
+        db_files = [os.path.join(dirpath, filename)
+                    for dirpath, dirnames, filenames in os.walk(db_base_dir)
+                    for filename in filenames if is_db_file(filename)]
+        progress = get_progress()
+        progress.stage("decrypt", len(db_files), sum(os.path.getsize(f) for f in db_files))
+        for db_file in db_files:
+            # 解密过程中按页上报字节数，跳过的文件在此计入
+            if not self.decode_one(db, db_file, force):
+                progress.advance(bytes_done=os.path.getsize(db_file))
+            progress.advance(files=1, current=os.path.basename(db_file))
+        # 解密记录由写线程提交，结束前确认全部写入
+        sys_db_writer.flush()
+
+    def decrypt_file(self, db_file: str) -> bool:
+        if not is_db_file(os.path.basename(db_file)):
+            return False
+        with SessionLocal() as db:
+            return self.decode_one(db, db_file)
+
+    def decode_one(self, db, db_file: str, force: bool = False) -> bool:
+        """
+        解密单个库文件并记录修改时间
+        :param force: 忽略修改时间记录，强制重新解密
+        :return: 是否产生了新的解密文件
+        """
+        logger = get_context_logger()
+        sys_session = self.client.get_sys_session()
+        dirpath, filename = os.path.split(db_file)
+        decoded_file_name = f"{V4DBEnum.DECODED_DB_PREFIX}{filename}"
+        decoded_db_file = os.path.join(dirpath, decoded_file_name)
+        logger.info("db_file: %s", db_file)
+        # 检查文件的修改时间与数据库中的修改时间
+        modification_time = os.path.getmtime(db_file)
+        record = db.query(SysDecryptRecord).filter_by(db_file=filename,
+                                                      session_id=sys_session.id).first()
+        # decoded_文件存在且时间戳相同，则跳过
+        if not force and record is not None and record.file_last_ts == modification_time:
+            logger.info("file %s no modify", filename)
+            if os.path.exists(decoded_db_file):
+                return False
+            else:
+                logger.info("file %s not exists", decoded_file_name)
+        # 解密，解密的文件为原文件名加 decoded_ 前缀
+        # 先写临时文件再替换，已打开的连接仍读取旧文件
+        tmp_file = f"{decoded_db_file}.tmp"
+        try:
+            with decrypt_seconds.time(client="win.v4"):
+                is_success = decrypt_db_file_v4(db_file, sys_session.wx_key, tmp_file)
+            decrypt_files.inc(client="win.v4", result="success" if is_success else "fail")
+            if is_success:
+                decrypt_bytes.inc(os.path.getsize(db_file), client="win.v4")
+                os.replace(tmp_file, decoded_db_file)
+                logger.info("decrypt success, record file modification_time")
+                record_decrypted(sys_session.id, filename, modification_time)
+            return is_success
+        except Exception as e:
+            decrypt_files.inc(client="win.v4", result="fail")
+            logger.error(e)
+            return False
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+def is_db_file(filename: str) -> bool:
+    return any(pattern.match(filename) for pattern in compiled_patterns)
 
 
 def decrypt_db_file_v4(path: str, pkey: str, output_path: str):
@@ -131,11 +171,13 @@ def decrypt_db_file_v4(path: str, pkey: str, output_path: str):
         buf = f.read()
 
     # If the file starts with SQLITE_HEADER, no decryption is needed
+    progress = get_progress()
     if buf.startswith(SQLITE_HEADER):
         logger = get_context_logger()
         logger.info('file is already sqlite file')
         with open(output_path, 'wb') as out_file:
             out_file.write(buf)
+        progress.advance(bytes_done=len(buf))
         return True
 
     decrypted_buf = bytearray()
@@ -184,13 +226,12 @@ def decrypt_db_file_v4(path: str, pkey: str, output_path: str):
         # 忽略全 0 的页面 HMAC（通常表示未写入）
         if actual_mac == b'\x00' * len(hash_mac):
             logger = get_context_logger()
-            logger.warning(f"Skip HMAC verification on page {cur_page + 1} (zero mac region)")
+            logger.warning("Skip HMAC verification on page %d (zero mac region)", cur_page + 1)
         else:
             if hash_mac != actual_mac:
                 logger = get_context_logger()
-                logger.error(f"HMAC verification failed at page {cur_page + 1}")
-                logger.error(f"Expected: {hash_mac.hex()}")
-                logger.error(f"Actual:   {actual_mac.hex()}")
+                logger.error("HMAC verification failed at page %d, expected: %s, actual: %s",
+                             cur_page + 1, hash_mac.hex(), actual_mac.hex())
                 raise Exception("Hash verification failed")
 
         # Decrypt the content using AES-256-CBC
@@ -201,6 +242,11 @@ def decrypt_db_file_v4(path: str, pkey: str, output_path: str):
 
         decrypted_buf.extend(decrypted_data)
         decrypted_buf.extend(buf[end - reserve:end])
+        if (cur_page + 1) % PROGRESS_PAGES == 0:
+            progress.advance(bytes_done=PROGRESS_PAGES * PAGE_SIZE, pages=PROGRESS_PAGES)
+
+    rest = total_page % PROGRESS_PAGES
+    progress.advance(bytes_done=len(buf) - (total_page - rest) * PAGE_SIZE, pages=rest)
 
     # Write the decrypted data to the output file
     with open(output_path, 'wb') as out_file:
@@ -12,6 +12,10 @@ class V4DBEnum(StrEnum):
     HEAD_IMAGE_DB_PATH = 'head_image/decoded_head_image.db'
     MESSAGE_DB_FOLDER = 'message'
     HARDLINK_DB_PATH = 'hardlink/decoded_hardlink.db'
+    # 消息定位索引库
+    MSG_LOCATOR_DB = 'cloudbak_msg_locator.db'
+    # 会话统计库
+    CHAT_STATS_DB = 'cloudbak_chat_stats.db'
 
     # 头像存放路径
     HEAD_IMAGE_FOLDER = 'head_image'
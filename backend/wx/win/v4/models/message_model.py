@@ -3,6 +3,7 @@ from typing import Any, Type
 
 from sqlalchemy import Column, Integer, String, LargeBinary
 
+from app.helper import metrics_helper
 from config.log_config import logger
 from wx.win.v4.db.windows_v4_db import Base
 
@@ -13,14 +14,16 @@ class DynamicModel:
     @classmethod
     def get_dynamic_message_model(cls, username: str) -> Type[Base] | Any:
         name_hash = DynamicModel.md5_username(username)
-        logger.info(cls.message_models.keys())
+        logger.debug("message_models cached: %d", len(cls.message_models))
         if name_hash in cls.message_models.keys():
+            metrics_helper.cache_hit("message_models")
             return cls.message_models[name_hash]
+        metrics_helper.cache_miss("message_models")
 
         table_name = f"Msg_{name_hash}"
         class_name = f"DynamicTable_{table_name}"  # 生成唯一的类名
 
-        logger.info(f"创建动态类，table_name={table_name} for username={username}")
+        logger.info("创建动态类，table_name=%s for username=%s", table_name, username)
 
         # 动态创建类
         DynamicTable = type(class_name, (Base,), {
@@ -1,5 +1,6 @@
 import os
 from abc import ABC
+from typing import Set
 
 from app.models.sys import SysSession, SysSessionExtra
 from config.app_config import settings as app_settings
@@ -12,7 +13,9 @@ from wx.win.v4.data.v4_contact_data import ContactManagerWindowsV4
 from wx.win.v4.data.v4_message_data import MessageManagerWindowsV4
 from wx.win.v4.data.v4_resource_data import WindowsV4ResourceManager
 from wx.win.v4.data.v4_session_data import SessionManagerWindowsV4
+from wx.win.v4.db.windows_v4_chat_stats import WindowsV4ChatStats
 from wx.win.v4.db.windows_v4_db import WindowsV4DB
+from wx.win.v4.db.windows_v4_msg_locator import WindowsV4MsgLocator
 from wx.win.v4.decryptor.windos_v4_decryptor import WindowsV4Decryptor
 
 
@@ -26,10 +29,12 @@ class WindowsClientV4(ClientInterface, ABC):
         self.decryptor = WindowsV4Decryptor(self)
         self.contact_manager = ContactManagerWindowsV4(self)
         self.db_manager = WindowsV4DB(self)
+        self.msg_locator = WindowsV4MsgLocator(self)
+        self.chat_stats = WindowsV4ChatStats(self)
         self.session_manager = SessionManagerWindowsV4(self)
         self.resource_manager = WindowsV4ResourceManager(self)
         self.message_manager = MessageManagerWindowsV4(self)
-        self.chat_room_manager = WindowsV4ChatRoomManager(self.db_manager)
+        self.chat_room_manager = WindowsV4ChatRoomManager(self.db_manager, self.contact_manager)
 
     def get_real_wx_id(self):
         wx_id = self.get_sys_session().wx_id
@@ -62,10 +67,36 @@ class WindowsClientV4(ClientInterface, ABC):
         self.db_manager.clear()
         self.message_manager.clear()
         self.contact_manager.clear()
+        self.chat_room_manager.clear()
+        self.resource_manager.clear()
+
+    def clear_dbs(self, db_names: Set[str]):
+        self.db_manager.clear_dbs(db_names)
+        if any(name.startswith("message_") for name in db_names):
+            self.message_manager.clear()
+        if "contact.db" in db_names:
+            self.contact_manager.clear()
+            self.chat_room_manager.clear()
+        if "hardlink.db" in db_names:
+            self.resource_manager.clear()
 
     def decrypt_db(self):
         self.get_db_decryptor().decrypt()
 
+    def build_indexes(self, deep: bool = False):
+        self.msg_locator.build(deep)
+        self.resource_manager.hardlink_index.load()
+        self.resource_manager.build_thumbnails(deep)
+
+    def build_stats(self, deep: bool = False):
+        self.chat_stats.build(deep)
+
+    def get_msg_locator(self) -> WindowsV4MsgLocator:
+        return self.msg_locator
+
+    def get_chat_stats(self) -> WindowsV4ChatStats:
+        return self.chat_stats
+
     def sys_session_check(self) -> CheckResult:
         # 检查微信文件夹是否存在
         logger.info("检查微信文件夹是否存在")
@@ -6,13 +6,12 @@ import os
 from typing import Tuple
 
 from .ffmpeg_bridge import (
-    cleanup_temp_files,
     ffmpeg_available,
     run_ffmpeg,
-    write_temp_frames,
+    run_ffmpeg_inputs,
 )
 from .formats import WXGF
-from .hevc import collect_parameter_sets, ensure_parameter_sets, fix_slice_headers
+from .hevc import AnnexB, collect_parameter_sets, ensure_parameter_sets, fix_slice_headers
 from .partitions import PartitionSet, find_partitions
 
 logger = logging.getLogger(__name__)
@@ -43,10 +42,11 @@ def _describe_partitions(partitions: PartitionSet):
         )
 
 
-def _convert_static(payload: bytes, params) -> Tuple[bytes, str]:
-    _debug("static payload size={} bytes", len(payload))
-    ensured = ensure_parameter_sets(payload, params)
-    fixed = fix_slice_headers(ensured)
+def _convert_static(payload: AnnexB, params) -> Tuple[bytes, str]:
+    _debug("static payload size={} bytes", payload.end - payload.start)
+    ensured_stream = ensure_parameter_sets(payload, params)
+    ensured = ensured_stream.to_bytes()
+    fixed = fix_slice_headers(ensured_stream)
     if not ffmpeg_available():
         return ensured, "bin"
     inputs = [fixed, ensured] if fixed != ensured else [fixed]
@@ -67,12 +67,14 @@ def _convert_anime(anime_frames, mask_frames, params):
         "anime payload: frames={} mask_frames={} frame_size={} bytes",
         len(anime_frames),
         len(mask_frames),
-        sum(len(f) for f in anime_frames) // max(len(anime_frames), 1),
+        sum(f.end - f.start for f in anime_frames) // max(len(anime_frames), 1),
     )
-    ensured_anime = [ensure_parameter_sets(frame, params) for frame in anime_frames]
-    ensured_mask = [ensure_parameter_sets(frame, params) for frame in mask_frames]
-    fixed_anime = [fix_slice_headers(frame) for frame in ensured_anime]
-    fixed_mask = [fix_slice_headers(frame) for frame in ensured_mask]
+    ensured_anime_streams = [ensure_parameter_sets(frame, params) for frame in anime_frames]
+    ensured_mask_streams = [ensure_parameter_sets(frame, params) for frame in mask_frames]
+    ensured_anime = [stream.to_bytes() for stream in ensured_anime_streams]
+    ensured_mask = [stream.to_bytes() for stream in ensured_mask_streams]
+    fixed_anime = [fix_slice_headers(stream) for stream in ensured_anime_streams]
+    fixed_mask = [fix_slice_headers(stream) for stream in ensured_mask_streams]
     candidates = [
         (fixed_anime, fixed_mask),
         (ensured_anime, ensured_mask),
@@ -80,22 +82,18 @@ def _convert_anime(anime_frames, mask_frames, params):
     if not ffmpeg_available():
         return b"".join(ensured_anime), "bin"
     for attempt, (anime_list, mask_list) in enumerate(candidates, 1):
-        anime_path = write_temp_frames(anime_list)
-        mask_path = write_temp_frames(mask_list)
         try:
-            gif = run_ffmpeg([
-                "-f", "hevc", "-i", anime_path,
-                "-f", "hevc", "-i", mask_path,
-                "-filter_complex", "[0:v][1:v]alphamerge,split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse",
-                "-f", "gif",
-                "-",
-            ])
-            cleanup_temp_files([anime_path, mask_path])
+            gif = run_ffmpeg_inputs(
+                [("hevc", b"".join(anime_list)), ("hevc", b"".join(mask_list))],
+                [
+                    "-filter_complex", "[0:v][1:v]alphamerge,split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse",
+                    "-f", "gif",
+                    "-",
+                ],
+            )
             return gif, "gif"
         except Exception as exc:
             logger.warning("Anime FFmpeg attempt %d failed: %s", attempt, exc)
-        finally:
-            cleanup_temp_files([anime_path, mask_path])
     return b"".join(ensured_anime), "bin"
 
 
@@ -104,17 +102,16 @@ def decode_wxgf(data: bytes) -> Tuple[bytes, str]:
         raise ValueError("invalid wxgf file")
     partitions = find_partitions(data)
     _describe_partitions(partitions)
-    params = collect_parameter_sets([data[p.offset : p.offset + p.size] for p in partitions.partitions])
+    # 每个分区只扫描一次，后续补参数集与修复 slice 复用解析结果
+    streams = [AnnexB(data, p.offset, p.offset + p.size) for p in partitions.partitions]
+    params = collect_parameter_sets(streams)
     if partitions.like_anime():
         anime_frames = []
         mask_frames = []
-        for idx, part in enumerate(partitions.partitions):
-            chunk = data[part.offset : part.offset + part.size]
+        for idx, chunk in enumerate(streams):
             if idx % 2 == 0:
                 mask_frames.append(chunk)
             else:
                 anime_frames.append(chunk)
         return _convert_anime(anime_frames, mask_frames, params)
-    target = partitions.partitions[partitions.max_index]
-    payload = data[target.offset : target.offset + target.size]
-    return _convert_static(payload, params)
+    return _convert_static(streams[partitions.max_index], params)
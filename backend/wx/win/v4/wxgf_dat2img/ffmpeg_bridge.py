@@ -4,11 +4,18 @@ import logging
 import os
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, List, Tuple
 
 logger = logging.getLogger(__name__)
 FFMPEG_ENV = "FFMPEG_PATH"
+# 同时运行的 ffmpeg 进程数
+FFMPEG_WORKERS_ENV = "WXGF_FFMPEG_WORKERS"
+# 排队等待的最大任务数，超出直接拒绝
+FFMPEG_QUEUE_ENV = "WXGF_FFMPEG_QUEUE"
+# 单个任务超时时间（秒）
+FFMPEG_TIMEOUT_ENV = "WXGF_FFMPEG_TIMEOUT"
 _FFMPEG_STATUS: bool | None = None
 
 
@@ -30,20 +37,204 @@ def ffmpeg_available() -> bool:
     return _FFMPEG_STATUS
 
 
-def run_ffmpeg(args: list[str], stdin: bytes | None = None) -> bytes:
+class FFmpegPool:
+    """
+    ffmpeg 进程池：限制同时运行的进程数与排队任务数，每个任务带超时。
+    画廊滚动时大量图片同时解码，超出并发的任务排队等待，队列满时直接失败，避免瞬间 fork 大量进程。
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def queue_depth(self) -> int:
+        return self.queued
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "queued": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+            }
+
+    def submit(self, args: List[str], inputs: List[Tuple[str, bytes]] | None = None,
+               stdin: bytes | None = None, timeout: float | None = None) -> bytes:
+        """
+        排队执行一次 ffmpeg，返回 stdout
+        :param args: 输入参数之后的 ffmpeg 参数
+        :param inputs: (格式, 数据) 列表，依次通过 stdin 和额外管道输入
+        :param stdin: 直接写入 stdin 的数据，args 中自行指定 pipe:0
+        """
+        timeout = timeout or self.timeout
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise RuntimeError(f"ffmpeg queue is full ({self.queued})")
+            self.queued += 1
+        acquired = self._slots.acquire(timeout=timeout)
+        with self._lock:
+            self.queued -= 1
+            if not acquired:
+                self.timeouts += 1
+            else:
+                self.running += 1
+        if not acquired:
+            raise RuntimeError(f"ffmpeg queue wait exceeded {timeout}s")
+        try:
+            if inputs:
+                output = _run_with_inputs(args, inputs, timeout)
+            else:
+                output = _run(args, stdin, timeout)
+            with self._lock:
+                self.completed += 1
+            return output
+        except subprocess.TimeoutExpired:
+            with self._lock:
+                self.timeouts += 1
+            raise RuntimeError(f"ffmpeg timed out after {timeout}s")
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+            self._slots.release()
+
+
+_POOL: FFmpegPool | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> FFmpegPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                workers = int(os.environ.get(FFMPEG_WORKERS_ENV, min(4, os.cpu_count() or 1)))
+                max_queue = int(os.environ.get(FFMPEG_QUEUE_ENV, 64))
+                timeout = float(os.environ.get(FFMPEG_TIMEOUT_ENV, 30))
+                _POOL = FFmpegPool(max(workers, 1), max_queue, timeout)
+                logger.info("FFmpeg pool: workers=%d queue=%d timeout=%ss", _POOL.workers, max_queue, timeout)
+    return _POOL
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+
+def run_ffmpeg(args: list[str], stdin: bytes | None = None, timeout: float | None = None) -> bytes:
     logger.debug("Running ffmpeg %s", args)
+    return get_pool().submit(args, stdin=stdin, timeout=timeout)
+
+
+def run_ffmpeg_inputs(inputs: List[Tuple[str, bytes]], args: list[str], timeout: float | None = None) -> bytes:
+    """
+    多路输入执行 ffmpeg，第一路通过 stdin，其余通过额外的匿名管道传入，不落临时文件
+    """
+    logger.debug("Running ffmpeg with %d inputs %s", len(inputs), args)
+    return get_pool().submit(args, inputs=inputs, timeout=timeout)
+
+
+def _base_command() -> List[str]:
+    return [ffmpeg_path(), "-hide_banner", "-loglevel", "error"]
+
+
+def _check_output(returncode: int, stdout: bytes, stderr: bytes) -> bytes:
+    if returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg exited with {returncode}: {stderr.decode('utf-8', errors='ignore').strip()}"
+        )
+    if not stdout:
+        raise RuntimeError("ffmpeg produced empty output")
+    return stdout
+
+
+def _run(args: List[str], stdin: bytes | None, timeout: float) -> bytes:
     proc = subprocess.run(
-        [ffmpeg_path(), *args],
+        [*_base_command(), *args],
         input=stdin,
         capture_output=True,
+        timeout=timeout,
     )
-    if proc.returncode != 0:
-        raise RuntimeError(
-            f"ffmpeg exited with {proc.returncode}: {proc.stderr.decode('utf-8', errors='ignore').strip()}"
+    return _check_output(proc.returncode, proc.stdout, proc.stderr)
+
+
+def _run_with_inputs(args: List[str], inputs: List[Tuple[str, bytes]], timeout: float) -> bytes:
+    if os.name == "nt":
+        # Windows 不支持 pass_fds，额外输入退回临时文件
+        return _run_with_temp_inputs(args, inputs, timeout)
+    input_args: List[str] = []
+    pipes: List[Tuple[int, int]] = []
+    try:
+        for idx, (fmt, _) in enumerate(inputs):
+            if idx == 0:
+                input_args += ["-f", fmt, "-i", "pipe:0"]
+                continue
+            read_fd, write_fd = os.pipe()
+            pipes.append((read_fd, write_fd))
+            input_args += ["-f", fmt, "-i", f"pipe:{read_fd}"]
+        proc = subprocess.Popen(
+            [*_base_command(), *input_args, *args],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=[read_fd for read_fd, _ in pipes],
         )
-    if not proc.stdout:
-        raise RuntimeError("ffmpeg produced empty output")
-    return proc.stdout
+    except Exception:
+        for read_fd, write_fd in pipes:
+            os.close(read_fd)
+            os.close(write_fd)
+        raise
+    writers = []
+    for (read_fd, write_fd), (_, data) in zip(pipes, inputs[1:]):
+        os.close(read_fd)
+        writer = threading.Thread(target=_write_pipe, args=(write_fd, data), daemon=True)
+        writer.start()
+        writers.append(writer)
+    try:
+        stdout, stderr = proc.communicate(input=inputs[0][1], timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise
+    finally:
+        for writer in writers:
+            writer.join(timeout=1)
+    return _check_output(proc.returncode, stdout, stderr)
+
+
+def _write_pipe(fd: int, data: bytes):
+    try:
+        with os.fdopen(fd, "wb") as pipe:
+            pipe.write(data)
+    except (BrokenPipeError, OSError) as exc:
+        logger.debug("ffmpeg input pipe closed early: %s", exc)
+
+
+def _run_with_temp_inputs(args: List[str], inputs: List[Tuple[str, bytes]], timeout: float) -> bytes:
+    paths = [write_temp_frames([data]) for _, data in inputs[1:]]
+    try:
+        input_args = ["-f", inputs[0][0], "-i", "pipe:0"]
+        for (fmt, _), path in zip(inputs[1:], paths):
+            input_args += ["-f", fmt, "-i", path]
+        return _run([*input_args, *args], inputs[0][1], timeout)
+    finally:
+        cleanup_temp_files(paths)
 
 
 def write_temp_frames(frames: Iterable[bytes]) -> str:
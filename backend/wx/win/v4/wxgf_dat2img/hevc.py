@@ -1,135 +1,175 @@
-from __future__ import annotations
-
-import os
-from typing import Dict, List
-
-START_CODE_LONG = b"\x00\x00\x00\x01"
-START_CODE_SHORT = b"\x00\x00\x01"
-# HEVC slice NALU types (TRAIL_N .. CRA_NUT) 需要进行 slice header 修复
-SLICE_NAL_TYPES = set(range(0, 22))
-DEBUG = bool(int(os.environ.get('WXGF_DEBUG', '0')))
-
-
-def split_annexb(data: bytes) -> List[bytes]:
-    nalus: List[bytes] = []
-    i = 0
-    start = None
-    while i < len(data):
-        if data.startswith(START_CODE_LONG, i):
-            if start is not None:
-                nalus.append(data[start:i])
-            start = i + len(START_CODE_LONG)
-            i = start
-        elif data.startswith(START_CODE_SHORT, i):
-            if start is not None:
-                nalus.append(data[start:i])
-            start = i + len(START_CODE_SHORT)
-            i = start
-        else:
-            i += 1
-    if start is not None and start < len(data):
-        nalus.append(data[start:])
-    return [n for n in nalus if n]
-
-
-def nal_type(nalu: bytes) -> int:
-    if not nalu:
-        return -1
-    return (nalu[0] >> 1) & 0x3F
-
-
-def is_parameter_set(nt: int) -> bool:
-    return nt in {32, 33, 34}
-
-
-def collect_parameter_sets(chunks: List[bytes]) -> Dict[int, List[bytes]]:
-    params: Dict[int, List[bytes]] = {32: [], 33: [], 34: []}
-    for chunk in chunks:
-        for nalu in split_annexb(chunk):
-            nt = nal_type(nalu)
-            if nt in params and nalu not in params[nt]:
-                params[nt].append(nalu)
-    return params
-
-
-def ensure_parameter_sets(data: bytes, params: Dict[int, List[bytes]]) -> bytes:
-    if not params:
-        return data
-    nalus = split_annexb(data)
-    has_vps = any(nal_type(n) == 32 for n in nalus)
-    has_sps = any(nal_type(n) == 33 for n in nalus)
-    has_pps = any(nal_type(n) == 34 for n in nalus)
-    if has_vps and has_sps and has_pps:
-        return data
-    prefix = bytearray()
-    for nt in (32, 33, 34):
-        if (nt == 32 and has_vps) or (nt == 33 and has_sps) or (nt == 34 and has_pps):
-            continue
-        for nalu in params.get(nt, []):
-            prefix += START_CODE_LONG + nalu
-    if not prefix:
-        return data
-    return bytes(prefix) + data
-
-
-def _remove_emulation_prevention(payload: bytes) -> bytes:
-    """移除 RBSP 中的 0x000003 防止误判首位标志位。"""
-    cleaned = bytearray()
-    zero_count = 0
-    for byte in payload:
-        if zero_count == 2 and byte == 0x03:
-            zero_count = 0
-            continue
-        cleaned.append(byte)
-        if byte == 0x00:
-            zero_count += 1
-        else:
-            zero_count = 0
-    return bytes(cleaned)
-
-
-def _first_slice_flag(nalu: bytes) -> bool:
-    """解析 slice header 获取 first_slice_segment_in_pic_flag。"""
-    if len(nalu) <= 2:
-        return False
-    rbsp = _remove_emulation_prevention(nalu[2:])
-    if not rbsp:
-        return False
-    return bool(rbsp[0] & 0x80)
-
-
-def fix_slice_headers(data: bytes) -> bytes:
-    """仿照 Go 版本，仅保留首个 slice，并统计重复首帧 slice。"""
-    nalus = split_annexb(data)
-    if not nalus:
-        return data
-
-    fixed_nalus: List[bytes] = []
-    first_slice_seen = False
-    dropped = 0
-    for nalu in nalus:
-        nt = nal_type(nalu)
-        if nt not in SLICE_NAL_TYPES:
-            fixed_nalus.append(nalu)
-            continue
-
-        if not first_slice_seen:
-            first_slice_seen = True
-            fixed_nalus.append(nalu)
-            continue
-
-        if not _first_slice_flag(nalu):
-            fixed_nalus.append(nalu)
-        else:
-            dropped += 1
-
-    if DEBUG:
-        print(f"[wxgf] hevc slices: total={len(nalus)} dropped_dups={dropped}")
-
-    if len(fixed_nalus) == len(nalus):
-        return data
-
-    fixed = bytearray()
-    for nalu in fixed_nalus:
-        fixed += START_CODE_LONG + nalu
-    return bytes(fixed)
\ No newline at end of file
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterable, List, Tuple
+
+START_CODE_LONG = b"\x00\x00\x00\x01"
+START_CODE_SHORT = b"\x00\x00\x01"
+# HEVC slice NALU types (TRAIL_N .. CRA_NUT) 需要进行 slice header 修复
+SLICE_NAL_TYPES = set(range(0, 22))
+PARAMETER_SET_TYPES = (32, 33, 34)
+DEBUG = bool(int(os.environ.get('WXGF_DEBUG', '0')))
+
+
+def scan_annexb(data: bytes, start: int = 0, end: int | None = None) -> List[Tuple[int, int]]:
+    """
+    扫描 Annex-B 码流，返回各 NALU 在 data 中的 (offset, length)，不复制数据
+    :param data: 原始字节，可以是整个 wxgf 文件
+    :param start: 扫描起始位置
+    :param end: 扫描结束位置（不含）
+    """
+    if end is None:
+        end = len(data)
+    spans: List[Tuple[int, int]] = []
+    nal_start = -1
+    pos = data.find(START_CODE_SHORT, start, end)
+    while pos != -1:
+        # 00 00 00 01 长起始码的前导 0 不属于上一个 NALU
+        nal_end = pos - 1 if pos > start and data[pos - 1] == 0 else pos
+        if nal_start != -1 and nal_end > nal_start:
+            spans.append((nal_start, nal_end - nal_start))
+        nal_start = pos + 3
+        pos = data.find(START_CODE_SHORT, nal_start, end)
+    if nal_start != -1 and nal_start < end:
+        spans.append((nal_start, end - nal_start))
+    return spans
+
+
+class AnnexB:
+    """
+    解析后的 Annex-B 码流：原始数据 + NALU 位置 + NALU 类型
+    collect_parameter_sets / ensure_parameter_sets / fix_slice_headers 共用同一份解析结果
+    """
+    __slots__ = ("data", "start", "end", "spans", "types")
+
+    def __init__(self, data: bytes, start: int = 0, end: int | None = None,
+                 spans: List[Tuple[int, int]] | None = None):
+        self.data = data
+        self.start = start
+        self.end = len(data) if end is None else min(end, len(data))
+        self.spans = scan_annexb(data, start, self.end) if spans is None else spans
+        self.types = [(data[offset] >> 1) & 0x3F for offset, _ in self.spans]
+
+    def __len__(self):
+        return len(self.spans)
+
+    def nalu(self, idx: int) -> memoryview:
+        offset, length = self.spans[idx]
+        return memoryview(self.data)[offset:offset + length]
+
+    def has_type(self, nt: int) -> bool:
+        return nt in self.types
+
+    def to_bytes(self) -> bytes:
+        if self.start == 0 and self.end == len(self.data) and isinstance(self.data, bytes):
+            return self.data
+        return bytes(memoryview(self.data)[self.start:self.end])
+
+
+def parse_annexb(data: bytes | AnnexB, start: int = 0, end: int | None = None) -> AnnexB:
+    if isinstance(data, AnnexB):
+        return data
+    return AnnexB(data, start, end)
+
+
+def split_annexb(data: bytes) -> List[bytes]:
+    return [data[offset:offset + length] for offset, length in scan_annexb(data)]
+
+
+def nal_type(nalu: bytes) -> int:
+    if not nalu:
+        return -1
+    return (nalu[0] >> 1) & 0x3F
+
+
+def is_parameter_set(nt: int) -> bool:
+    return nt in {32, 33, 34}
+
+
+def collect_parameter_sets(chunks: Iterable[bytes | AnnexB]) -> Dict[int, List[bytes]]:
+    params: Dict[int, List[bytes]] = {32: [], 33: [], 34: []}
+    for chunk in chunks:
+        stream = parse_annexb(chunk)
+        for idx, nt in enumerate(stream.types):
+            if nt not in params:
+                continue
+            nalu = bytes(stream.nalu(idx))
+            if nalu not in params[nt]:
+                params[nt].append(nalu)
+    return params
+
+
+def ensure_parameter_sets(data: bytes | AnnexB, params: Dict[int, List[bytes]]) -> AnnexB:
+    """
+    缺少 VPS/SPS/PPS 时在码流前补齐，返回新的解析结果（直接平移 NALU 位置，不重新扫描）
+    """
+    stream = parse_annexb(data)
+    if not params:
+        return stream
+    missing = [nt for nt in PARAMETER_SET_TYPES if not stream.has_type(nt)]
+    if not missing:
+        return stream
+    parts: List[bytes] = []
+    spans: List[Tuple[int, int]] = []
+    offset = 0
+    for nt in missing:
+        for nalu in params.get(nt, []):
+            parts.append(START_CODE_LONG)
+            parts.append(nalu)
+            spans.append((offset + len(START_CODE_LONG), len(nalu)))
+            offset += len(START_CODE_LONG) + len(nalu)
+    if not parts:
+        return stream
+    shift = offset - stream.start
+    parts.append(memoryview(stream.data)[stream.start:stream.end])
+    spans.extend((nal_offset + shift, length) for nal_offset, length in stream.spans)
+    return AnnexB(b"".join(parts), spans=spans)
+
+
+def _first_slice_flag(nalu: bytes | memoryview) -> bool:
+    """
+    解析 slice header 获取 first_slice_segment_in_pic_flag。
+    该标志位于 NALU 头之后第一个字节的最高位，防竞争字节至少要在两个 0x00 之后才会出现，不会影响该字节，
+    因此无需对整个 NALU 做 RBSP 转换。
+    """
+    if len(nalu) <= 2:
+        return False
+    return bool(nalu[2] & 0x80)
+
+
+def fix_slice_headers(data: bytes | AnnexB) -> bytes:
+    """仿照 Go 版本，仅保留首个 slice，并统计重复首帧 slice。"""
+    stream = parse_annexb(data)
+    if not stream.spans:
+        return stream.to_bytes()
+
+    view = memoryview(stream.data)
+    fixed_spans: List[Tuple[int, int]] = []
+    first_slice_seen = False
+    dropped = 0
+    for (offset, length), nt in zip(stream.spans, stream.types):
+        if nt not in SLICE_NAL_TYPES:
+            fixed_spans.append((offset, length))
+            continue
+
+        if not first_slice_seen:
+            first_slice_seen = True
+            fixed_spans.append((offset, length))
+            continue
+
+        if not _first_slice_flag(view[offset:offset + length]):
+            fixed_spans.append((offset, length))
+        else:
+            dropped += 1
+
+    if DEBUG:
+        print(f"[wxgf] hevc slices: total={len(stream.spans)} dropped_dups={dropped}")
+
+    if len(fixed_spans) == len(stream.spans):
+        return stream.to_bytes()
+
+    parts = []
+    for offset, length in fixed_spans:
+        parts.append(START_CODE_LONG)
+        parts.append(view[offset:offset + length])
+    return b"".join(parts)